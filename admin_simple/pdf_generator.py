@@ -11,9 +11,10 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-import requests
 from PIL import Image as PILImage
 
+from core.http import cliente
+
 
 def generar_pdf_pedido(pedido):
     """
@@ -96,7 +97,7 @@ def generar_pdf_pedido(pedido):
             
             if image_url and not image_url.startswith('https://via.placeholder.com'):
                 # Descargar la imagen desde Cloudinary o cualquier URL
-                response = requests.get(image_url, timeout=10)
+                response = cliente('imagenes').get(image_url, timeout=10)
                 if response.status_code == 200:
                     img_buffer = BytesIO(response.content)
                     img = Image(img_buffer, width=1.5*cm, height=1.5*cm)
@@ -1,3 +1,184 @@
-from django.test import TestCase
+import csv
+from datetime import date
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalogo.models import Producto
+from notificaciones.models import MensajeOutbox
+from notificaciones.n8n_service import n8n_service
+from pedidos import exportacion
+from pedidos.models import Pedido, PedidoItem
+
+
+class CambioEstadoMasivoTests(TestCase):
+
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin)
+        self.pedidos = [
+            Pedido.objects.create(
+                dedicatoria='', nombre_destinatario='Ana', direccion='Calle 123',
+                telefono_destinatario='', fecha_entrega=date.today(),
+                franja_horaria='mañana'
+            )
+            for _ in range(3)
+        ]
+
+    def test_cambia_el_estado_de_los_seleccionados(self):
+        seleccionados = [str(pedido.pk) for pedido in self.pedidos[:2]]
+
+        response = self.client.post(
+            reverse('admin_simple:pedidos-cambiar-estado'),
+            {'pedidos': seleccionados, 'estado': 'preparando'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['actualizados']), 2)
+        self.assertEqual(
+            list(Pedido.objects.order_by('pk').values_list('estado', flat=True)),
+            ['preparando', 'preparando', 'recibido']
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sin_celery_envia_los_whatsapp(self):
+        seleccionados = [str(pedido.pk) for pedido in self.pedidos[:2]]
+
+        datos = {
+            'pedidos': seleccionados,
+            'estado': 'en_camino',
+            'enviar_notificacion': 'true',
+        }
+
+        with mock.patch.multiple(n8n_service, enabled=True, api_key='clave'), \
+                mock.patch.object(
+                    n8n_service, 'enviar_notificacion_pedido', return_value=True
+                ) as enviar:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('admin_simple:pedidos-cambiar-estado'), datos
+                )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(llamada.kwargs['pedido'].pk for llamada in enviar.call_args_list),
+            [pedido.pk for pedido in self.pedidos[:2]]
+        )
+        estados = MensajeOutbox.objects.values_list('estado', flat=True)
+        self.assertEqual(set(estados), {'enviado'})
+
+    def test_estado_invalido(self):
+        response = self.client.post(
+            reverse('admin_simple:pedidos-cambiar-estado'),
+            {'pedidos': [self.pedidos[0].pk], 'estado': 'perdido'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_badges_de_pedidos_list(self):
+        Pedido.objects.filter(pk=self.pedidos[0].pk).cambiar_estado('entregado')
+
+        response = self.client.get(reverse('admin_simple:pedidos-list'))
+
+        self.assertEqual(response.context['total_pedidos'], 3)
+        self.assertEqual(response.context['pedidos_recibidos'], 2)
+        self.assertEqual(response.context['pedidos_entregados'], 1)
+        self.assertEqual(response.context['pagos_pendientes'], 3)
+
+
+class ExportarPedidosTests(TestCase):
+
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin)
+        self.producto = Producto.objects.create(
+            nombre='Ramo de rosas', descripcion='-', sku='ROSAS', precio=1000, stock=10
+        )
+        self.pedido = Pedido.objects.create(
+            dedicatoria='', nombre_destinatario='Ana', direccion='Calle 123',
+            telefono_destinatario='', fecha_entrega=date.today(),
+            franja_horaria='mañana', medio_pago='mercadopago', total=2000,
+        )
+        PedidoItem.objects.create(
+            pedido=self.pedido, producto=self.producto, cantidad=2, precio=1000
+        )
+        Pedido.objects.create(
+            dedicatoria='', nombre_destinatario='Sin ítems', direccion='Calle 456',
+            telefono_destinatario='',
+            fecha_entrega=date.today(), franja_horaria='tarde', estado='cancelado',
+        )
+
+    def exportar(self, **params):
+        return self.client.get(reverse('admin_simple:pedidos-exportar'), params)
+
+    def filas_csv(self, response):
+        lineas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        return list(csv.reader(lineas))
+
+    def test_csv_en_streaming(self):
+        response = self.exportar()
+
+        self.assertTrue(response.streaming)
+        filas = self.filas_csv(response)
+        self.assertEqual(filas[0], exportacion.COLUMNAS)
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[1][14:17], ['Ramo de rosas', 'ROSAS', '2'])
+        self.assertEqual(filas[2][10], 'Sin ítems')
+
+    def test_filtros(self):
+        filas = self.filas_csv(self.exportar(estado='cancelado'))
+        self.assertEqual([fila[10] for fila in filas[1:]], ['Sin ítems'])
+
+        hoy = date.today().isoformat()
+        response = self.exportar(medio_pago='mercadopago', desde=hoy, hasta=hoy)
+        filas = self.filas_csv(response)
+        self.assertEqual([fila[10] for fila in filas[1:]], ['Ana'])
+
+        self.assertEqual(self.exportar(desde='ayer').status_code, 400)
+        self.assertEqual(self.exportar(estado='perdido').status_code, 400)
+
+    def test_lotes_por_clave_primaria(self):
+        with mock.patch.object(exportacion, 'CHUNK_SIZE', 1):
+            filas = list(exportacion.filas(exportacion.filtrar_pedidos()))
+        ids = sorted(Pedido.objects.values_list('id', flat=True))
+        self.assertEqual([fila[1] for fila in filas], ids)
+
+    def test_escapa_formulas(self):
+        Pedido.objects.filter(pk=self.pedido.pk).update(
+            nombre_destinatario='=HYPERLINK("http://x","y")',
+            nombre_comprador='+54 9 11', email_comprador='@x', costo_envio=-50,
+        )
+        Producto.objects.filter(pk=self.producto.pk).update(nombre='-1+1', sku='\tSKU')
+
+        fila = next(exportacion.filas(exportacion.filtrar_pedidos(estado='recibido')))
+
+        self.assertEqual(fila[10], '\'=HYPERLINK("http://x","y")')
+        self.assertEqual(fila[8:10], ["'+54 9 11", "'@x"])
+        self.assertEqual(fila[14:16], ["'-1+1", "'\tSKU"])
+        # Los números no se tocan
+        self.assertEqual(fila[12], -50)
+
+    @skipUnless(exportacion.XLSX_DISPONIBLE, 'Requiere openpyxl')
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.exportar(formato='xlsx')
+
+        self.assertEqual(response.status_code, 200)
+        contenido = BytesIO(b''.join(response.streaming_content))
+        libro = load_workbook(contenido, read_only=True)
+        filas = list(libro['Pedidos'].values)
+        self.assertEqual(list(filas[0]), exportacion.COLUMNAS)
+        self.assertEqual(len(filas), 3)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command(
+            'exportar_pedidos', '--salida', '-', '--estado', 'recibido', stdout=salida
+        )
+        filas = list(csv.reader(salida.getvalue().splitlines()))
+        self.assertEqual(len(filas), 2)
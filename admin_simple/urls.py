@@ -23,6 +23,11 @@ urlpatterns = [
     
     # Pedidos
     path('pedidos/', views.pedidos_list, name='pedidos-list'),
+    path(
+        'pedidos/cambiar-estado/', views.pedidos_cambiar_estado_masivo,
+        name='pedidos-cambiar-estado',
+    ),
+    path('pedidos/exportar/', views.pedidos_exportar, name='pedidos-exportar'),
     path('pedidos/<int:pk>/', views.pedido_detail, name='pedido-detail'),
     path('pedidos/<int:pk>/cambiar-estado/', views.pedido_cambiar_estado, name='pedido-cambiar-estado'),
     path('pedidos/<int:pk>/cambiar-estado-pago/', views.pedido_cambiar_estado_pago, name='pedido-cambiar-estado-pago'),
@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.http import require_http_methods, require_POST
 from django.http import JsonResponse, HttpResponse
 from django.db.models import Q, Count, Sum
+from django.db import transaction
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.contrib import messages
@@ -15,9 +16,11 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
-import requests
 
+from pedidos.busqueda import buscar_pedidos
+from pedidos.estadisticas import resumen as resumen_pedidos
 from pedidos.models import Pedido
+from catalogo.miniaturas import obtener_miniaturas
 from catalogo.models import Producto, Categoria, ProductoImagen
 from django.utils.text import slugify
 import uuid
@@ -37,14 +40,20 @@ def dashboard(request):
     Dashboard principal con estadísticas y actividad reciente
     """
     try:
-        # Estadísticas de productos
-        total_productos = Producto.objects.count()
-        productos_activos = Producto.objects.filter(is_active=True).count()
-        productos_stock_bajo = Producto.objects.filter(stock__lt=5, stock__gt=0).count()
-        productos_sin_stock = Producto.objects.filter(stock=0).count()
+        # Estadísticas de productos (una sola consulta)
+        stats_productos = Producto.objects.aggregate(
+            total=Count('id'),
+            activos=Count('id', filter=Q(is_active=True)),
+            stock_bajo=Count('id', filter=Q(stock__lt=5, stock__gt=0)),
+            sin_stock=Count('id', filter=Q(stock=0)),
+        )
+        total_productos = stats_productos['total']
+        productos_activos = stats_productos['activos']
+        productos_stock_bajo = stats_productos['stock_bajo']
+        productos_sin_stock = stats_productos['sin_stock']
         
-        # Pedidos pendientes
-        pedidos_pendientes = Pedido.objects.filter(estado='pendiente').count()
+        # Pedidos pendientes (contadores precalculados, ver pedidos.estadisticas)
+        pedidos_pendientes = resumen_pedidos()['estado'].get('pendiente', 0)
         
         # Actividad reciente (últimos 5 eventos)
         actividad_reciente = []
@@ -525,7 +534,13 @@ def pedidos_list(request):
     
     # Aplicar filtro de fecha
     if filtro_fecha == 'hoy':
-        pedidos = pedidos.filter(creado__date=timezone.now().date())
+        # Rango sobre creado: usa el índice, creado__date no
+        inicio_dia = timezone.localtime().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        pedidos = pedidos.filter(
+            creado__gte=inicio_dia, creado__lt=inicio_dia + timedelta(days=1)
+        )
     elif filtro_fecha == 'semana':
         inicio_semana = timezone.now() - timedelta(days=7)
         pedidos = pedidos.filter(creado__gte=inicio_semana)
@@ -533,29 +548,14 @@ def pedidos_list(request):
         inicio_mes = timezone.now() - timedelta(days=30)
         pedidos = pedidos.filter(creado__gte=inicio_mes)
     
-    # Búsqueda
+    # Búsqueda (número de pedido o teléfono exactos, o texto indexado)
     if buscar:
-        pedidos = pedidos.filter(
-            Q(numero_pedido__icontains=buscar) |
-            Q(nombre_comprador__icontains=buscar) |
-            Q(nombre_destinatario__icontains=buscar) |
-            Q(email_comprador__icontains=buscar) |
-            Q(telefono_destinatario__icontains=buscar) |
-            Q(cliente__username__icontains=buscar) |
-            Q(cliente__email__icontains=buscar)
-        )
+        pedidos = buscar_pedidos(buscar, pedidos)
     
-    # Estadísticas para badges
-    total_pedidos = Pedido.objects.count()
-    pedidos_recibidos = Pedido.objects.filter(estado='recibido').count()
-    pedidos_preparando = Pedido.objects.filter(estado='preparando').count()
-    pedidos_en_camino = Pedido.objects.filter(estado='en_camino').count()
-    pedidos_entregados = Pedido.objects.filter(estado='entregado').count()
-    pedidos_cancelados = Pedido.objects.filter(estado='cancelado').count()
-    
-    pagos_pendientes = Pedido.objects.filter(estado_pago='pendiente').count()
-    pagos_aprobados = Pedido.objects.filter(estado_pago='approved').count()
-    pagos_rechazados = Pedido.objects.filter(estado_pago='rejected').count()
+    # Estadísticas para badges (contadores precalculados, ver pedidos.estadisticas)
+    contadores = resumen_pedidos()
+    por_estado = contadores['estado']
+    por_pago = contadores['estado_pago']
     
     # Paginación
     paginator = Paginator(pedidos, 20)
@@ -564,15 +564,15 @@ def pedidos_list(request):
     
     context = {
         'page_obj': page_obj,
-        'total_pedidos': total_pedidos,
-        'pedidos_recibidos': pedidos_recibidos,
-        'pedidos_preparando': pedidos_preparando,
-        'pedidos_en_camino': pedidos_en_camino,
-        'pedidos_entregados': pedidos_entregados,
-        'pedidos_cancelados': pedidos_cancelados,
-        'pagos_pendientes': pagos_pendientes,
-        'pagos_aprobados': pagos_aprobados,
-        'pagos_rechazados': pagos_rechazados,
+        'total_pedidos': contadores['total'],
+        'pedidos_recibidos': por_estado.get('recibido', 0),
+        'pedidos_preparando': por_estado.get('preparando', 0),
+        'pedidos_en_camino': por_estado.get('en_camino', 0),
+        'pedidos_entregados': por_estado.get('entregado', 0),
+        'pedidos_cancelados': por_estado.get('cancelado', 0),
+        'pagos_pendientes': por_pago.get('pendiente', 0),
+        'pagos_aprobados': por_pago.get('approved', 0),
+        'pagos_rechazados': por_pago.get('rejected', 0),
         'filtro_estado': filtro_estado,
         'filtro_pago': filtro_pago,
         'filtro_fecha': filtro_fecha,
@@ -583,6 +583,49 @@ def pedidos_list(request):
     return render(request, 'admin_simple/pedidos_list.html', context)
 
 
+@login_required
+@user_passes_test(is_superuser, login_url='/admin/')
+def pedidos_exportar(request):
+    """
+    Exporta pedidos e ítems para contabilidad, en CSV (streaming) o XLSX.
+    Filtros por GET: desde, hasta (AAAA-MM-DD), estado, medio_pago, formato.
+    """
+    from django.http import FileResponse, StreamingHttpResponse
+    from pedidos import exportacion
+
+    formato = request.GET.get('formato', 'csv')
+    desde = request.GET.get('desde') or None
+    hasta = request.GET.get('hasta') or None
+    if formato not in ('csv', 'xlsx'):
+        return JsonResponse({'error': f'Formato inválido: {formato}'}, status=400)
+    if formato == 'xlsx' and not exportacion.XLSX_DISPONIBLE:
+        return JsonResponse(
+            {'error': 'Exportación XLSX no disponible (falta openpyxl)'}, status=400
+        )
+
+    try:
+        pedidos = exportacion.filtrar_pedidos(
+            desde=desde,
+            hasta=hasta,
+            estado=request.GET.get('estado') or None,
+            medio_pago=request.GET.get('medio_pago') or None,
+        )
+    except exportacion.FiltroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    nombre = exportacion.nombre_archivo(formato, desde, hasta)
+    if formato == 'xlsx':
+        return FileResponse(
+            exportacion.escribir_xlsx(pedidos), as_attachment=True, filename=nombre
+        )
+
+    response = StreamingHttpResponse(
+        exportacion.csv_streaming(pedidos), content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
 @login_required
 @user_passes_test(is_superuser, login_url='/admin/')
 def pedido_detail(request, pk):
@@ -653,6 +696,70 @@ def pedido_cambiar_estado(request, pk):
     })
 
 
+@login_required
+@user_passes_test(is_superuser, login_url='/admin/')
+@require_http_methods(["POST"])
+def pedidos_cambiar_estado_masivo(request):
+    """
+    Cambiar el estado de varios pedidos a la vez (un solo UPDATE; las
+    notificaciones se encolan en el outbox)
+    """
+    ids = [pk for pk in request.POST.getlist('pedidos') if pk.isdigit()]
+    nuevo_estado = request.POST.get('estado')
+    enviar_notificacion = (
+        request.POST.get('enviar_notificacion', 'false').lower() == 'true'
+    )
+    
+    if nuevo_estado not in dict(Pedido._meta.get_field('estado').choices):
+        return JsonResponse({
+            'success': False,
+            'error': 'Estado no válido'
+        }, status=400)
+    
+    if not ids:
+        return JsonResponse({
+            'success': False,
+            'error': 'No se seleccionaron pedidos'
+        }, status=400)
+    
+    with transaction.atomic():
+        pedidos = Pedido.objects.filter(pk__in=ids).cambiar_estado(nuevo_estado)
+        
+        # WhatsApp vía n8n sólo si el usuario lo confirmó
+        if enviar_notificacion:
+            from notificaciones.models import CanalNotificacion
+            from notificaciones.n8n_service import n8n_service
+            from notificaciones.outbox import encolar
+            
+            if n8n_service.enabled and n8n_service.api_key:
+                for pedido in pedidos:
+                    encolar(
+                        CanalNotificacion.WHATSAPP,
+                        {'pedido_id': pedido.id, 'tipo': 'estado'},
+                        pedido_id=pedido.id,
+                    )
+    
+    logger.info(
+        f'{len(pedidos)} pedidos cambiaron de estado a {nuevo_estado} '
+        f'por {request.user.username}'
+    )
+    
+    estados = dict(Pedido._meta.get_field('estado').choices)
+    mensaje = f'{len(pedidos)} pedidos actualizados a {estados[nuevo_estado]}'
+    if pedidos:
+        if enviar_notificacion:
+            mensaje += ' - Notificaciones encoladas'
+        else:
+            mensaje += ' - Sin notificación al cliente'
+    
+    return JsonResponse({
+        'success': True,
+        'message': mensaje,
+        'actualizados': [pedido.id for pedido in pedidos],
+        'nuevo_estado': nuevo_estado
+    })
+
+
 @login_required
 @user_passes_test(is_superuser, login_url='/admin/')
 @require_http_methods(["POST"])
@@ -868,7 +975,6 @@ def generar_catalogo_pdf(request):
     try:
         from reportlab.platypus import PageBreak, KeepTogether
         from reportlab.lib.utils import ImageReader
-        from PIL import Image as PILImage
         
         # Crear el objeto HttpResponse con el tipo de contenido PDF
         response = HttpResponse(content_type='application/pdf')
@@ -949,6 +1055,15 @@ def generar_catalogo_pdf(request):
         if not productos.exists():
             elements.append(Paragraph("No hay productos activos para mostrar", styles['Normal']))
         else:
+            # Descargar (en paralelo) o leer de la caché todas las imágenes
+            # antes de armar el PDF
+            productos = list(productos)
+            miniaturas = obtener_miniaturas(
+                imagen.imagen.url
+                for imagen in (producto.get_primary_image() for producto in productos)
+                if imagen and imagen.imagen
+            )
+            
             # Crear cuadrícula de productos (2 columnas)
             productos_por_fila = []
             fila_actual = []
@@ -958,58 +1073,20 @@ def generar_catalogo_pdf(request):
                 producto_elements = []
                 
                 # Obtener imagen principal
-                imagen_principal = producto.imagenes.filter(is_primary=True).first() or producto.imagenes.first()
+                imagen_principal = producto.get_primary_image()
                 
                 if imagen_principal and imagen_principal.imagen:
-                    try:
-                        # Descargar imagen desde Cloudinary
-                        img_url = imagen_principal.imagen.url
-                        
-                        # Agregar headers para evitar bloqueos
-                        headers = {
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                        }
-                        img_response = requests.get(img_url, timeout=15, headers=headers, verify=True)
-                        img_response.raise_for_status()
-                        
-                        # Abrir imagen con PIL
-                        pil_img = PILImage.open(BytesIO(img_response.content))
-                        
-                        # Convertir a RGB si es necesario
-                        if pil_img.mode in ('RGBA', 'LA', 'P'):
-                            pil_img = pil_img.convert('RGB')
-                        
-                        # Calcular dimensiones manteniendo aspect ratio
-                        max_width = 7*cm
-                        max_height = 6*cm
-                        
-                        # Obtener dimensiones originales
-                        orig_width, orig_height = pil_img.size
-                        aspect_ratio = orig_width / orig_height
-                        
-                        # Calcular nuevas dimensiones
-                        if aspect_ratio > (max_width / max_height):
-                            # Imagen más ancha
-                            new_width = max_width
-                            new_height = max_width / aspect_ratio
-                        else:
-                            # Imagen más alta
-                            new_height = max_height
-                            new_width = max_height * aspect_ratio
-                        
-                        # Redimensionar manteniendo aspecto
-                        pil_img.thumbnail((int(new_width * 3), int(new_height * 3)), PILImage.Resampling.LANCZOS)
-                        
-                        # Guardar en buffer
-                        img_buffer = BytesIO()
-                        pil_img.save(img_buffer, format='JPEG', quality=90, optimize=True)
-                        img_buffer.seek(0)
-                        
-                        # Crear imagen para ReportLab con dimensiones calculadas
-                        img = RLImage(img_buffer, width=new_width, height=new_height)
-                        producto_elements.append(img)
-                    except Exception as e:
-                        logger.warning(f'Error cargando imagen para producto {producto.id} ({img_url}): {str(e)}')
+                    miniatura = miniaturas.get(imagen_principal.imagen.url)
+                    if miniatura:
+                        # Escalar a la caja de 7x6 cm manteniendo el aspecto
+                        ancho, alto = ImageReader(BytesIO(miniatura)).getSize()
+                        escala = min(7*cm / ancho, 6*cm / alto)
+                        producto_elements.append(RLImage(
+                            BytesIO(miniatura),
+                            width=ancho * escala,
+                            height=alto * escala,
+                        ))
+                    else:
                         # Placeholder si falla la imagen
                         producto_elements.append(Spacer(1, 2*cm))
                         producto_elements.append(Paragraph("📷 Imagen no disponible", product_desc_style))
@@ -1073,7 +1150,10 @@ def generar_catalogo_pdf(request):
             
             # Resumen final
             elements.append(Spacer(1, 0.5*cm))
-            elements.append(Paragraph(f"<b>Total de productos en catálogo: {productos.count()}</b>", product_price_style))
+            elements.append(Paragraph(
+                f"<b>Total de productos en catálogo: {len(productos)}</b>",
+                product_price_style,
+            ))
         
         # Construir el PDF
         doc.build(elements)
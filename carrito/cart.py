@@ -1,14 +1,61 @@
+import logging
 from decimal import Decimal
 from django.conf import settings
+from django.core import signing
 from catalogo.models import Producto
 from .models import Carrito, CarritoItem
 from django.contrib.auth.models import AnonymousUser
 
+logger = logging.getLogger(__name__)
+
+COOKIE_SALT = 'carrito.cookie'
+
+
+def serializar_carrito(cart):
+    """
+    Carrito anónimo -> valor firmado de la cookie. Formato compacto:
+    [[producto_id, cantidad, precio en centavos], ...]. El precio es la
+    versión que vio el cliente; se verifica contra el actual en el checkout.
+    """
+    items = [
+        [int(product_id), int(item['quantity']), round(float(item['price']) * 100)]
+        for product_id, item in cart.items()
+    ]
+    return signing.dumps(items, salt=COOKIE_SALT, compress=True)
+
+
+def leer_carrito_cookie(request):
+    """Carrito anónimo guardado en la cookie firmada ({} si no hay o no es válida)."""
+    valor = request.COOKIES.get(settings.CARRITO_COOKIE_NAME)
+    if not valor:
+        return {}
+    try:
+        items = signing.loads(
+            valor, salt=COOKIE_SALT, max_age=settings.CARRITO_COOKIE_AGE
+        )
+        return {
+            str(int(product_id)): {
+                'quantity': int(cantidad), 'price': int(centavos) / 100
+            }
+            for product_id, cantidad, centavos in items
+        }
+    except (signing.BadSignature, TypeError, ValueError):
+        logger.info("Cookie de carrito inválida o vencida, se descarta")
+        return {}
+
+
+def usa_cookie():
+    return getattr(settings, 'CARRITO_ANONIMO', 'cookie') == 'cookie'
+
 
 class Cart:
     """
-    Carrito híbrido que funciona con sesiones para usuarios anónimos
-    y con base de datos para usuarios registrados.
+    Carrito híbrido: base de datos para usuarios registrados y, para los
+    anónimos, una cookie firmada (CARRITO_ANONIMO = 'cookie') o la sesión
+    (CARRITO_ANONIMO = 'session').
+
+    Con la cookie un visitante anónimo no crea filas en django_session; la
+    sesión del lado del servidor se crea sólo si algo la escribe.
     """
     
     def __init__(self, request):
@@ -19,31 +66,45 @@ class Cart:
         self.session = request.session
         self.user = getattr(request, 'user', None)
         
-        # Asegurar que la sesión tenga una clave
-        if not self.session.session_key:
-            self.session.create()
-        
         if self.user and self.user.is_authenticated:
             # Usuario registrado: usar base de datos
             self.carrito_db, created = Carrito.objects.get_or_create(
                 usuario=self.user,
                 defaults={'session_key': self.session.session_key}
             )
-            # Migrar carrito de sesión si existe
+            # Migrar carrito anónimo si existe
             if created:
                 self._migrate_session_to_db()
         else:
-            # Usuario anónimo: usar sesión
-            cart = self.session.get(settings.CART_SESSION_ID)
-            if not cart:
-                cart = self.session[settings.CART_SESSION_ID] = {}
-            self.cart = cart
+            # Usuario anónimo. El carrito se guarda recién en save(), así
+            # leerlo no escribe nada
+            self.cart = self._carrito_anonimo()
             # Limpiar cualquier valor no serializable
             self._clean_session_cart()
 
+    def _carrito_anonimo(self):
+        """
+        Carrito anónimo de este request. Se comparte entre las instancias de
+        Cart del mismo request, así ven los cambios aunque la cookie nueva
+        todavía no se haya enviado.
+        """
+        carrito = getattr(self.request, '_carrito', None)
+        if carrito is not None:
+            return carrito
+        if usa_cookie():
+            carrito = leer_carrito_cookie(self.request)
+            # Carritos guardados en la sesión antes de usar la cookie. Sólo se
+            # mira la sesión si el navegador ya tiene una
+            if not carrito and settings.SESSION_COOKIE_NAME in self.request.COOKIES:
+                carrito = self.session.get(settings.CART_SESSION_ID) or {}
+        else:
+            carrito = self.session.get(settings.CART_SESSION_ID) or {}
+        self.request._carrito = carrito
+        return carrito
+
     def _migrate_session_to_db(self):
-        """Migra el carrito de la sesión a la base de datos cuando el usuario se loguea"""
-        session_cart = self.session.get(settings.CART_SESSION_ID, {})
+        """Migra el carrito anónimo a la base de datos cuando el usuario se loguea"""
+        session_cart = self._carrito_anonimo()
         for product_id, item_data in session_cart.items():
             try:
                 producto = Producto.objects.get(id=int(product_id))
@@ -58,10 +119,9 @@ class Cart:
             except Producto.DoesNotExist:
                 continue
         
-        # Limpiar carrito de sesión después de migrar
-        if settings.CART_SESSION_ID in self.session:
-            del self.session[settings.CART_SESSION_ID]
-            self.session.modified = True
+        # Limpiar carrito anónimo después de migrar
+        if session_cart:
+            self._guardar_anonimo({})
 
     def _clean_session_cart(self):
         """Limpia valores no serializables del carrito de sesión"""
@@ -150,9 +210,51 @@ class Cart:
             return False
 
     def save(self):
-        """Marcar la sesión como modificada"""
+        """Guardar el carrito anónimo (en la cookie o en la sesión)"""
         if not (self.user and self.user.is_authenticated):
-            self.session.modified = True
+            self._guardar_anonimo(self.cart)
+
+    def _guardar_anonimo(self, cart):
+        self.request._carrito = cart
+        if usa_cookie():
+            # CarritoCookieMiddleware escribe la cookie en la respuesta
+            self.request._carrito_modificado = True
+            if settings.CART_SESSION_ID in self.session:
+                del self.session[settings.CART_SESSION_ID]
+        elif cart:
+            self.session[settings.CART_SESSION_ID] = cart
+        elif settings.CART_SESSION_ID in self.session:
+            # Borrar la clave ya marca la sesión como modificada
+            del self.session[settings.CART_SESSION_ID]
+
+    def verificar_precios(self):
+        """
+        Actualiza los precios guardados en el carrito con los vigentes del
+        producto. Se llama en el checkout: el precio guardado es el que vio el
+        cliente y puede haber cambiado. Devuelve los productos cuyo precio cambió.
+        """
+        cambiados = []
+        if self.user and self.user.is_authenticated:
+            for item in self.carrito_db.items.select_related('producto'):
+                precio = item.producto.get_precio_final
+                if item.precio_unitario != precio:
+                    item.precio_unitario = precio
+                    item.save(update_fields=['precio_unitario'])
+                    cambiados.append(item.producto)
+        else:
+            productos = Producto.objects.filter(id__in=self.cart.keys())
+            for producto in productos:
+                item = self.cart[str(producto.id)]
+                precio = float(producto.get_precio_final)
+                if item['price'] != precio:
+                    item['price'] = precio
+                    cambiados.append(producto)
+            if cambiados:
+                self.save()
+        if cambiados:
+            nombres = ', '.join(p.nombre for p in cambiados)
+            logger.info(f"Precios actualizados en el carrito: {nombres}")
+        return cambiados
 
     def remove(self, product):
         """
@@ -230,8 +332,7 @@ class Cart:
         if self.user and self.user.is_authenticated:
             return self.carrito_db.items.count()
         else:
-            cart = self.session.get(settings.CART_SESSION_ID, {})
-            return sum(item['quantity'] for item in cart.values())
+            return sum(item['quantity'] for item in self.cart.values())
 
     def get_items(self):
         """Obtiene todos los items del carrito con sus detalles"""
@@ -262,9 +363,8 @@ class Cart:
         if self.user and self.user.is_authenticated:
             self.carrito_db.limpiar()
         else:
-            if settings.CART_SESSION_ID in self.session:
-                del self.session[settings.CART_SESSION_ID]
-                self.save()
+            self.cart = {}
+            self.save()
 
     def get_items(self):
         """
@@ -1,10 +1,27 @@
+from django.conf import settings
+
 from .cart import Cart
 
+
 def total_carrito(request):
-    try:
-        cart = Cart(request)
-        total = cart.get_total_price()
-        return {'total_carrito': float(total)}
-    except Exception:
-        # En caso de error, retornar 0
-        return {'total_carrito': 0.0}
+    """
+    El total se calcula recién si el template lo usa (los templates llaman a
+    los callables) y sin tocar la sesión si el visitante anónimo no tiene
+    carrito: un bot que recorre el sitio no crea ni lee sesiones.
+    """
+    def total():
+        user = getattr(request, 'user', None)
+        autenticado = user is not None and user.is_authenticated
+        if not autenticado and not (
+            settings.CARRITO_COOKIE_NAME in request.COOKIES
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return 0.0
+        try:
+            cart = Cart(request)
+            return float(cart.get_total_price())
+        except Exception:
+            # En caso de error, retornar 0
+            return 0.0
+
+    return {'total_carrito': total}
@@ -0,0 +1,120 @@
+"""
+Prueba de carga de las escrituras en django_session.
+
+Simula visitantes anónimos que navegan el catálogo y usan el carrito, primero
+con la configuración anterior (SESSION_SAVE_EVERY_REQUEST = True, carrito en
+la sesión) y después con la actual, y cuenta los INSERT/UPDATE/DELETE sobre
+django_session de cada corrida. Todo corre dentro de una transacción que se
+revierte al final.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from catalogo.models import Producto
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _es_escritura(sql):
+    sql = sql.lstrip().upper()
+    return sql.startswith(('INSERT', 'UPDATE', 'DELETE')) and 'DJANGO_SESSION' in sql
+
+
+def simular_visitantes(producto, visitantes=20, vistas=10):
+    """
+    Cada visitante mira el carrito y el catálogo `vistas` veces y agrega un
+    producto. Devuelve {'requests': n, 'escrituras': n}.
+    """
+    url_carrito = reverse('carrito-api:simple-cart')
+    url_agregar = reverse('carrito-api:simple-add-to-cart')
+    url_catalogo = reverse('catalogo-api:producto-api-list')
+    requests = 0
+
+    with CaptureQueriesContext(connection) as consultas:
+        for _ in range(visitantes):
+            client = Client()
+            client.get(url_carrito)
+            client.post(
+                url_agregar,
+                data=json.dumps({'product_id': producto.id, 'quantity': 1}),
+                content_type='application/json',
+            )
+            requests += 2
+            for _ in range(vistas):
+                client.get(url_catalogo)
+                client.get(url_carrito)
+                requests += 2
+
+    escrituras = sum(
+        1 for consulta in consultas.captured_queries if _es_escritura(consulta['sql'])
+    )
+    return {'requests': requests, 'escrituras': escrituras}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cuántas escrituras en django_session ahorra guardar la sesión '
+        'sólo cuando cambia'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--visitantes', type=int, default=20, help='Visitantes simulados'
+        )
+        parser.add_argument(
+            '--vistas', type=int, default=10,
+            help='Vistas de catálogo y carrito por visitante',
+        )
+
+    def handle(self, *args, **options):
+        producto = Producto.objects.filter(is_active=True, stock__gt=0).first()
+        if producto is None:
+            self.stdout.write(
+                self.style.ERROR('❌ Hace falta al menos un producto activo con stock')
+            )
+            return
+
+        # Las sesiones se miden en la base aunque SESSION_ENGINE apunte a Redis
+        base = {
+            'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+        }
+        nuevos = {
+            'floreria_cristina.middleware.RenovarSesionMiddleware',
+            'floreria_cristina.middleware.CarritoCookieMiddleware',
+        }
+        anterior = [m for m in settings.MIDDLEWARE if m not in nuevos]
+        carga = (producto, options['visitantes'], options['vistas'])
+        resultados = {}
+        try:
+            with transaction.atomic():
+                with override_settings(
+                    SESSION_SAVE_EVERY_REQUEST=True, CARRITO_ANONIMO='session',
+                    MIDDLEWARE=anterior, **base,
+                ):
+                    resultados['antes'] = simular_visitantes(*carga)
+                with override_settings(SESSION_SAVE_EVERY_REQUEST=False, **base):
+                    resultados['ahora'] = simular_visitantes(*carga)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        for nombre, resultado in resultados.items():
+            self.stdout.write(
+                f"{nombre:>6}: {resultado['requests']} requests, "
+                f"{resultado['escrituras']} escrituras en django_session"
+            )
+        antes = resultados['antes']['escrituras']
+        ahora = resultados['ahora']['escrituras']
+        if antes:
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ Escrituras: -{(antes - ahora) / antes:.0%}')
+            )
@@ -15,11 +15,6 @@ def simple_add_to_cart(request):
     # Manejar preflight OPTIONS - Django CORS middleware maneja los headers
     if request.method == 'OPTIONS':
         return JsonResponse({})
-    # Asegurar que la sesión esté inicializada
-    if not request.session.session_key:
-        request.session.create()
-        request.session.save()
-
     try:
         # Obtener datos del request
         data = json.loads(request.body)
@@ -128,8 +123,9 @@ def simple_add_to_cart(request):
                 'is_empty': cart.is_empty
             }
             
-            # Guardar la sesión explícitamente
-            request.session.save()
+            # Guardar la sesión sólo si el carrito vive en ella y cambió
+            if request.session.modified:
+                request.session.save()
             
             response = JsonResponse({
                 'message': 'Producto agregado al carrito',
@@ -321,8 +317,9 @@ def simple_clear_cart(request):
         cart = Cart(request)
         cart.clear()
         
-        # Guardar la sesión explícitamente
-        request.session.save()
+        # Guardar la sesión sólo si el carrito vive en ella y cambió
+        if request.session.modified:
+            request.session.save()
         
         # Retornar carrito vacío
         cart_data = {
@@ -1,3 +1,167 @@
-from django.test import TestCase
+import time
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from catalogo.models import Producto
+from floreria_cristina.middleware import RenovarSesionMiddleware
+
+from .cart import Cart, leer_carrito_cookie, serializar_carrito
+from .context_processors import total_carrito
+from .management.commands.medir_escrituras_sesion import simular_visitantes
+
+
+def crear_producto(sku, stock):
+    return Producto.objects.create(
+        nombre=f'Producto {sku}', descripcion='-', sku=sku, precio=1000, stock=stock
+    )
+
+
+class SesionCarritoTests(TestCase):
+
+    def setUp(self):
+        self.producto = crear_producto('ROSAS', stock=50)
+
+    def _request(self, session):
+        request = RequestFactory().get('/')
+        request.session = session
+        return request
+
+    def test_leer_carrito_vacio_no_modifica_la_sesion(self):
+        session = SessionStore()
+        session.create()
+        session.modified = False
+
+        cart = Cart(self._request(session))
+        self.assertEqual(len(cart), 0)
+        self.assertEqual(cart.get_total_price(), 0)
+        self.assertFalse(session.modified)
+
+    @override_settings(CARRITO_ANONIMO='session')
+    def test_agregar_y_vaciar_modifican_la_sesion(self):
+        session = SessionStore()
+        session.create()
+        cart = Cart(self._request(session))
+
+        cart.add(self.producto, 2)
+        self.assertTrue(session.modified)
+        self.assertEqual(len(Cart(self._request(session))), 2)
+
+        session.modified = False
+        cart.clear()
+        self.assertTrue(session.modified)
+        self.assertEqual(len(Cart(self._request(session))), 0)
+
+    def test_renovacion_una_vez_por_intervalo(self):
+        session = SessionStore()
+        session['carrito'] = {}
+        middleware = RenovarSesionMiddleware(lambda request: HttpResponse())
+        middleware.intervalo = 3600
+
+        session.modified = False
+        middleware(self._request(session))
+        self.assertTrue(session.modified)
+
+        # Dentro del intervalo no vuelve a marcarla
+        session.modified = False
+        middleware(self._request(session))
+        self.assertFalse(session.modified)
+
+        session[RenovarSesionMiddleware.KEY] = int(time.time()) - 3601
+        session.modified = False
+        middleware(self._request(session))
+        self.assertTrue(session.modified)
+
+    def test_renovacion_ignora_sesiones_no_usadas(self):
+        session = SessionStore()
+        middleware = RenovarSesionMiddleware(lambda request: HttpResponse())
+        middleware(self._request(session))
+        self.assertFalse(session.modified)
+
+    def test_carrito_anonimo_persiste_entre_requests(self):
+        self.client.post(
+            reverse('carrito-api:simple-add-to-cart'),
+            data={'product_id': self.producto.id, 'quantity': 3},
+            content_type='application/json',
+        )
+        response = self.client.get(reverse('carrito-api:simple-cart'))
+        self.assertEqual(response.json()['total_items'], 3)
+
+    def test_menos_escrituras_en_django_session(self):
+        with override_settings(
+            SESSION_SAVE_EVERY_REQUEST=True, CARRITO_ANONIMO='session'
+        ):
+            antes = simular_visitantes(self.producto, visitantes=3, vistas=5)
+        ahora = simular_visitantes(self.producto, visitantes=3, vistas=5)
+
+        self.assertEqual(antes['requests'], ahora['requests'])
+        # Antes cada request con carrito escribía; ahora el carrito va en la cookie
+        self.assertGreater(antes['escrituras'], antes['requests'] / 2)
+        self.assertEqual(ahora['escrituras'], 0)
+
+
+class CarritoCookieTests(TestCase):
+
+    def setUp(self):
+        self.producto = crear_producto('ROSAS', stock=50)
+
+    def _agregar(self, cantidad=1):
+        return self.client.post(
+            reverse('carrito-api:simple-add-to-cart'),
+            data={'product_id': self.producto.id, 'quantity': cantidad},
+            content_type='application/json',
+        )
+
+    def test_carrito_anonimo_no_crea_sesion(self):
+        response = self._agregar(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('carrito', response.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+
+        response = self.client.get(reverse('carrito-api:simple-cart'))
+        self.assertEqual(response.json()['total_items'], 2)
+        self.assertNotIn('carrito', response.cookies)
+
+    def test_formato_compacto(self):
+        cart = {str(self.producto.id): {'quantity': 3, 'price': 1234.5}}
+        request = RequestFactory().get('/')
+        request.COOKIES['carrito'] = serializar_carrito(cart)
+        self.assertEqual(leer_carrito_cookie(request), cart)
+
+    def test_cookie_adulterada_se_descarta(self):
+        self._agregar(2)
+        valor = self.client.cookies['carrito'].value
+        firma = 'BB' if valor.endswith('AA') else 'AA'
+        self.client.cookies['carrito'] = valor[:-2] + firma
+        response = self.client.get(reverse('carrito-api:simple-cart'))
+        self.assertEqual(response.json()['total_items'], 0)
+
+    def test_vaciar_borra_la_cookie(self):
+        self._agregar()
+        response = self.client.post(reverse('carrito-api:simple-clear-cart'))
+        self.assertEqual(response.cookies['carrito'].value, '')
+
+    def test_verificar_precios_usa_el_precio_vigente(self):
+        self._agregar(2)
+        Producto.objects.filter(pk=self.producto.pk).update(precio=1500)
+
+        request = RequestFactory().get('/')
+        request.COOKIES['carrito'] = self.client.cookies['carrito'].value
+        request.session = SessionStore()
+        cart = Cart(request)
+        self.assertEqual(cart.get_total_price(), 2000)
+        self.assertEqual(cart.verificar_precios(), [self.producto])
+        self.assertEqual(cart.get_total_price(), 3000)
+        self.assertTrue(request._carrito_modificado)
+
+    def test_context_processor_sin_carrito_no_toca_la_sesion(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        contexto = total_carrito(request)
+        self.assertEqual(contexto['total_carrito'](), 0.0)
+        self.assertFalse(request.session.accessed)
@@ -5,13 +5,18 @@ from rest_framework.response import Response
 from django.conf import settings
 from django.utils import timezone
 from django.db.models import Q
+from .cache import cache_catalog_response
+from .facets import FILTROS_FACETAS, calcular_facetas, filtro_precio
 from .models import Producto, Categoria, TipoFlor, Ocasion, ZonaEntrega, HeroSlide
+from .pagination import ProductoCursorPagination
+from .search import buscar_productos
+from .suggest import suggest_service
 from .serializers import (
     ProductoSerializer, CategoriaSerializer, TipoFlorSerializer, 
     OcasionSerializer, ZonaEntregaSerializer, HeroSlideSerializer
 )
+from core.http import cliente
 from core.translation_service import translation_service
-import requests
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,26 +28,58 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
     Se puede acceder a la lista en `/api/catalogo/productos/`
     y al detalle en `/api/catalogo/productos/<slug>/`.
     """
-    queryset = Producto.objects.filter(is_active=True).prefetch_related(
-        'imagenes', 'tipo_flor', 'ocasiones'
-    )
+    queryset = Producto.objects.filter(is_active=True).select_related(
+        'categoria', 'tipo_flor'
+    ).prefetch_related('imagenes', 'ocasiones')
     serializer_class = ProductoSerializer
     permission_classes = [AllowAny]
     lookup_field = 'id'  # Usar ID para las URLs (cambiado de 'slug' a 'id')
     
+    @property
+    def paginator(self):
+        """Paginación por cursor opcional (`?pagination=cursor`) para scroll infinito"""
+        if not hasattr(self, '_paginator'):
+            pagination = self.request.query_params.get('pagination')
+            if self.action == 'list' and pagination == 'cursor':
+                self._paginator = ProductoCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+    
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Filtros por query params
-        categoria = self.request.query_params.get('categoria')
-        tipo_flor = self.request.query_params.get('tipo_flor')
-        ocasion = self.request.query_params.get('ocasion')
-        precio_min = self.request.query_params.get('precio_min')
-        precio_max = self.request.query_params.get('precio_max')
-        destacados = self.request.query_params.get('destacados')
-        adicionales = self.request.query_params.get('adicionales')
+        queryset = self.filtrar(super().get_queryset())
         ordering = self.request.query_params.get('ordering')
-        search = self.request.query_params.get('search')
+        
+        # Ordenamiento
+        if ordering == 'nombre':
+            queryset = queryset.order_by('nombre')
+        elif ordering == '-nombre':
+            queryset = queryset.order_by('-nombre')
+        elif ordering == 'precio':
+            queryset = queryset.order_by('precio')
+        elif ordering == '-precio':
+            queryset = queryset.order_by('-precio')
+        elif ordering == 'fecha':
+            queryset = queryset.order_by('created_at')
+        elif ordering == '-fecha':
+            queryset = queryset.order_by('-created_at')
+        
+        return queryset
+    
+    def filtrar(self, queryset, excluir=()):
+        """Aplica los filtros de los query params, salvo los de `excluir`"""
+        params = {
+            clave: valor for clave, valor in self.request.query_params.items()
+            if clave not in excluir
+        }
+        categoria = params.get('categoria')
+        tipo_flor = params.get('tipo_flor')
+        ocasion = params.get('ocasion')
+        precio_min = params.get('precio_min')
+        precio_max = params.get('precio_max')
+        destacados = params.get('destacados')
+        adicionales = params.get('adicionales')
+        search = params.get('search')
         
         if categoria:
             queryset = queryset.filter(categoria__slug=categoria)
@@ -53,11 +90,8 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
         if ocasion:
             queryset = queryset.filter(ocasiones__id=ocasion)
         
-        if precio_min:
-            queryset = queryset.filter(precio__gte=precio_min)
-        
-        if precio_max:
-            queryset = queryset.filter(precio__lte=precio_max)
+        if precio_min or precio_max:
+            queryset = queryset.filter(filtro_precio(precio_min, precio_max))
         
         if destacados == 'true':
             queryset = queryset.filter(is_featured=True)
@@ -67,31 +101,13 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
         elif adicionales == 'false':
             queryset = queryset.filter(es_adicional=False)
         
-        # Búsqueda por nombre o descripción
+        # Búsqueda por nombre o descripción, ordenada por relevancia
         if search:
-            from django.db.models import Q
-            queryset = queryset.filter(
-                Q(nombre__icontains=search) | 
-                Q(descripcion__icontains=search) |
-                Q(descripcion_corta__icontains=search)
-            )
-        
-        # Ordenamiento
-        if ordering == 'nombre':
-            queryset = queryset.order_by('nombre')
-        elif ordering == '-nombre':
-            queryset = queryset.order_by('-nombre')
-        elif ordering == 'precio':
-            queryset = queryset.order_by('precio')
-        elif ordering == '-precio':
-            queryset = queryset.order_by('-precio')
-        elif ordering == 'fecha':
-            queryset = queryset.order_by('created_at')
-        elif ordering == '-fecha':
-            queryset = queryset.order_by('-created_at')
+            queryset = buscar_productos(queryset, search)
         
         return queryset
     
+    @cache_catalog_response
     def list(self, request, *args, **kwargs):
         """Override list para aplicar traducciones"""
         response = super().list(request, *args, **kwargs)
@@ -105,17 +121,56 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
                 # Paginado
                 response.data['results'] = translation_service.translate_products(
                     response.data['results'], 
-                    target_lang=lang
+                    target_lang=lang,
+                    fetch_missing=settings.TRANSLATION_API_ON_REQUEST
                 )
             else:
                 # Sin paginación
                 response.data = translation_service.translate_products(
                     response.data, 
-                    target_lang=lang
+                    target_lang=lang,
+                    fetch_missing=settings.TRANSLATION_API_ON_REQUEST
                 )
         
+        # Conteos por filtro (?facets=true); se cachean junto con el listado
+        if request.query_params.get('facets') == 'true':
+            facetas = self.get_facetas(lang)
+            if isinstance(response.data, dict):
+                response.data['facets'] = facetas
+            else:
+                response.data = {'results': response.data, 'facets': facetas}
+        
         return response
     
+    def get_facetas(self, lang='es'):
+        """
+        Conteos de cada faceta bajo los filtros actuales, cada una sin su
+        propio filtro (ver catalogo.facets)
+        """
+        base = super().get_queryset()
+        sin_filtro = {
+            faceta: self.filter_queryset(self.filtrar(base, excluir=parametros))
+            for faceta, parametros in FILTROS_FACETAS.items()
+            if any(self.request.query_params.get(p) for p in parametros)
+        }
+        facetas = calcular_facetas(
+            self.filter_queryset(self.get_queryset()), sin_filtro=sin_filtro
+        )
+        
+        if lang != 'es':
+            opciones = (
+                facetas['categorias'] + facetas['tipos_flor'] + facetas['ocasiones']
+            )
+            traducciones = translation_service.translate_batch(
+                [opcion['nombre'] for opcion in opciones],
+                target_lang=lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
+            )
+            for opcion in opciones:
+                opcion['nombre'] = traducciones.get(opcion['nombre'], opcion['nombre'])
+        
+        return facetas
+    
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve para aplicar traducciones"""
         response = super().retrieve(request, *args, **kwargs)
@@ -127,12 +182,14 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
         if lang != 'es' and response.data:
             response.data = translation_service.translate_product(
                 response.data, 
-                target_lang=lang
+                target_lang=lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
             )
         
         return response
     
     @action(detail=False, methods=['get'])
+    @cache_catalog_response
     def recomendados(self, request):
         """Endpoint para obtener productos recomendados (destacados)"""
         productos = self.get_queryset().filter(is_featured=True, es_adicional=False)
@@ -142,11 +199,16 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
         # Traducir si es necesario
         lang = request.query_params.get('lang', 'es')
         if lang != 'es':
-            data = translation_service.translate_products(data, target_lang=lang)
+            data = translation_service.translate_products(
+                data,
+                target_lang=lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
+            )
         
         return Response(data)
     
     @action(detail=False, methods=['get'])
+    @cache_catalog_response
     def adicionales(self, request):
         """Endpoint para obtener productos adicionales"""
         productos = self.get_queryset().filter(es_adicional=True)
@@ -156,10 +218,37 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
         # Traducir si es necesario
         lang = request.query_params.get('lang', 'es')
         if lang != 'es':
-            data = translation_service.translate_products(data, target_lang=lang)
+            data = translation_service.translate_products(
+                data,
+                target_lang=lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
+            )
         
         return Response(data)
     
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        Sugerencias para el buscador: productos, categorías, tipos de flor y
+        ocasiones cuyo nombre coincide con `q`. Se resuelve desde un índice en
+        memoria (ver catalogo.suggest), sin consultar la base de datos.
+        """
+        query = request.query_params.get('q', '').strip()
+        lang = request.query_params.get('lang', 'es')
+        try:
+            limit = min(int(request.query_params.get('limit', 8)), 20)
+        except ValueError:
+            limit = 8
+
+        sugerencias = []
+        if query:
+            sugerencias = suggest_service.sugerir(query, lang=lang, limite=limit)
+        for sugerencia in sugerencias:
+            if sugerencia['imagen'] and sugerencia['imagen'].startswith('/'):
+                sugerencia['imagen'] = request.build_absolute_uri(sugerencia['imagen'])
+
+        return Response({'query': query, 'results': sugerencias})
+    
     @action(detail=False, methods=['post', 'get'], permission_classes=[AllowAny])
     def sync_to_social(self, request):
         """
@@ -182,7 +271,9 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
                 is_active=True,
                 publicar_en_redes=True,
                 stock__gt=0
-            ).prefetch_related('imagenes', 'categoria', 'tipo_flor', 'ocasiones')
+            ).select_related(
+                'categoria', 'tipo_flor'
+            ).prefetch_related('imagenes', 'ocasiones')
             
             # Si no es force, excluir productos publicados en las últimas 24 horas
             if not force:
@@ -221,6 +312,7 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
                     'categoria': producto.categoria.nombre if producto.categoria else None,
                     'tipo_flor': producto.tipo_flor.nombre if producto.tipo_flor else None,
                     'envio_gratis': producto.envio_gratis,
+                    'imagen_principal': producto.get_primary_image_url,
                     'imagenes': [
                         {
                             'url': img.imagen.url,
@@ -257,7 +349,7 @@ class ProductoViewSet(viewsets.ReadOnlyModelViewSet):
             
             logger.info(f"📤 Enviando {len(productos_data)} productos a n8n")
             
-            response = requests.post(
+            response = cliente('n8n').post(
                 webhook_url,
                 json={'productos': productos_data},
                 headers={
@@ -309,17 +401,19 @@ class CategoriaViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     lookup_field = 'slug'
     
+    @cache_catalog_response
     def list(self, request, *args, **kwargs):
         """Override list para aplicar traducciones"""
         response = super().list(request, *args, **kwargs)
         lang = request.query_params.get('lang', 'es')
         
         if lang != 'es' and response.data:
-            for item in response.data:
-                if 'nombre' in item:
-                    item['nombre'] = translation_service.translate_text(item['nombre'], lang)
-                if 'descripcion' in item:
-                    item['descripcion'] = translation_service.translate_text(item['descripcion'], lang)
+            response.data = translation_service.translate_items(
+                response.data,
+                ['nombre', 'descripcion'],
+                target_lang=lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
+            )
         
         return response
 
@@ -333,17 +427,19 @@ class TipoFlorViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TipoFlorSerializer
     permission_classes = [AllowAny]
     
+    @cache_catalog_response
     def list(self, request, *args, **kwargs):
         """Override list para aplicar traducciones"""
         response = super().list(request, *args, **kwargs)
         lang = request.query_params.get('lang', 'es')
         
         if lang != 'es' and response.data:
-            for item in response.data:
-                if 'nombre' in item:
-                    item['nombre'] = translation_service.translate_text(item['nombre'], lang)
-                if 'descripcion' in item:
-                    item['descripcion'] = translation_service.translate_text(item['descripcion'], lang)
+            response.data = translation_service.translate_items(
+                response.data,
+                ['nombre', 'descripcion'],
+                target_lang=lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
+            )
         
         return response
 
@@ -357,17 +453,19 @@ class OcasionViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OcasionSerializer
     permission_classes = [AllowAny]
     
+    @cache_catalog_response
     def list(self, request, *args, **kwargs):
         """Override list para aplicar traducciones"""
         response = super().list(request, *args, **kwargs)
         lang = request.query_params.get('lang', 'es')
         
         if lang != 'es' and response.data:
-            for item in response.data:
-                if 'nombre' in item:
-                    item['nombre'] = translation_service.translate_text(item['nombre'], lang)
-                if 'descripcion' in item:
-                    item['descripcion'] = translation_service.translate_text(item['descripcion'], lang)
+            response.data = translation_service.translate_items(
+                response.data,
+                ['nombre', 'descripcion'],
+                target_lang=lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
+            )
         
         return response
 
@@ -391,6 +489,7 @@ class HeroSlideViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = HeroSlideSerializer
     permission_classes = [AllowAny]
     
+    @cache_catalog_response
     def list(self, request, *args, **kwargs):
         """Listar slides con traducción según parámetro lang"""
         queryset = self.filter_queryset(self.get_queryset())
@@ -400,14 +499,13 @@ class HeroSlideViewSet(viewsets.ReadOnlyModelViewSet):
         # Obtener idioma de los query params
         target_lang = request.query_params.get('lang', 'es')
         
-        # Traducir cada slide
+        # Traducir todos los slides en un solo lote
         if target_lang != 'es':
-            for slide in data:
-                if slide.get('titulo'):
-                    slide['titulo'] = translation_service.translate_text(slide['titulo'], target_lang, source_lang='es')
-                if slide.get('subtitulo'):
-                    slide['subtitulo'] = translation_service.translate_text(slide['subtitulo'], target_lang, source_lang='es')
-                if slide.get('texto_boton'):
-                    slide['texto_boton'] = translation_service.translate_text(slide['texto_boton'], target_lang, source_lang='es')
+            data = translation_service.translate_items(
+                data,
+                ['titulo', 'subtitulo', 'texto_boton'],
+                target_lang=target_lang,
+                fetch_missing=settings.TRANSLATION_API_ON_REQUEST
+            )
         
         return Response(data)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CatalogoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalogo'
+
+    def ready(self):
+        import catalogo.checks  # noqa: F401 (registra el check catalogo.W001)
+        import catalogo.signals  # noqa: F401 (conecta las señales del catálogo)
@@ -0,0 +1,162 @@
+"""
+Caché de respuestas completas para la API pública del catálogo.
+
+Cada respuesta se guarda con una clave que incluye un número de generación.
+Al guardar o eliminar cualquier objeto del catálogo se incrementa la
+generación (ver catalogo.signals), con lo que todas las respuestas anteriores
+dejan de usarse sin tener que borrarlas una por una.
+
+Además se calculan ETag y Last-Modified para responder 304 Not Modified a
+los clientes que ya tienen la versión vigente.
+
+La generación tiene que ser la misma para todos los procesos, así que hace
+falta una caché compartida (ver `cache_compartida` y el check
+catalogo.W001).
+"""
+import functools
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+GENERACION_KEY = 'catalogo:generacion'
+MODIFICADO_KEY = 'catalogo:modificado'
+
+# Backends cuyo contenido no ven los demás procesos
+BACKENDS_LOCALES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Parámetros que no cambian la respuesta y no deben fragmentar la caché
+PARAMETROS_IGNORADOS = {
+    '_', 'utm_source', 'utm_medium', 'utm_campaign', 'fbclid', 'gclid',
+}
+
+
+def cache_compartida():
+    """True si la caché por defecto la comparten todos los procesos."""
+    return settings.CACHES['default']['BACKEND'] not in BACKENDS_LOCALES
+
+
+def get_generacion():
+    """Generación vigente del catálogo (se inicializa en 1)."""
+    generacion = cache.get(GENERACION_KEY)
+    if generacion is None:
+        cache.add(GENERACION_KEY, 1, timeout=None)
+        cache.add(MODIFICADO_KEY, int(time.time()), timeout=None)
+        generacion = cache.get(GENERACION_KEY, 1)
+    return generacion
+
+
+def get_ultima_modificacion():
+    """Timestamp (segundos) del último cambio registrado en el catálogo."""
+    modificado = cache.get(MODIFICADO_KEY)
+    if modificado is None:
+        modificado = int(time.time())
+        cache.add(MODIFICADO_KEY, modificado, timeout=None)
+    return modificado
+
+
+def invalidar_catalogo():
+    """Incrementa la generación: todas las respuestas cacheadas quedan obsoletas."""
+    try:
+        cache.incr(GENERACION_KEY)
+    except ValueError:
+        cache.set(GENERACION_KEY, 2, timeout=None)
+    cache.set(MODIFICADO_KEY, int(time.time()), timeout=None)
+    logger.debug('Caché del catálogo invalidada')
+
+
+def _clave(request, nombre):
+    params = sorted(
+        (key, value)
+        for key in request.GET
+        if key not in PARAMETROS_IGNORADOS
+        for value in request.GET.getlist(key)
+    )
+    # ?lang=es y sin lang devuelven lo mismo
+    params = [
+        (key, value) for key, value in params
+        if not (key == 'lang' and value == 'es')
+    ]
+    firma = hashlib.sha1(
+        json.dumps([request.get_host(), request.path, params]).encode('utf-8')
+    ).hexdigest()
+    return f'catalogo:respuesta:{get_generacion()}:{nombre}:{firma}'
+
+
+def _no_modificado(request, etag, ultima_modificacion):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = [tag.strip() for tag in if_none_match.split(',')]
+        return etag in etags or '*' in etags
+
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+    )
+    return if_modified_since is not None and ultima_modificacion <= if_modified_since
+
+
+def _respuesta(request, entrada):
+    if _no_modificado(request, entrada['etag'], entrada['last_modified']):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entrada['content'], content_type='application/json')
+    response['ETag'] = entrada['etag']
+    response['Last-Modified'] = http_date(entrada['last_modified'])
+    max_age = getattr(settings, 'CATALOGO_CACHE_MAX_AGE', 0)
+    response['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+
+def cache_catalog_response(view_method):
+    """
+    Decorador para métodos GET de los viewsets del catálogo.
+
+    Cachea el JSON ya renderizado por (generación, vista, host, path y query
+    params normalizados, incluido `lang`) y responde 304 cuando el cliente
+    envía un If-None-Match / If-Modified-Since vigente.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        renderer = getattr(request, 'accepted_renderer', None)
+        if not getattr(settings, 'CATALOGO_CACHE_ENABLED', True) or (
+            renderer is not None and renderer.format != 'json'
+        ):
+            # La API navegable y otros formatos se sirven sin caché
+            return view_method(self, request, *args, **kwargs)
+
+        nombre = f'{self.__class__.__name__}.{view_method.__name__}'
+        clave = _clave(request, nombre)
+
+        entrada = cache.get(clave)
+        if entrada is not None:
+            return _respuesta(request, entrada)
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code != 200 or not hasattr(response, 'data'):
+            return response
+
+        content = json.dumps(
+            response.data, cls=JSONEncoder, ensure_ascii=False
+        ).encode('utf-8')
+        entrada = {
+            'content': content,
+            'etag': quote_etag(hashlib.md5(content).hexdigest()),
+            'last_modified': get_ultima_modificacion(),
+        }
+        cache.set(
+            clave, entrada, timeout=getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 300)
+        )
+        return _respuesta(request, entrada)
+
+    return wrapper
@@ -0,0 +1,27 @@
+"""
+Checks de configuración del catálogo
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from .cache import cache_compartida
+
+
+@register()
+def cache_catalogo_compartida(app_configs, **kwargs):
+    """
+    La caché de respuestas necesita que la generación se vea en todos los
+    procesos.
+    """
+    if not getattr(settings, 'CATALOGO_CACHE_ENABLED', True) or cache_compartida():
+        return []
+    return [Warning(
+        'CATALOGO_CACHE_ENABLED está activo con una caché local del proceso.',
+        hint=(
+            'Los cambios hechos desde otro proceso (Celery, daemons, otro worker) '
+            'no invalidan las respuestas cacheadas. Configurá REDIS_URL o una '
+            'DatabaseCache, o desactivá CATALOGO_CACHE_ENABLED.'
+        ),
+        id='catalogo.W001',
+    )]
@@ -23,7 +23,7 @@ def facebook_product_feed(request):
     ).exclude(
         sku='',
         slug='',
-    ).prefetch_related('imagenes', 'categoria', 'tipo_flor')
+    ).select_related('categoria', 'tipo_flor').prefetch_related('imagenes')
     
     # Crear estructura XML
     rss = ET.Element('rss', {
@@ -83,13 +83,15 @@ def facebook_product_feed(request):
         ET.SubElement(item, 'g:link').text = producto_url
         
         # Imagen principal
-        imagen_principal = producto.imagenes.filter(is_primary=True).first() or producto.imagenes.first()
+        imagen_principal = producto.get_primary_image()
         if not imagen_principal:
             continue
         ET.SubElement(item, 'g:image_link').text = imagen_principal.imagen.url
         
-        # Imágenes adicionales (máximo 10)
-        imagenes_adicionales = producto.imagenes.exclude(id=imagen_principal.id)[:10]
+        # Imágenes adicionales (máximo 10), desde las imágenes precargadas
+        imagenes_adicionales = [
+            img for img in producto.imagenes.all() if img.id != imagen_principal.id
+        ][:10]
         for img in imagenes_adicionales:
             ET.SubElement(item, 'g:additional_image_link').text = img.imagen.url
         
@@ -147,7 +149,7 @@ def facebook_product_feed_csv(request):
     ).exclude(
         sku='',
         slug='',
-    ).prefetch_related('imagenes', 'categoria', 'tipo_flor')
+    ).select_related('categoria', 'tipo_flor').prefetch_related('imagenes')
     
     # Crear CSV en memoria
     output = StringIO()
@@ -180,11 +182,13 @@ def facebook_product_feed_csv(request):
             continue
         
         # Imagen principal
-        imagen_principal = producto.imagenes.filter(is_primary=True).first() or producto.imagenes.first()
+        imagen_principal = producto.get_primary_image()
         image_link = imagen_principal.imagen.url if imagen_principal else ''
         
-        # Imágenes adicionales
-        imagenes_adicionales = producto.imagenes.exclude(id=imagen_principal.id)[:10] if imagen_principal else []
+        # Imágenes adicionales, desde las imágenes precargadas
+        imagenes_adicionales = [
+            img for img in producto.imagenes.all() if img.id != imagen_principal.id
+        ][:10] if imagen_principal else []
         additional_images = ','.join([img.imagen.url for img in imagenes_adicionales])
         
         # Disponibilidad
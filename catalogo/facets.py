@@ -0,0 +1,156 @@
+"""
+Conteos por faceta para los filtros del listado de productos.
+
+Los conteos se calculan con dos consultas agregadas: una agrupada por
+(categoría, tipo de flor) con Count condicionales para rangos de precio,
+destacados y adicionales, y otra agrupada por ocasión (relación muchos a
+muchos). El resto se suma en Python.
+
+Cada faceta se cuenta sin su propio filtro: con ?categoria=ramos el listado
+trae sólo ramos, pero la faceta de categorías sigue mostrando cuántos
+productos hay en las demás, para poder cambiar de categoría. Las facetas
+cuyo filtro no está activo usan el queryset filtrado, así que sin filtros
+siguen siendo dos consultas y cada filtro activo agrega una.
+
+Los rangos de precio usan los mismos límites que ?precio_min/?precio_max
+(ambos inclusive, ver filtro_precio): el conteo de un rango es lo que trae
+el listado al elegirlo. Un precio justo en el límite entra en los dos
+rangos vecinos, igual que en los dos listados.
+"""
+from django.db.models import Count, Q
+
+from .models import Producto
+
+# Rangos de precio (ARS) que ofrece el filtro; None es "sin límite"
+RANGOS_PRECIO = (
+    (None, 20000),
+    (20000, 40000),
+    (40000, 70000),
+    (70000, None),
+)
+
+# Parámetros del listado que filtran cada faceta (ver ProductoViewSet)
+FILTROS_FACETAS = {
+    'categorias': ('categoria',),
+    'tipos_flor': ('tipo_flor',),
+    'ocasiones': ('ocasion',),
+    'precios': ('precio_min', 'precio_max'),
+    'destacados': ('destacados',),
+    'adicionales': ('adicionales',),
+}
+
+
+def filtro_precio(minimo, maximo):
+    """Condición de ?precio_min/?precio_max; None (o vacío) es "sin límite"."""
+    condicion = Q()
+    if minimo not in (None, ''):
+        condicion &= Q(precio__gte=minimo)
+    if maximo not in (None, ''):
+        condicion &= Q(precio__lte=maximo)
+    return condicion
+
+
+def _ordenar(opciones):
+    return sorted(
+        opciones.values(), key=lambda opcion: (-opcion['count'], opcion['nombre'])
+    )
+
+
+def _por_id(queryset):
+    # Subconsulta por id: evita que los joins y anotaciones de los filtros
+    # (ocasiones, búsqueda) dupliquen filas o se cuelen en el GROUP BY
+    return Producto.objects.filter(id__in=queryset.order_by().values('id'))
+
+
+def _conteos_agrupados(queryset):
+    """Todas las facetas salvo ocasiones, con una consulta."""
+    rangos = {
+        f'rango_{i}': Count('id', filter=filtro_precio(minimo, maximo))
+        for i, (minimo, maximo) in enumerate(RANGOS_PRECIO)
+    }
+    grupos = _por_id(queryset).values(
+        'categoria__slug', 'categoria__nombre', 'tipo_flor_id', 'tipo_flor__nombre'
+    ).annotate(
+        total=Count('id'),
+        destacados=Count('id', filter=Q(is_featured=True)),
+        adicionales=Count('id', filter=Q(es_adicional=True)),
+        **rangos,
+    )
+
+    conteos = {'total': 0, 'destacados': 0, 'adicionales': 0}
+    categorias, tipos_flor = {}, {}
+    precios = [0] * len(RANGOS_PRECIO)
+
+    for grupo in grupos:
+        conteos['total'] += grupo['total']
+        conteos['destacados'] += grupo['destacados']
+        conteos['adicionales'] += grupo['adicionales']
+        for i in range(len(RANGOS_PRECIO)):
+            precios[i] += grupo[f'rango_{i}']
+
+        slug = grupo['categoria__slug']
+        if slug:
+            opcion = categorias.setdefault(
+                slug, {'slug': slug, 'nombre': grupo['categoria__nombre'], 'count': 0}
+            )
+            opcion['count'] += grupo['total']
+
+        tipo_id = grupo['tipo_flor_id']
+        if tipo_id:
+            opcion = tipos_flor.setdefault(tipo_id, {
+                'id': tipo_id, 'nombre': grupo['tipo_flor__nombre'], 'count': 0,
+            })
+            opcion['count'] += grupo['total']
+
+    conteos['categorias'] = _ordenar(categorias)
+    conteos['tipos_flor'] = _ordenar(tipos_flor)
+    conteos['precios'] = [
+        {'min': minimo, 'max': maximo, 'count': count}
+        for (minimo, maximo), count in zip(RANGOS_PRECIO, precios)
+    ]
+    return conteos
+
+
+def _conteo_ocasiones(queryset):
+    ocasiones = _por_id(queryset).values(
+        'ocasiones__id', 'ocasiones__nombre'
+    ).annotate(total=Count('id'))
+    return _ordenar({
+        fila['ocasiones__id']: {
+            'id': fila['ocasiones__id'],
+            'nombre': fila['ocasiones__nombre'],
+            'count': fila['total'],
+        }
+        for fila in ocasiones
+        if fila['ocasiones__id']
+    })
+
+
+def calcular_facetas(queryset, sin_filtro=None):
+    """
+    Devuelve los conteos de cada faceta para `queryset`.
+
+    `sin_filtro` es {faceta: queryset} con los querysets que aplican todos
+    los filtros menos el de esa faceta (claves de FILTROS_FACETAS); las
+    facetas que no figuran se cuentan sobre `queryset`. `total` es siempre
+    el de `queryset`.
+
+    Estructura:
+        {
+            'total': 12,
+            'categorias': [{'slug', 'nombre', 'count'}],
+            'tipos_flor': [{'id', 'nombre', 'count'}],
+            'ocasiones': [{'id', 'nombre', 'count'}],
+            'precios': [{'min', 'max', 'count'}],
+            'destacados': 3,
+            'adicionales': 1,
+        }
+    """
+    sin_filtro = sin_filtro or {}
+
+    facetas = _conteos_agrupados(queryset)
+    for faceta, otro_queryset in sin_filtro.items():
+        if faceta != 'ocasiones':
+            facetas[faceta] = _conteos_agrupados(otro_queryset)[faceta]
+    facetas['ocasiones'] = _conteo_ocasiones(sin_filtro.get('ocasiones', queryset))
+    return facetas
@@ -0,0 +1,79 @@
+"""
+Comando para precalcular las traducciones de todo el catálogo
+"""
+
+from django.core.management.base import BaseCommand
+
+from catalogo.cache import invalidar_catalogo
+from catalogo.models import Categoria, HeroSlide, Ocasion, Producto, TipoFlor
+from catalogo.tasks import CAMPOS_TRADUCIBLES
+from core.translation_service import translation_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Precalcula y guarda las traducciones de productos, categorías, '
+        'tipos de flor, ocasiones y slides'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idiomas',
+            help=(
+                'Idiomas destino separados por coma '
+                '(default: settings.TRANSLATION_LANGUAGES)'
+            )
+        )
+        parser.add_argument(
+            '--incluir-inactivos',
+            action='store_true',
+            help='Incluir también los objetos inactivos'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Cantidad de textos por lote (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        idiomas = (
+            options['idiomas'].split(',') if options['idiomas']
+            else translation_service.languages
+        )
+        lote = options['lote']
+
+        if not translation_service.client:
+            self.stdout.write(self.style.WARNING(
+                '⚠️ GOOGLE_TRANSLATE_API_KEY no configurada: '
+                'sólo se usarán las traducciones ya guardadas'
+            ))
+
+        textos = []
+        for model in (Producto, Categoria, TipoFlor, Ocasion, HeroSlide):
+            queryset = model.objects.all()
+            if not options['incluir_inactivos']:
+                queryset = queryset.filter(is_active=True)
+
+            campos = CAMPOS_TRADUCIBLES[model._meta.label_lower]
+            for fila in queryset.values_list(*campos).iterator(chunk_size=lote):
+                textos.extend(t for t in fila if t)
+
+        textos = list(dict.fromkeys(textos))
+        self.stdout.write(
+            f'📝 {len(textos)} textos distintos a traducir a: {", ".join(idiomas)}'
+        )
+
+        nuevas = 0
+        for inicio in range(0, len(textos), lote):
+            bloque = textos[inicio:inicio + lote]
+            nuevas += translation_service.pretranslate(bloque, languages=idiomas)
+            self.stdout.write(f'   {min(inicio + lote, len(textos))}/{len(textos)}')
+
+        if nuevas:
+            # Las respuestas en otros idiomas cacheadas antes de traducir quedan viejas
+            invalidar_catalogo()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Catálogo pretraducido ({len(textos)} textos, '
+            f'{nuevas} traducciones nuevas)'
+        ))
@@ -0,0 +1,58 @@
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations
+
+
+INDICES_POSTGRES = [
+    (
+        'catalogo_producto_search_vector_gin',
+        'CREATE INDEX IF NOT EXISTS catalogo_producto_search_vector_gin '
+        'ON catalogo_producto USING gin (search_vector)',
+    ),
+]
+
+
+def crear_indices(apps, schema_editor):
+    # Los índices GIN sólo existen en PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for _, sql in INDICES_POSTGRES:
+        schema_editor.execute(sql)
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for nombre, _ in INDICES_POSTGRES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+def calcular_vectores(apps, schema_editor):
+    from catalogo.search import vector_busqueda
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    Producto = apps.get_model('catalogo', 'Producto')
+    Producto.objects.update(search_vector=vector_busqueda())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0006_producto_publicar_en_redes'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='producto',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_indices, borrar_indices),
+        migrations.RunPython(calcular_vectores, migrations.RunPython.noop),
+    ]
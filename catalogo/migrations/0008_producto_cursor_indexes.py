@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0007_producto_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='producto_activo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['is_active', 'precio', 'id'], name='producto_activo_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['is_active', 'nombre', 'id'], name='producto_activo_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,148 @@
+"""
+Miniaturas de las imágenes de productos para el catálogo PDF del taller.
+
+Antes el PDF descargaba y achicaba cada imagen de Cloudinary de a una dentro
+del request; con unos 150 productos tardaba minutos y llegaba al timeout de
+gunicorn. Ahora `obtener_miniaturas` resuelve todas las imágenes antes de
+armar el PDF:
+
+- Las que ya están en la caché de disco se leen de ahí, sin tocar la red.
+- El resto se descarga en paralelo con un pool de a lo sumo
+  settings.CATALOGO_PDF_DESCARGAS_PARALELAS hilos. Todos usan el cliente
+  compartido 'imagenes' (ver core.http). Cada hilo decodifica la imagen, la
+  achica y la guarda en la caché como JPEG.
+
+La clave de la caché es la URL de la imagen más VERSION, que identifica el
+tamaño y la calidad de la miniatura. Un archivo nuevo tiene otra URL. Si se
+cambian las dimensiones o la calidad hay que subir VERSION: las miniaturas
+viejas dejan de usarse y se borran solas después de CADUCIDAD_DIAS sin uso.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image
+
+from core.http import cliente
+
+logger = logging.getLogger(__name__)
+
+# Caja máxima de la miniatura en píxeles: 7x6 cm a ~216 dpi (3 px por punto)
+ANCHO_MAXIMO = 595
+ALTO_MAXIMO = 510
+CALIDAD = 90
+VERSION = 1
+
+CADUCIDAD_DIAS = 30
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+
+def directorio():
+    ruta = getattr(settings, 'CATALOGO_PDF_CACHE_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'catalogo_pdf'
+    )
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def ruta_cache(url):
+    texto = f'{VERSION}:{ANCHO_MAXIMO}x{ALTO_MAXIMO}:{CALIDAD}:{url}'
+    clave = hashlib.sha256(texto.encode()).hexdigest()
+    return os.path.join(directorio(), f'{clave}.jpg')
+
+
+def generar_miniatura(contenido):
+    """Bytes de una imagen cualquiera -> bytes del JPEG achicado."""
+    imagen = Image.open(BytesIO(contenido))
+    if imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+    imagen.thumbnail((ANCHO_MAXIMO, ALTO_MAXIMO), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    imagen.save(buffer, format='JPEG', quality=CALIDAD, optimize=True)
+    return buffer.getvalue()
+
+
+def _leer_cache(ruta):
+    try:
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+    except OSError:
+        return None
+    # Marca el uso para que `limpiar` no la borre
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+    return contenido
+
+
+def _guardar_cache(ruta, contenido):
+    # Se escribe en un temporal y se renombra: otro proceso nunca lee un JPEG a medias
+    try:
+        descriptor, temporal = tempfile.mkstemp(
+            dir=os.path.dirname(ruta), suffix='.tmp'
+        )
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        logger.warning(f'No se pudo guardar la miniatura {ruta}: {e}')
+
+
+def _descargar(url):
+    try:
+        response = cliente('imagenes').get(url, timeout=15, headers=HEADERS)
+        response.raise_for_status()
+        miniatura = generar_miniatura(response.content)
+    except Exception as e:
+        logger.warning(f'Error cargando imagen {url}: {e}')
+        return None
+    _guardar_cache(ruta_cache(url), miniatura)
+    return miniatura
+
+
+def obtener_miniaturas(urls):
+    """
+    {url: bytes del JPEG} de las imágenes pedidas. Las que no se pudieron
+    descargar quedan en None.
+    """
+    miniaturas = {}
+    faltantes = []
+    for url in dict.fromkeys(urls):
+        miniaturas[url] = _leer_cache(ruta_cache(url))
+        if miniaturas[url] is None:
+            faltantes.append(url)
+
+    if faltantes:
+        hilos = min(
+            len(faltantes), getattr(settings, 'CATALOGO_PDF_DESCARGAS_PARALELAS', 8)
+        )
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            miniaturas.update(zip(faltantes, pool.map(_descargar, faltantes)))
+        limpiar()
+
+    logger.info(
+        f'Miniaturas del catálogo: {len(miniaturas) - len(faltantes)} de la caché, '
+        f'{len(faltantes)} descargadas'
+    )
+    return miniaturas
+
+
+def limpiar(dias=CADUCIDAD_DIAS):
+    """Borra las miniaturas que no se usaron en `dias` días. Devuelve cuántas borró."""
+    limite = time.time() - dias * 24 * 3600
+    borradas = 0
+    with os.scandir(directorio()) as entradas:
+        for entrada in entradas:
+            try:
+                if entrada.is_file() and entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    borradas += 1
+            except OSError:
+                pass
+    return borradas
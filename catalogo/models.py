@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
 from django.utils.text import slugify
@@ -177,6 +178,8 @@ class Producto(models.Model):
         verbose_name='Última publicación en redes',
         help_text='Fecha de la última vez que se publicó en redes sociales'
     )
+    # Mantenido por catalogo.signals (ver catalogo.search); sólo se usa en PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Creado el')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Actualizado el')
 
@@ -188,6 +191,19 @@ class Producto(models.Model):
             models.Index(fields=['id', 'slug']),
             models.Index(fields=['nombre']),
             models.Index(fields=['-created_at']),
+            # Paginación por cursor (ver catalogo.pagination)
+            models.Index(
+                fields=['is_active', 'created_at', 'id'],
+                name='producto_activo_fecha_idx',
+            ),
+            models.Index(
+                fields=['is_active', 'precio', 'id'],
+                name='producto_activo_precio_idx',
+            ),
+            models.Index(
+                fields=['is_active', 'nombre', 'id'],
+                name='producto_activo_nombre_idx',
+            ),
         ]
 
     def __str__(self):
@@ -216,15 +232,29 @@ class Producto(models.Model):
     def get_precio_final(self):
         return self.precio_descuento if self.tiene_descuento else self.precio
 
+    def get_primary_image(self):
+        """
+        Devuelve la imagen principal del producto, o la primera si ninguna
+        está marcada como principal.
+
+        Si las imágenes se cargaron con prefetch_related('imagenes') se
+        resuelve en memoria, sin consultas adicionales.
+        """
+        if 'imagenes' in getattr(self, '_prefetched_objects_cache', {}):
+            imagenes = list(self.imagenes.all())
+            for imagen in imagenes:
+                if imagen.is_primary:
+                    return imagen
+            return imagenes[0] if imagenes else None
+
+        return self.imagenes.filter(is_primary=True).first() or self.imagenes.first()
+
     @property
     def get_primary_image_url(self):
         """Devuelve la URL de la imagen principal o un placeholder."""
-        primary = self.imagenes.filter(is_primary=True).first()
-        if primary:
-            return primary.imagen.url
-        first = self.imagenes.first()
-        if first:
-            return first.imagen.url
+        imagen = self.get_primary_image()
+        if imagen:
+            return imagen.imagen.url
         # Placeholder externo si no hay imagen
         return "https://via.placeholder.com/400x300?text=Sin+Imagen"
     
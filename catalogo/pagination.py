@@ -0,0 +1,124 @@
+"""
+Paginación por cursor (keyset) para el listado de productos.
+
+Es opcional: se activa con `?pagination=cursor`. A diferencia de la
+paginación por offset, cada página cuesta lo mismo sin importar cuán
+profunda sea y los productos nuevos no desplazan los ya vistos (scroll
+infinito en mobile).
+
+Cada orden es (columna, id) y el cursor guarda los dos valores del último
+producto de la página; la siguiente se pide con una comparación de filas,
+`(columna, id) > (valor, id)`, que los índices compuestos de Producto
+(is_active + columna + id) resuelven con un range scan. El CursorPagination
+de DRF, en cambio, sólo guarda la columna y saltea los empates con un
+offset, que deja de funcionar pasados `offset_cutoff` productos con el
+mismo valor (por ejemplo, el mismo precio).
+"""
+import json
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+# Valor del parámetro `ordering` -> orden de la consulta
+ORDENES_CURSOR = {
+    'nombre': ('nombre', 'id'),
+    '-nombre': ('-nombre', '-id'),
+    'precio': ('precio', 'id'),
+    '-precio': ('-precio', '-id'),
+    'fecha': ('created_at', 'id'),
+    '-fecha': ('-created_at', '-id'),
+}
+ORDEN_CURSOR_DEFAULT = ORDENES_CURSOR['-fecha']
+
+
+def _invertir(ordering):
+    return tuple(
+        campo[1:] if campo.startswith('-') else f'-{campo}' for campo in ordering
+    )
+
+
+def _despues_de(queryset, ordering, posicion):
+    """Filas posteriores a `posicion` (valor, id) según `ordering`."""
+    columna = ordering[0]
+    descendente = columna.startswith('-')
+    field = queryset.model._meta.get_field(columna.lstrip('-'))
+    valor, pk = posicion
+
+    qn = connection.ops.quote_name
+    tabla = qn(queryset.model._meta.db_table)
+    sql = '({t}.{c}, {t}.{id}) {op} (%s, %s)'.format(
+        t=tabla, c=qn(field.column), id=qn('id'), op='<' if descendente else '>'
+    )
+    params = (field.get_db_prep_value(field.to_python(valor), connection), pk)
+    return queryset.filter(RawSQL(sql, params, output_field=BooleanField()))
+
+
+class ProductoCursorPagination(CursorPagination):
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        # Sin `ordering` (o si se busca por relevancia) van primero los más nuevos
+        return ORDENES_CURSOR.get(
+            request.query_params.get('ordering'), ORDEN_CURSOR_DEFAULT
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        hacia_atras = self.cursor is not None and self.cursor.reverse
+
+        # La página anterior se pide en el orden inverso y después se da vuelta
+        ordering = _invertir(self.ordering) if hacia_atras else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = _despues_de(queryset, ordering, self.cursor.position)
+
+        resultados = list(queryset[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+        if hacia_atras:
+            self.page.reverse()
+
+        venimos_de_una_pagina = self.cursor is not None
+        self.has_next = venimos_de_una_pagina if hacia_atras else hay_mas
+        self.has_previous = hay_mas if hacia_atras else venimos_de_una_pagina
+        return self.page
+
+    def _posicion(self, producto):
+        valor = getattr(producto, self.ordering[0].lstrip('-'))
+        return json.dumps([str(valor), producto.pk])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        posicion = self._posicion(self.page[-1])
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=posicion))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        posicion = self._posicion(self.page[0])
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=posicion))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+
+        try:
+            valor, pk = json.loads(cursor.position)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=(valor, pk))
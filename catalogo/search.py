@@ -0,0 +1,88 @@
+"""
+Búsqueda de productos del catálogo.
+
+En PostgreSQL usa la columna `Producto.search_vector` (índice GIN, mantenida
+por catalogo.signals) con las extensiones unaccent y pg_trgm: sin tildes
+("cumpleanos" encuentra "Cumpleaños"), tolerante a errores de tipeo y con
+resultados ordenados por relevancia.
+
+En otros motores (SQLite en desarrollo) se usa el filtro icontains de siempre.
+"""
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, Func, Q, Value
+
+# Configuración de text search de PostgreSQL (stemming en español)
+CONFIG_BUSQUEDA = 'spanish'
+
+# Campos indexados, con su peso en el ranking
+CAMPOS_BUSQUEDA = (
+    ('nombre', 'A'),
+    ('descripcion_corta', 'B'),
+    ('descripcion', 'C'),
+)
+
+# Similitud mínima (word_similarity de pg_trgm) entre el texto buscado y
+# alguna palabra del nombre para aceptar un resultado con errores de tipeo
+SIMILITUD_MINIMA = 0.4
+
+
+class Unaccent(Func):
+    function = 'unaccent'
+
+
+def busqueda_avanzada_disponible():
+    return connection.vendor == 'postgresql'
+
+
+def vector_busqueda():
+    """Expresión SearchVector con la que se llena `Producto.search_vector`."""
+    vector = None
+    for campo, peso in CAMPOS_BUSQUEDA:
+        parte = SearchVector(Unaccent(F(campo)), weight=peso, config=CONFIG_BUSQUEDA)
+        vector = parte if vector is None else vector + parte
+    return vector
+
+
+def actualizar_search_vector(queryset):
+    """Recalcula el vector de búsqueda de los productos de `queryset`."""
+    if not busqueda_avanzada_disponible():
+        return 0
+    return queryset.update(search_vector=vector_busqueda())
+
+
+def buscar_productos(queryset, texto):
+    """
+    Filtra `queryset` por `texto`.
+
+    En PostgreSQL anota `relevancia` y ordena por ella; quien llame puede
+    reordenar después (por ejemplo con el parámetro `ordering` de la API).
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+
+    if not busqueda_avanzada_disponible():
+        return queryset.filter(
+            Q(nombre__icontains=texto) |
+            Q(descripcion__icontains=texto) |
+            Q(descripcion_corta__icontains=texto)
+        )
+
+    texto_sin_tildes = Unaccent(Value(texto))
+    query = SearchQuery(
+        texto_sin_tildes, config=CONFIG_BUSQUEDA, search_type='websearch'
+    )
+    similitud = TrigramWordSimilarity(texto_sin_tildes, Unaccent(F('nombre')))
+
+    return queryset.annotate(
+        similitud=similitud,
+        relevancia=SearchRank(F('search_vector'), query) + similitud,
+    ).filter(
+        Q(search_vector=query) | Q(similitud__gte=SIMILITUD_MINIMA)
+    ).order_by('-relevancia', '-created_at')
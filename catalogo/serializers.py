@@ -74,11 +74,8 @@ class ProductoSerializer(serializers.ModelSerializer):
         ]
 
     def get_imagen_principal(self, obj):
-        url = getattr(obj, 'get_primary_image_url', None)
-        if callable(url):
-            url = url()
-        else:
-            url = obj.get_primary_image_url if hasattr(obj, 'get_primary_image_url') else None
+        # Usa las imágenes precargadas por el viewset (prefetch_related('imagenes'))
+        url = obj.get_primary_image_url
 
         if not url:
             return '/images/no-image.jpg'
@@ -0,0 +1,113 @@
+"""
+Señales del catálogo
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidar_catalogo
+from .models import Categoria, HeroSlide, Ocasion, Producto, ProductoImagen, TipoFlor
+from .search import CAMPOS_BUSQUEDA, actualizar_search_vector
+from .tasks import CAMPOS_TRADUCIBLES, pretraducir_objeto
+
+logger = logging.getLogger(__name__)
+
+
+def _pretraducir_ahora(label, pk):
+    """Sin Celery: pretraduce en el proceso, después del commit."""
+    try:
+        pretraducir_objeto(label, pk)
+    except Exception as e:
+        # El guardado ya se confirmó; el comando pretraducir_catalogo lo completa
+        logger.error(f"Error pretraduciendo {label} {pk}: {str(e)}")
+
+
+def _despertar_worker(label, pk):
+    try:
+        pretraducir_objeto.delay(label, pk)
+    except Exception as e:
+        # Sin broker queda para el comando pretraducir_catalogo
+        logger.warning(
+            f"No se pudo encolar la pretraducción de {label} {pk}: {str(e)}"
+        )
+
+
+def _encolar_pretraduccion(instance):
+    label = instance._meta.label_lower
+    pk = instance.pk
+    if getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        transaction.on_commit(lambda: _pretraducir_ahora(label, pk))
+    else:
+        transaction.on_commit(lambda: _despertar_worker(label, pk))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=TipoFlor)
+@receiver(post_save, sender=Ocasion)
+@receiver(post_save, sender=HeroSlide)
+def pretraducir_al_guardar(sender, instance, update_fields=None, raw=False, **kwargs):
+    """
+    Encola la pretraducción del objeto guardado. Los guardados parciales que
+    no tocan campos traducibles (stock, fecha de publicación, etc.) se ignoran.
+    """
+    if raw:
+        return
+
+    campos = CAMPOS_TRADUCIBLES[instance._meta.label_lower]
+    if update_fields is not None and not set(update_fields) & set(campos):
+        return
+
+    _encolar_pretraduccion(instance)
+
+
+@receiver(m2m_changed, sender=Producto.ocasiones.through)
+def pretraducir_ocasiones_producto(sender, instance, action, **kwargs):
+    """Las ocasiones se asignan después del save del producto."""
+    if action == 'post_add' and isinstance(instance, Producto):
+        _encolar_pretraduccion(instance)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=ProductoImagen)
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=TipoFlor)
+@receiver(post_save, sender=Ocasion)
+@receiver(post_save, sender=HeroSlide)
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=ProductoImagen)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=TipoFlor)
+@receiver(post_delete, sender=Ocasion)
+@receiver(post_delete, sender=HeroSlide)
+def invalidar_cache_catalogo(sender, instance, raw=False, **kwargs):
+    """Cualquier cambio en el catálogo deja obsoletas las respuestas cacheadas."""
+    if raw:
+        return
+
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(m2m_changed, sender=Producto.ocasiones.through)
+def invalidar_cache_ocasiones_producto(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_busqueda_producto(
+    sender, instance, update_fields=None, raw=False, **kwargs
+):
+    """Recalcula el vector de búsqueda cuando cambia algún campo indexado."""
+    if raw:
+        return
+
+    campos = [campo for campo, _ in CAMPOS_BUSQUEDA]
+    if update_fields is not None and not set(update_fields) & set(campos):
+        return
+
+    actualizar_search_vector(Producto.objects.filter(pk=instance.pk))
@@ -0,0 +1,301 @@
+"""
+Índice en memoria para las sugerencias del buscador (typeahead).
+
+Cada proceso arma, por idioma, un índice de prefijos y de trigramas sobre los
+nombres de productos, categorías, tipos de flor y ocasiones activos. Una
+consulta sólo toca diccionarios en memoria, sin acceder a la base de datos.
+
+El índice queda asociado a la generación del catálogo (ver catalogo.cache).
+Cuando una señal de guardado/borrado la incrementa, la siguiente consulta
+dispara la reconstrucción del índice de ese idioma en un hilo aparte, también
+en los demás workers. Mientras tanto las consultas siguen usando el índice
+anterior, así que ningún request espera la recarga de productos.
+
+Los primeros índices los arma precargar(), que wsgi.py llama al iniciar cada
+worker (gunicorn sin --preload lo importa después del fork, así que el hilo
+abre su propia conexión). Si una consulta llega antes, arma ese idioma
+dentro del request.
+"""
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import get_generacion
+from .models import Categoria, Ocasion, Producto, TipoFlor
+
+logger = logging.getLogger(__name__)
+
+# Los prefijos más largos se verifican contra la palabra completa
+LARGO_MAXIMO_PREFIJO = 12
+
+# Proporción mínima de trigramas compartidos para una sugerencia aproximada
+SIMILITUD_MINIMA = 0.4
+
+# Orden de los tipos de sugerencia a igual puntaje
+PRIORIDAD_TIPO = {'producto': 0, 'categoria': 1, 'tipo_flor': 2, 'ocasion': 3}
+
+# Lado en píxeles de la miniatura que acompaña cada sugerencia
+LADO_MINIATURA = 96
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes: 'Cumpleaños' -> 'cumpleanos'."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower().strip()
+
+
+def url_miniatura(url: Optional[str]) -> Optional[str]:
+    """
+    URL de una miniatura cuadrada si la imagen está en Cloudinary; si no, la
+    original.
+    """
+    if not url or 'res.cloudinary.com' not in url or '/upload/' not in url:
+        return url
+    transformacion = f'c_fill,w_{LADO_MINIATURA},h_{LADO_MINIATURA},q_auto,f_auto'
+    return url.replace('/upload/', f'/upload/{transformacion}/', 1)
+
+
+def trigramas(texto: str) -> Set[str]:
+    trigs = set()
+    for palabra in texto.split():
+        palabra = f'  {palabra} '
+        trigs.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return trigs
+
+
+@dataclass
+class Sugerencia:
+    tipo: str
+    id: int
+    texto: str
+    slug: Optional[str] = None
+    imagen: Optional[str] = None
+    # Textos normalizados por los que se puede encontrar (traducido y original)
+    claves: List[str] = field(default_factory=list)
+
+    def as_dict(self):
+        return {
+            'tipo': self.tipo,
+            'id': self.id,
+            'texto': self.texto,
+            'slug': self.slug,
+            'imagen': self.imagen,
+        }
+
+
+class IndiceSugerencias:
+    """Índice de un idioma: prefijos de palabra y trigramas -> sugerencias."""
+
+    def __init__(self, sugerencias: List[Sugerencia]):
+        self.sugerencias = sugerencias
+        self.prefijos: Dict[str, Set[int]] = defaultdict(set)
+        self.trigramas: Dict[str, Set[int]] = defaultdict(set)
+        # Desempate precalculado: tipo de sugerencia y textos más cortos primero
+        self.orden_base = [(PRIORIDAD_TIPO[s.tipo], len(s.texto)) for s in sugerencias]
+
+        for posicion, sugerencia in enumerate(sugerencias):
+            for clave in sugerencia.claves:
+                for palabra in clave.split():
+                    for largo in range(1, min(len(palabra), LARGO_MAXIMO_PREFIJO) + 1):
+                        self.prefijos[palabra[:largo]].add(posicion)
+                for trig in trigramas(clave):
+                    self.trigramas[trig].add(posicion)
+
+    def _por_prefijo(self, palabras: List[str]) -> Set[int]:
+        candidatos = None
+        for palabra in palabras:
+            encontrados = self.prefijos.get(palabra[:LARGO_MAXIMO_PREFIJO], set())
+            candidatos = encontrados if candidatos is None else candidatos & encontrados
+            if not candidatos:
+                return set()
+
+        if any(len(palabra) > LARGO_MAXIMO_PREFIJO for palabra in palabras):
+            candidatos = {
+                posicion for posicion in candidatos
+                if all(
+                    any(
+                        p.startswith(palabra)
+                        for clave in self.sugerencias[posicion].claves
+                        for p in clave.split()
+                    )
+                    for palabra in palabras
+                )
+            }
+        return candidatos
+
+    def _aproximadas(self, consulta: str, excluir: Set[int]) -> Dict[int, float]:
+        trigs = trigramas(consulta)
+        if not trigs:
+            return {}
+
+        coincidencias = defaultdict(int)
+        for trig in trigs:
+            for posicion in self.trigramas.get(trig, ()):
+                if posicion not in excluir:
+                    coincidencias[posicion] += 1
+
+        return {
+            posicion: cantidad / len(trigs)
+            for posicion, cantidad in coincidencias.items()
+            if cantidad / len(trigs) >= SIMILITUD_MINIMA
+        }
+
+    def buscar(self, consulta: str, limite: int) -> List[Sugerencia]:
+        consulta = normalizar(consulta)
+        palabras = consulta.split()
+        if not palabras:
+            return []
+
+        def orden(posicion, puntaje=1.0):
+            empieza = any(
+                clave.startswith(consulta)
+                for clave in self.sugerencias[posicion].claves
+            )
+            return (-puntaje, not empieza) + self.orden_base[posicion]
+
+        exactas = self._por_prefijo(palabras)
+        resultados = heapq.nsmallest(limite, exactas, key=orden)
+
+        if len(resultados) < limite:
+            aproximadas = self._aproximadas(consulta, exactas)
+            resultados += heapq.nsmallest(
+                limite - len(resultados), aproximadas,
+                key=lambda posicion: orden(posicion, aproximadas[posicion]),
+            )
+
+        return [self.sugerencias[posicion] for posicion in resultados]
+
+
+def _cargar_sugerencias(lang: str) -> List[Sugerencia]:
+    sugerencias = []
+
+    productos = Producto.objects.filter(is_active=True).prefetch_related('imagenes')
+    for producto in productos:
+        imagen = producto.get_primary_image()
+        sugerencias.append(Sugerencia(
+            tipo='producto', id=producto.id, texto=producto.nombre, slug=producto.slug,
+            imagen=url_miniatura(imagen.imagen.url) if imagen else None,
+        ))
+    for categoria in Categoria.objects.filter(is_active=True):
+        sugerencias.append(Sugerencia(
+            tipo='categoria', id=categoria.id, texto=categoria.nombre,
+            slug=categoria.slug,
+            imagen=url_miniatura(categoria.imagen.url) if categoria.imagen else None,
+        ))
+    for tipo, model in (('tipo_flor', TipoFlor), ('ocasion', Ocasion)):
+        activos = model.objects.filter(is_active=True)
+        for id_, nombre in activos.values_list('id', 'nombre'):
+            sugerencias.append(Sugerencia(tipo=tipo, id=id_, texto=nombre))
+
+    traducciones = {}
+    if lang != 'es':
+        # Sólo traducciones ya guardadas: el índice nunca llama a Google
+        from core.translation_service import translation_service
+        traducciones = translation_service.translate_batch(
+            [s.texto for s in sugerencias], target_lang=lang, fetch_missing=False
+        )
+
+    for sugerencia in sugerencias:
+        original = sugerencia.texto
+        sugerencia.texto = traducciones.get(original, original)
+        sugerencia.claves = list(dict.fromkeys(
+            [normalizar(sugerencia.texto), normalizar(original)]
+        ))
+
+    return sugerencias
+
+
+class SuggestService:
+    """Índices por idioma de este proceso, reconstruidos al cambiar el catálogo."""
+
+    def __init__(self, en_segundo_plano: bool = True):
+        self._indices: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._primer_armado = threading.Lock()
+        self._reconstruyendo: Set[str] = set()
+        # False reconstruye dentro de la consulta (tests)
+        self.en_segundo_plano = en_segundo_plano
+
+    def _armar(self, lang: str, generacion: int) -> IndiceSugerencias:
+        inicio = time.monotonic()
+        indice = IndiceSugerencias(_cargar_sugerencias(lang))
+        self._indices[lang] = (generacion, indice)
+        logger.info(
+            f'Índice de sugerencias ({lang}) armado con {len(indice.sugerencias)} '
+            f'entradas en {(time.monotonic() - inicio) * 1000:.0f} ms'
+        )
+        return indice
+
+    def _reconstruir(self, lang: str, generacion: int):
+        try:
+            self._armar(lang, generacion)
+        except Exception:
+            logger.exception(f'Error reconstruyendo el índice de sugerencias ({lang})')
+        finally:
+            with self._lock:
+                self._reconstruyendo.discard(lang)
+            if self.en_segundo_plano:
+                # El hilo abrió su propia conexión
+                connection.close()
+
+    def _precargar(self, idiomas: List[str]):
+        try:
+            for lang in idiomas:
+                with self._primer_armado:
+                    if lang not in self._indices:
+                        self._armar(lang, get_generacion())
+        except Exception:
+            logger.exception('Error precargando los índices de sugerencias')
+        finally:
+            connection.close()
+
+    def precargar(self):
+        """Arma en un hilo los índices de todos los idiomas, sin esperar un request."""
+        idiomas = ['es', *getattr(settings, 'TRANSLATION_LANGUAGES', [])]
+        threading.Thread(
+            target=self._precargar, args=(list(dict.fromkeys(idiomas)),),
+            name='sugerencias-precarga', daemon=True,
+        ).start()
+
+    def get_indice(self, lang: str = 'es') -> IndiceSugerencias:
+        generacion = get_generacion()
+        actual = self._indices.get(lang)
+        if actual is None:
+            with self._primer_armado:
+                actual = self._indices.get(lang)
+                if actual is None:
+                    return self._armar(lang, generacion)
+        if actual[0] == generacion:
+            return actual[1]
+
+        # Índice viejo: se sigue sirviendo mientras se arma el nuevo (uno por idioma)
+        with self._lock:
+            if lang in self._reconstruyendo:
+                return actual[1]
+            self._reconstruyendo.add(lang)
+        if not self.en_segundo_plano:
+            self._reconstruir(lang, generacion)
+            return self._indices[lang][1]
+        threading.Thread(
+            target=self._reconstruir, args=(lang, generacion),
+            name=f'sugerencias-{lang}', daemon=True,
+        ).start()
+        return actual[1]
+
+    def sugerir(self, consulta: str, lang: str = 'es', limite: int = 8) -> List[dict]:
+        # Un índice por idioma configurado; cualquier otro valor usa el español
+        if lang not in getattr(settings, 'TRANSLATION_LANGUAGES', []):
+            lang = 'es'
+        return [s.as_dict() for s in self.get_indice(lang).buscar(consulta, limite)]
+
+
+# Instancia por proceso
+suggest_service = SuggestService()
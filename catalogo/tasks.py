@@ -0,0 +1,63 @@
+"""
+Tareas de Celery del catálogo
+"""
+
+from celery import shared_task
+from django.apps import apps
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Campos que se muestran traducidos en la API pública, por modelo
+CAMPOS_TRADUCIBLES = {
+    'catalogo.producto': ('nombre', 'descripcion', 'descripcion_corta'),
+    'catalogo.categoria': ('nombre', 'descripcion'),
+    'catalogo.tipoflor': ('nombre', 'descripcion'),
+    'catalogo.ocasion': ('nombre', 'descripcion'),
+    'catalogo.heroslide': ('titulo', 'subtitulo', 'texto_boton'),
+}
+
+
+def textos_traducibles(instance):
+    """
+    Devuelve los textos de `instance` que la API sirve traducidos.
+    Para productos incluye los nombres de categoría, tipo de flor y ocasiones,
+    que viajan anidados en el payload del producto.
+    """
+    campos = CAMPOS_TRADUCIBLES.get(instance._meta.label_lower, ())
+    textos = [getattr(instance, campo, None) for campo in campos]
+
+    if instance._meta.label_lower == 'catalogo.producto':
+        if instance.categoria_id:
+            textos.append(instance.categoria.nombre)
+        if instance.tipo_flor_id:
+            textos.append(instance.tipo_flor.nombre)
+        if instance.pk:
+            textos.extend(instance.ocasiones.values_list('nombre', flat=True))
+
+    return [t for t in textos if t]
+
+
+@shared_task
+def pretraducir_objeto(model_label, pk):
+    """
+    Precalcula las traducciones de un objeto del catálogo para todos los
+    idiomas configurados, de modo que la API las sirva desde el caché.
+    """
+    from core.translation_service import translation_service
+
+    model = apps.get_model(model_label)
+    try:
+        instance = model.objects.get(pk=pk)
+    except model.DoesNotExist:
+        logger.warning(f"{model_label} {pk} no existe, nada que pretraducir")
+        return 0
+
+    nuevas = translation_service.pretranslate(textos_traducibles(instance))
+    if nuevas:
+        # Las respuestas en otros idiomas cacheadas antes de traducir quedan viejas
+        from .cache import invalidar_catalogo
+        invalidar_catalogo()
+    logger.info(f"Pretraducido {model_label} {pk}: {nuevas} traducciones nuevas")
+    return nuevas
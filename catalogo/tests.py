@@ -1,3 +1,633 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from core.models import Translation
+from core.tests import TraduccionConGoogleFalsoMixin
+from core.translation_service import translation_service
+
+from . import miniaturas, suggest
+from .cache import get_generacion
+from .checks import cache_catalogo_compartida
+from .facets import calcular_facetas
+from .pagination import ORDENES_CURSOR
+from .tasks import pretraducir_objeto
+from .models import Categoria, Ocasion, Producto, ProductoImagen, TipoFlor
+from .suggest import IndiceSugerencias, Sugerencia, normalizar
+
+
+@override_settings(CATALOGO_CACHE_ENABLED=False)
+class ProductoImagenPrincipalTests(TestCase):
+    """La imagen principal debe resolverse desde el prefetch, sin N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Ramos')
+        cls.tipo_flor = TipoFlor.objects.create(nombre='Rosas')
+        cls.ocasion = Ocasion.objects.create(nombre='Cumpleaños')
+
+    def crear_productos(self, cantidad, inicio=0):
+        for i in range(inicio, inicio + cantidad):
+            producto = Producto.objects.create(
+                nombre=f'Producto {i}',
+                descripcion='Descripción',
+                sku=f'SKU-{i}',
+                precio=1000,
+                categoria=self.categoria,
+                tipo_flor=self.tipo_flor,
+            )
+            producto.ocasiones.add(self.ocasion)
+            # bulk_create evita la optimización de imagen de ProductoImagen.save()
+            ProductoImagen.objects.bulk_create([
+                ProductoImagen(
+                    producto=producto, imagen=f'productos/{i}-a.jpg', orden=0
+                ),
+                ProductoImagen(
+                    producto=producto, imagen=f'productos/{i}-b.jpg', orden=1,
+                    is_primary=True,
+                ),
+            ])
+
+    def contar_queries_listado(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/catalogo/productos/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_listado_no_crece_con_la_cantidad_de_productos(self):
+        self.crear_productos(2)
+        queries_pocos, _ = self.contar_queries_listado()
+
+        self.crear_productos(8, inicio=2)
+        queries_muchos, data = self.contar_queries_listado()
+
+        self.assertEqual(len(data), 10)
+        self.assertEqual(queries_pocos, queries_muchos)
+
+    def test_imagen_principal_desde_prefetch(self):
+        self.crear_productos(1)
+        producto = Producto.objects.prefetch_related('imagenes').get()
+
+        with self.assertNumQueries(0):
+            imagen = producto.get_primary_image()
+
+        self.assertTrue(imagen.is_primary)
+        self.assertTrue(imagen.imagen.name.endswith('-b.jpg'))
+
+    def test_imagen_principal_sin_prefetch(self):
+        self.crear_productos(1)
+        producto = Producto.objects.get()
+        producto.imagenes.update(is_primary=False)
+
+        self.assertTrue(producto.get_primary_image().imagen.name.endswith('-a.jpg'))
+
+
+@override_settings(CATALOGO_CACHE_ENABLED=True)
+class CacheRespuestasCatalogoTests(TestCase):
+    """Las respuestas del catálogo se cachean hasta que cambia el catálogo."""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre='Ramos')
+
+    def test_segunda_respuesta_sin_queries(self):
+        primera = self.client.get('/api/catalogo/categorias/')
+        self.assertEqual(primera.status_code, 200)
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get('/api/catalogo/categorias/?utm_source=ig')
+
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+
+    def test_not_modified_con_etag_vigente(self):
+        primera = self.client.get('/api/catalogo/categorias/')
+
+        response = self.client.get(
+            '/api/catalogo/categorias/', HTTP_IF_NONE_MATCH=primera['ETag']
+        )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], primera['ETag'])
+
+    def test_guardar_invalida_respuestas(self):
+        self.client.get('/api/catalogo/categorias/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nombre='Plantas')
+
+        response = self.client.get('/api/catalogo/categorias/')
+        self.assertEqual(len(response.json()), 2)
+
+    def test_lang_es_comparte_clave_con_el_default(self):
+        self.client.get('/api/catalogo/categorias/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/catalogo/categorias/?lang=es')
+        self.assertEqual(response.status_code, 200)
+
+    def test_check_exige_una_cache_compartida(self):
+        avisos = cache_catalogo_compartida(None)
+        self.assertEqual([w.id for w in avisos], ['catalogo.W001'])
+
+        redis = {'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://x',
+        }}
+        with self.settings(CACHES=redis):
+            self.assertEqual(cache_catalogo_compartida(None), [])
+        with self.settings(CATALOGO_CACHE_ENABLED=False):
+            self.assertEqual(cache_catalogo_compartida(None), [])
+
+
+@override_settings(CATALOGO_CACHE_ENABLED=False)
+class BusquedaProductosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        nombres = ['Ramo Cumpleaños Feliz', 'Caja de Rosas', 'Orquídea Blanca']
+        for i, nombre in enumerate(nombres):
+            Producto.objects.create(
+                nombre=nombre, descripcion='Arreglo floral', sku=f'BUS-{i}', precio=1000
+            )
+
+    def buscar(self, texto):
+        response = self.client.get('/api/catalogo/productos/', {'search': texto})
+        self.assertEqual(response.status_code, 200)
+        return [p['nombre'] for p in response.json()]
+
+    def test_busqueda_por_nombre(self):
+        self.assertEqual(self.buscar('Rosas'), ['Caja de Rosas'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Requiere unaccent y pg_trgm')
+    def test_busqueda_sin_tildes_y_con_errores(self):
+        self.assertEqual(self.buscar('cumpleanos'), ['Ramo Cumpleaños Feliz'])
+        self.assertEqual(self.buscar('orquidea'), ['Orquídea Blanca'])
+        self.assertIn('Caja de Rosas', self.buscar('rozas'))
+
+
+class IndiceSugerenciasTests(SimpleTestCase):
+
+    def setUp(self):
+        sugerencias = [
+            Sugerencia(tipo='producto', id=1, texto='Ramo de Rosas Rojas'),
+            Sugerencia(tipo='producto', id=2, texto='Caja de Girasoles'),
+            Sugerencia(tipo='ocasion', id=3, texto='Cumpleaños'),
+        ]
+        for sugerencia in sugerencias:
+            sugerencia.claves = [normalizar(sugerencia.texto)]
+        self.indice = IndiceSugerencias(sugerencias)
+
+    def ids(self, consulta):
+        return [s.id for s in self.indice.buscar(consulta, 5)]
+
+    def test_prefijos_de_varias_palabras(self):
+        self.assertEqual(self.ids('ros roj'), [1])
+        self.assertEqual(self.ids('gira'), [2])
+
+    def test_sin_tildes_y_con_errores(self):
+        self.assertEqual(self.ids('cumpleanos'), [3])
+        self.assertEqual(self.ids('girasoels'), [2])
+
+    def test_sin_coincidencias(self):
+        self.assertEqual(self.ids('tulipanes'), [])
+
+
+class SuggestServiceTests(SimpleTestCase):
+
+    def test_sirve_el_indice_viejo_mientras_reconstruye(self):
+        liberar = threading.Event()
+        cargas = []
+
+        def cargar(lang):
+            cargas.append(lang)
+            if len(cargas) > 1:
+                liberar.wait(5)
+            return [Sugerencia(
+                tipo='producto', id=len(cargas), texto='Rosas', claves=['rosas']
+            )]
+
+        servicio = suggest.SuggestService()
+        with mock.patch.object(suggest, '_cargar_sugerencias', side_effect=cargar), \
+                mock.patch.object(
+                    suggest, 'get_generacion', return_value=1
+                ) as generacion:
+            viejo = servicio.get_indice('es')
+
+            generacion.return_value = 2
+            inicio = time.monotonic()
+            self.assertIs(servicio.get_indice('es'), viejo)
+            self.assertIs(servicio.get_indice('es'), viejo)
+            self.assertLess(time.monotonic() - inicio, 1)
+
+            liberar.set()
+            for hilo in threading.enumerate():
+                if hilo.name == 'sugerencias-es':
+                    hilo.join(5)
+            nuevo = servicio.get_indice('es')
+
+        self.assertIsNot(nuevo, viejo)
+        self.assertEqual(nuevo.sugerencias[0].id, 2)
+        self.assertEqual(len(cargas), 2)
+
+    @override_settings(TRANSLATION_LANGUAGES=['en'])
+    def test_precarga_los_indices_de_cada_idioma(self):
+        cargas = []
+
+        def cargar(lang):
+            cargas.append(lang)
+            return [Sugerencia(tipo='producto', id=1, texto='Rosas', claves=['rosas'])]
+
+        servicio = suggest.SuggestService()
+        with mock.patch.object(suggest, '_cargar_sugerencias', side_effect=cargar), \
+                mock.patch.object(suggest, 'get_generacion', return_value=1):
+            servicio.precargar()
+            for hilo in threading.enumerate():
+                if hilo.name == 'sugerencias-precarga':
+                    hilo.join(5)
+
+            self.assertEqual(cargas, ['es', 'en'])
+            # Las consultas ya no arman nada
+            self.assertEqual(servicio.sugerir('ros', lang='en')[0]['texto'], 'Rosas')
+            self.assertEqual(cargas, ['es', 'en'])
+
+    def test_miniatura_de_cloudinary(self):
+        base = 'https://res.cloudinary.com/demo/image/upload'
+        url = f'{base}/v1/media/productos/rosas.jpg'
+        self.assertEqual(
+            suggest.url_miniatura(url),
+            f'{base}/c_fill,w_96,h_96,q_auto,f_auto/v1/media/productos/rosas.jpg',
+        )
+        self.assertEqual(suggest.url_miniatura('/media/rosas.jpg'), '/media/rosas.jpg')
+
+
+@override_settings(CATALOGO_CACHE_ENABLED=False)
+class FacetasProductosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ramos = Categoria.objects.create(nombre='Ramos')
+        plantas = Categoria.objects.create(nombre='Plantas')
+        rosas = TipoFlor.objects.create(nombre='Rosas')
+        cumple = Ocasion.objects.create(nombre='Cumpleaños')
+        datos = [
+            ('Ramo chico', ramos, rosas, 15000, True),
+            ('Ramo grande', ramos, rosas, 45000, False),
+            ('Potus', plantas, None, 25000, False),
+        ]
+        for i, (nombre, categoria, tipo_flor, precio, destacado) in enumerate(datos):
+            producto = Producto.objects.create(
+                nombre=nombre, descripcion='-', sku=f'FAC-{i}', precio=precio,
+                categoria=categoria, tipo_flor=tipo_flor, is_featured=destacado,
+            )
+            if categoria == ramos:
+                producto.ocasiones.add(cumple)
+
+    def test_facetas_en_dos_consultas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            facetas = calcular_facetas(Producto.objects.filter(is_active=True))
+
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(facetas['total'], 3)
+        self.assertEqual(facetas['destacados'], 1)
+        self.assertEqual(
+            [(c['nombre'], c['count']) for c in facetas['categorias']],
+            [('Ramos', 2), ('Plantas', 1)],
+        )
+        self.assertEqual(
+            [(t['nombre'], t['count']) for t in facetas['tipos_flor']], [('Rosas', 2)]
+        )
+        self.assertEqual(
+            [(o['nombre'], o['count']) for o in facetas['ocasiones']],
+            [('Cumpleaños', 2)],
+        )
+        self.assertEqual([p['count'] for p in facetas['precios']], [1, 1, 1, 0])
+
+    def test_facetas_respetan_los_filtros(self):
+        response = self.client.get(
+            '/api/catalogo/productos/', {'facets': 'true', 'categoria': 'ramos'}
+        )
+
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['facets']['total'], 2)
+        self.assertEqual([t['count'] for t in data['facets']['tipos_flor']], [2])
+        self.assertEqual([p['count'] for p in data['facets']['precios']], [1, 0, 1, 0])
+
+    def test_cada_faceta_se_cuenta_sin_su_propio_filtro(self):
+        response = self.client.get(
+            '/api/catalogo/productos/',
+            {'facets': 'true', 'categoria': 'ramos', 'precio_max': 20000},
+        )
+
+        facetas = response.json()['facets']
+        self.assertEqual(facetas['total'], 1)
+        # Las categorías se cuentan sin su filtro pero con el tope de precio
+        self.assertEqual(
+            [(c['slug'], c['count']) for c in facetas['categorias']], [('ramos', 1)]
+        )
+        # Los rangos de precio se cuentan dentro de la categoría, sin el tope
+        self.assertEqual([p['count'] for p in facetas['precios']], [1, 0, 1, 0])
+
+        response = self.client.get(
+            '/api/catalogo/productos/', {'facets': 'true', 'categoria': 'plantas'}
+        )
+        facetas = response.json()['facets']
+        self.assertEqual(facetas['total'], 1)
+        self.assertEqual(
+            [(c['slug'], c['count']) for c in facetas['categorias']],
+            [('ramos', 2), ('plantas', 1)],
+        )
+        self.assertEqual(facetas['tipos_flor'], [])
+
+    def test_una_consulta_extra_por_filtro_activo(self):
+        queryset = Producto.objects.filter(is_active=True)
+        sin_filtro = {'categorias': queryset, 'ocasiones': queryset}
+        with CaptureQueriesContext(connection) as ctx:
+            facetas = calcular_facetas(
+                queryset.filter(categoria__slug='plantas'), sin_filtro=sin_filtro
+            )
+
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(facetas['total'], 1)
+        self.assertEqual([c['count'] for c in facetas['categorias']], [2, 1])
+        self.assertEqual([o['count'] for o in facetas['ocasiones']], [2])
+
+    def test_rangos_de_precio_coinciden_con_el_listado(self):
+        Producto.objects.create(
+            nombre='Caja', descripcion='-', sku='FAC-LIMITE', precio=20000
+        )
+
+        url = '/api/catalogo/productos/'
+        precios = self.client.get(url, {'facets': 'true'}).json()['facets']['precios']
+
+        # El precio justo en el límite entra en los dos rangos vecinos
+        self.assertEqual([p['count'] for p in precios], [2, 2, 1, 0])
+        for rango in precios:
+            filtros = {}
+            if rango['min'] is not None:
+                filtros['precio_min'] = rango['min']
+            if rango['max'] is not None:
+                filtros['precio_max'] = rango['max']
+            listado = self.client.get(url, filtros).json()
+            self.assertEqual(len(listado), rango['count'], rango)
+
+
+@override_settings(CATALOGO_CACHE_ENABLED=False)
+class PaginacionCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Producto.objects.create(
+                nombre=f'Producto {i}', descripcion='-', sku=f'CUR-{i}',
+                precio=1000 * (i % 2),
+            )
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        for ordering, orden in ORDENES_CURSOR.items():
+            vistos = []
+            url = (
+                '/api/catalogo/productos/?pagination=cursor'
+                f'&ordering={ordering}&page_size=2'
+            )
+            while url:
+                data = self.client.get(url).json()
+                vistos += [p['id'] for p in data['results']]
+                url = data['next']
+
+            esperados = list(
+                Producto.objects.order_by(*orden).values_list('id', flat=True)
+            )
+            self.assertEqual(vistos, esperados, ordering)
+
+    def test_empates_mas_alla_del_offset_de_drf(self):
+        # Más productos con el mismo precio que el offset_cutoff (1000) de DRF
+        Producto.objects.bulk_create(
+            Producto(
+                nombre=f'Empate {i}', descripcion='-', sku=f'EMP-{i}',
+                slug=f'empate-{i}', precio=500,
+            )
+            for i in range(1200)
+        )
+        esperados = list(
+            Producto.objects.order_by('-precio', '-id').values_list('id', flat=True)
+        )
+
+        vistos, paginas = [], []
+        url = (
+            '/api/catalogo/productos/?pagination=cursor'
+            '&ordering=-precio&page_size=100'
+        )
+        # Con el offset topeado el cursor no avanza: se corta en vez de colgarse
+        while url and len(paginas) < 20:
+            data = self.client.get(url).json()
+            vistos += [p['id'] for p in data['results']]
+            paginas.append(data)
+            url = data['next']
+
+        self.assertEqual(vistos, esperados)
+        self.assertEqual(len(paginas), 13)
+
+        # Y hacia atrás, desde la última página, vuelve a la anterior tal cual
+        anterior = self.client.get(paginas[-1]['previous']).json()
+        self.assertEqual(anterior['results'], paginas[-2]['results'])
+        self.assertIsNone(paginas[0]['previous'])
+
+    def test_cursor_invalido(self):
+        url = '/api/catalogo/productos/?pagination=cursor&cursor=no-es-un-cursor'
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_sin_parametro_devuelve_lista(self):
+        self.assertIsInstance(self.client.get('/api/catalogo/productos/').json(), list)
+
+
+class MiniaturasCatalogoPDFTests(SimpleTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(CATALOGO_PDF_CACHE_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.directorio = directorio.name
+
+        buffer = BytesIO()
+        Image.new('RGBA', (2000, 1000), (200, 30, 60, 255)).save(buffer, format='PNG')
+        self.png = buffer.getvalue()
+
+    def _cliente(self, fallan=()):
+        def get(url, **kwargs):
+            response = mock.Mock(content=self.png)
+            if url in fallan:
+                response.raise_for_status.side_effect = Exception('404')
+            return response
+        return mock.Mock(get=mock.Mock(side_effect=get))
+
+    def test_segunda_generacion_no_usa_la_red(self):
+        urls = [f'https://res.cloudinary.com/demo/producto_{i}.png' for i in range(5)]
+        http = self._cliente()
+        with mock.patch.object(miniaturas, 'cliente', return_value=http):
+            primera = miniaturas.obtener_miniaturas(urls + urls[:2])
+        self.assertEqual(http.get.call_count, 5)
+
+        imagen = Image.open(BytesIO(primera[urls[0]]))
+        self.assertEqual(imagen.format, 'JPEG')
+        self.assertEqual(imagen.width, miniaturas.ANCHO_MAXIMO)
+        self.assertAlmostEqual(imagen.height, miniaturas.ANCHO_MAXIMO / 2, delta=1)
+
+        http = self._cliente()
+        with mock.patch.object(miniaturas, 'cliente', return_value=http):
+            segunda = miniaturas.obtener_miniaturas(urls)
+        http.get.assert_not_called()
+        self.assertEqual(segunda, {url: primera[url] for url in urls})
+
+    def test_imagen_que_falla_no_se_cachea(self):
+        url = 'https://res.cloudinary.com/demo/borrada.png'
+        cliente = self._cliente(fallan={url})
+        with mock.patch.object(miniaturas, 'cliente', return_value=cliente):
+            self.assertEqual(miniaturas.obtener_miniaturas([url]), {url: None})
+        self.assertFalse(os.path.exists(miniaturas.ruta_cache(url)))
+
+    def test_la_version_cambia_la_clave(self):
+        url = 'https://res.cloudinary.com/demo/producto.png'
+        actual = miniaturas.ruta_cache(url)
+        with mock.patch.object(miniaturas, 'VERSION', miniaturas.VERSION + 1):
+            self.assertNotEqual(miniaturas.ruta_cache(url), actual)
+
+    def test_limpiar_borra_las_no_usadas(self):
+        vieja, nueva = miniaturas.ruta_cache('vieja'), miniaturas.ruta_cache('nueva')
+        for ruta in (vieja, nueva):
+            with open(ruta, 'wb') as archivo:
+                archivo.write(b'jpeg')
+        hace_dos_meses = time.time() - 60 * 24 * 3600
+        os.utime(vieja, (hace_dos_meses, hace_dos_meses))
+
+        self.assertEqual(miniaturas.limpiar(), 1)
+        self.assertEqual(os.listdir(self.directorio), [os.path.basename(nueva)])
+
+
+@override_settings(TRANSLATION_LANGUAGES=['en'])
+class PretraduccionCatalogoTests(TraduccionConGoogleFalsoMixin, TestCase):
+
+    def _ramo(self):
+        return Producto.objects.create(
+            nombre='Ramo', descripcion='Rosas rojas', sku='R', precio=1
+        )
+
+    def test_invalida_el_catalogo_solo_con_traducciones_nuevas(self):
+        with self.captureOnCommitCallbacks():
+            producto = self._ramo()
+
+        generacion = get_generacion()
+        self.assertEqual(pretraducir_objeto('catalogo.producto', producto.pk), 2)
+        self.assertEqual(get_generacion(), generacion + 1)
+
+        # Todo ya traducido: no llama a la API ni vuelve a invalidar
+        self.google.post.reset_mock()
+        self.assertEqual(pretraducir_objeto('catalogo.producto', producto.pk), 0)
+        self.google.post.assert_not_called()
+        self.assertEqual(get_generacion(), generacion + 1)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_guardar_producto_pretraduce_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            producto = self._ramo()
+            # Nada se traduce antes del commit
+            self.google.post.assert_not_called()
+
+        self.assertTrue(callbacks)
+        traducciones = dict(
+            Translation.objects.filter(target_lang='en')
+            .values_list('source_text', 'translated_text')
+        )
+        self.assertEqual(
+            traducciones, {'Ramo': 'EN:Ramo', 'Rosas rojas': 'EN:Rosas rojas'}
+        )
+
+        # Un guardado parcial que no toca textos no vuelve a pretraducir
+        with mock.patch('catalogo.signals.pretraducir_objeto') as pretraducir:
+            with self.captureOnCommitCallbacks(execute=True):
+                producto.save(update_fields=['precio'])
+        pretraducir.assert_not_called()
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sin_celery_un_error_no_rompe_el_guardado(self):
+        with mock.patch.object(
+            translation_service, 'pretranslate', side_effect=RuntimeError('sin red')
+        ):
+            with self.assertLogs('catalogo.signals', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    Producto.objects.create(nombre='Ramo', sku='R', precio=1)
+
+        self.assertTrue(Producto.objects.filter(sku='R').exists())
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_con_celery_encola_y_tolera_un_broker_caido(self):
+        with mock.patch.object(
+            pretraducir_objeto, 'delay', side_effect=OSError('sin broker')
+        ) as delay:
+            with self.assertLogs('catalogo.signals', 'WARNING'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    producto = Producto.objects.create(nombre='Ramo', sku='R', precio=1)
+
+        delay.assert_called_once_with('catalogo.producto', producto.pk)
+        self.google.post.assert_not_called()
+
+    def test_comando_pretraduce_todo_el_catalogo(self):
+        with self.captureOnCommitCallbacks():
+            categoria = Categoria.objects.create(nombre='Ramos')
+            Producto.objects.create(
+                nombre='Ramo', descripcion='Rosas rojas', sku='R', precio=1,
+                categoria=categoria,
+            )
+            Producto.objects.create(
+                nombre='Caja', descripcion='Rosas rojas', sku='C', precio=1,
+                is_active=False,
+            )
+
+        generacion = get_generacion()
+        call_command('pretraducir_catalogo', stdout=StringIO())
+
+        self.assertEqual(
+            set(
+                Translation.objects.filter(target_lang='en')
+                .values_list('source_text', flat=True)
+            ),
+            {'Ramos', 'Ramo', 'Rosas rojas'},
+        )
+        self.assertEqual(self.google.post.call_count, 1)
+        self.assertEqual(get_generacion(), generacion + 1)
+
+        # Repetirlo no llama a la API ni invalida el catálogo
+        self.google.post.reset_mock()
+        call_command('pretraducir_catalogo', stdout=StringIO())
+        self.google.post.assert_not_called()
+        self.assertEqual(get_generacion(), generacion + 1)
+
+    @override_settings(TRANSLATION_API_ON_REQUEST=False)
+    def test_servir_en_otro_idioma_no_llama_a_la_api(self):
+        with self.captureOnCommitCallbacks():
+            self._ramo()
+        Translation.objects.create(
+            source_text='Ramo', target_lang='en', translated_text='Bouquet'
+        )
+
+        response = self.client.get('/api/catalogo/productos/', {'lang': 'en'})
+
+        self.assertEqual(response.status_code, 200)
+        self.google.post.assert_not_called()
+        producto = response.json()[0]
+        self.assertEqual(producto['nombre'], 'Bouquet')
+        # Lo que todavía no está traducido se sirve en español
+        self.assertEqual(producto['descripcion'], 'Rosas rojas')
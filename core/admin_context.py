@@ -4,7 +4,7 @@ Context processor para el admin de Django con estadísticas de Florería Cristin
 
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import date
+from datetime import timedelta
 
 
 def admin_stats(request):
@@ -23,9 +23,11 @@ def admin_stats(request):
         # Contar productos activos
         productos_count = Producto.objects.filter(is_active=True).count()
         
-        # Contar pedidos de hoy
-        hoy = date.today()
-        pedidos_hoy = Pedido.objects.filter(creado__date=hoy).count()
+        # Contar pedidos de hoy (rango sobre creado: usa el índice, __date no)
+        hoy = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        pedidos_hoy = Pedido.objects.filter(
+            creado__gte=hoy, creado__lt=hoy + timedelta(days=1)
+        ).count()
         
         # Contar usuarios registrados
         usuarios_count = User.objects.filter(is_active=True).count()
@@ -6,4 +6,9 @@ app_name = 'core-api'
 
 urlpatterns = [
     path('site-settings/', api_views.site_settings, name='site-settings'),
+    path(
+        'translation-cache-stats/', api_views.translation_cache_stats,
+        name='translation-cache-stats',
+    ),
+    path('integration-stats/', api_views.integration_stats, name='integration-stats'),
 ]
@@ -1,7 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 
+from . import http
 from .models import SiteSettings
+from .translation_cache import translation_cache
 
 
 @require_GET
@@ -19,3 +22,17 @@ def site_settings(request):
             'min_delivery_date': settings_obj.min_delivery_date().isoformat() if settings_obj.min_delivery_date() else None,
         }
     )
+
+
+@require_GET
+@staff_member_required
+def translation_cache_stats(request):
+    """Contadores de aciertos/fallos de la caché de traducciones (por proceso)."""
+    return JsonResponse(translation_cache.stats())
+
+
+@require_GET
+@staff_member_required
+def integration_stats(request):
+    """Llamadas, errores, latencia y circuito de cada integración (por proceso)."""
+    return JsonResponse(http.metricas())
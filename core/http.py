@@ -0,0 +1,293 @@
+"""
+Cliente HTTP compartido para las integraciones externas (n8n, Mercado Pago,
+PayPal, SendGrid, Resend, Google Translate, cotización del dólar, n8n de
+redes sociales, imágenes del catálogo).
+
+Antes cada llamada usaba requests.get/post sueltos y pagaba DNS, TCP y TLS
+en cada request. Ahora cada integración tiene un ClienteHTTP (ver `cliente`)
+con:
+
+- Una requests.Session con pool keep-alive por host, compartida por todos
+  los hilos del proceso.
+- Timeout por defecto (conexión, lectura) si quien llama no pasa otro.
+- Reintentos con backoff exponencial y jitter ante errores de conexión,
+  timeouts y respuestas 429/5xx. Los métodos no idempotentes (POST, PATCH)
+  sólo se reintentan si no se pudo conectar, es decir si el request no salió.
+- Un circuit breaker: tras `umbral_fallos` fallos seguidos la integración
+  queda abierta `enfriamiento` segundos y las llamadas fallan enseguida con
+  CircuitoAbierto, sin tocar la red. Después se deja pasar una llamada de
+  prueba: si sale bien el circuito se cierra.
+- Métricas por integración (llamadas, errores, latencia), por proceso, en
+  `metricas()` y en /api/core/integration-stats/.
+
+Cada integración se puede ajustar con settings.INTEGRACIONES_HTTP, por
+ejemplo {'n8n': {'timeout': (3.05, 30), 'reintentos': 0}}.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Métodos que se pueden repetir sin efectos secundarios
+IDEMPOTENTES = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+STATUS_REINTENTABLES = frozenset({429, 500, 502, 503, 504})
+
+CONFIG_DEFAULT = {
+    'timeout': (3.05, 10),
+    'reintentos': 2,
+    'backoff': 0.3,
+    'backoff_maximo': 5.0,
+    'umbral_fallos': 5,
+    'enfriamiento': 30.0,
+    'pool': 10,
+}
+
+
+class CircuitoAbierto(requests.exceptions.ConnectionError):
+    """La integración viene fallando y no se la llama hasta que se enfríe."""
+
+
+class CircuitBreaker:
+    """cerrado -> abierto (tras N fallos seguidos) -> semiabierto (una prueba)"""
+
+    def __init__(self, umbral_fallos, enfriamiento):
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.fallos < self.umbral_fallos:
+            return 'cerrado'
+        return 'abierto' if time.monotonic() < self.abierto_hasta else 'semiabierto'
+
+    def permitir(self):
+        """True si se puede llamar; en semiabierto deja pasar una sola llamada."""
+        with self._lock:
+            estado = self.estado
+            if estado == 'cerrado':
+                return True
+            if estado == 'semiabierto' and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self._prueba_en_curso = False
+            if self.fallos >= self.umbral_fallos:
+                self.abierto_hasta = time.monotonic() + self.enfriamiento
+
+
+class Metricas:
+    """Contadores y latencias recientes de una integración (por proceso)."""
+
+    MUESTRAS = 500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.llamadas = 0
+            self.errores = 0
+            self.reintentos = 0
+            self.rechazadas = 0
+            self._latencias = deque(maxlen=self.MUESTRAS)
+
+    def registrar(self, segundos, error):
+        with self._lock:
+            self.llamadas += 1
+            self.errores += bool(error)
+            self._latencias.append(segundos)
+
+    def registrar_reintento(self):
+        with self._lock:
+            self.reintentos += 1
+
+    def registrar_rechazo(self):
+        with self._lock:
+            self.rechazadas += 1
+
+    def resumen(self) -> Dict[str, object]:
+        with self._lock:
+            latencias = sorted(self._latencias)
+        promedio = p95 = None
+        if latencias:
+            promedio = round(sum(latencias) / len(latencias) * 1000, 1)
+            indice = min(len(latencias) - 1, int(len(latencias) * 0.95))
+            p95 = round(latencias[indice] * 1000, 1)
+        return {
+            'llamadas': self.llamadas,
+            'errores': self.errores,
+            'tasa_error': (
+                round(self.errores / self.llamadas, 4) if self.llamadas else None
+            ),
+            'reintentos': self.reintentos,
+            'rechazadas_por_circuito': self.rechazadas,
+            'latencia_ms_promedio': promedio,
+            'latencia_ms_p95': p95,
+        }
+
+
+class ClienteHTTP:
+    """
+    Cliente de una integración. Misma interfaz que requests.Session
+    (request/get/post/...), devuelve la Response sin llamar a raise_for_status.
+    """
+
+    def __init__(self, nombre, **config):
+        self.nombre = nombre
+        self.config = {**CONFIG_DEFAULT, **config}
+        self.breaker = CircuitBreaker(
+            self.config['umbral_fallos'], self.config['enfriamiento']
+        )
+        self.metricas = Metricas()
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Se crea en el primer uso: así cada proceso de gunicorn/Celery tiene la suya
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.config['pool'],
+                        pool_maxsize=self.config['pool'],
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def _espera(self, intento):
+        base = self.config['backoff']
+        espera = min(base * 2 ** intento, self.config['backoff_maximo'])
+        return espera + random.uniform(0, base)
+
+    def request(self, method, url, reintentos=None, idempotente=None, **kwargs):
+        """
+        Como Session.request. `reintentos` reemplaza al de la configuración e
+        `idempotente=True` permite reintentar un POST que no tiene efectos
+        (p. ej. una consulta de traducción).
+        """
+        method = method.upper()
+        kwargs.setdefault('timeout', self.config['timeout'])
+        reintentos = self.config['reintentos'] if reintentos is None else reintentos
+        if idempotente is None:
+            idempotente = method in IDEMPOTENTES
+
+        if not self.breaker.permitir():
+            self.metricas.registrar_rechazo()
+            raise CircuitoAbierto(
+                f"Integración {self.nombre} no disponible (circuito abierto)"
+            )
+
+        intento = 0
+        while True:
+            inicio = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.metricas.registrar(time.monotonic() - inicio, error=True)
+                # Con ConnectTimeout no se llegó a conectar: ni siquiera un POST salió
+                reintentable = idempotente or isinstance(
+                    e, requests.exceptions.ConnectTimeout
+                )
+                if intento < reintentos and reintentable:
+                    self._reintentar(intento, f'{type(e).__name__}: {e}')
+                    intento += 1
+                    continue
+                self.breaker.fallo()
+                raise
+
+            error_servidor = response.status_code >= 500
+            self.metricas.registrar(time.monotonic() - inicio, error=error_servidor)
+            reintentable = response.status_code in STATUS_REINTENTABLES
+            if reintentable and idempotente and intento < reintentos:
+                response.close()
+                self._reintentar(intento, f'HTTP {response.status_code}')
+                intento += 1
+                continue
+
+            # Un 4xx es un error de quien llama, no de la integración
+            if error_servidor:
+                self.breaker.fallo()
+            else:
+                self.breaker.exito()
+            return response
+
+    def _reintentar(self, intento, motivo):
+        espera = self._espera(intento)
+        self.metricas.registrar_reintento()
+        logger.warning(
+            f"{self.nombre}: {motivo}, reintento {intento + 1} en {espera:.2f}s"
+        )
+        time.sleep(espera)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def resumen(self) -> Dict[str, object]:
+        return {**self.metricas.resumen(), 'circuito': self.breaker.estado}
+
+
+_clientes: Dict[str, ClienteHTTP] = {}
+_clientes_lock = threading.Lock()
+
+
+def cliente(nombre: str, **config) -> ClienteHTTP:
+    """
+    Cliente compartido de la integración `nombre`. La configuración se toma
+    la primera vez: defaults < argumentos < settings.INTEGRACIONES_HTTP.
+    """
+    instancia: Optional[ClienteHTTP] = _clientes.get(nombre)
+    if instancia is None:
+        with _clientes_lock:
+            instancia = _clientes.get(nombre)
+            if instancia is None:
+                overrides = getattr(settings, 'INTEGRACIONES_HTTP', {}).get(nombre, {})
+                instancia = _clientes[nombre] = ClienteHTTP(
+                    nombre, **{**config, **overrides}
+                )
+    return instancia
+
+
+def metricas() -> Dict[str, Dict[str, object]]:
+    """Métricas de todas las integraciones usadas por este proceso."""
+    return {
+        nombre: instancia.resumen()
+        for nombre, instancia in sorted(_clientes.items())
+    }
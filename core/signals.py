@@ -0,0 +1,39 @@
+"""
+Señales de la app core
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Translation
+from .translation_cache import translation_cache
+
+
+@receiver(pre_save, sender=Translation)
+def invalidar_cache_traduccion_anterior(sender, instance, **kwargs):
+    """
+    Si se edita el texto original o los idiomas de una traducción existente,
+    invalida también la clave anterior.
+    """
+    if not instance.pk:
+        return
+
+    anterior = Translation.objects.filter(pk=instance.pk).values(
+        'source_text', 'source_lang', 'target_lang'
+    ).first()
+    if anterior:
+        translation_cache.invalidate(
+            anterior['source_text'], anterior['source_lang'], anterior['target_lang']
+        )
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def invalidar_cache_traduccion(sender, instance, **kwargs):
+    """
+    Invalida el LRU local y la caché compartida cuando se edita o elimina
+    una traducción (por ejemplo, corrigiéndola desde el admin).
+    """
+    translation_cache.invalidate(
+        instance.source_text, instance.source_lang, instance.target_lang
+    )
@@ -0,0 +1,25 @@
+"""
+Tareas de Celery para traducciones en segundo plano
+"""
+
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def pretraducir_textos(textos, idiomas=None, source_lang='es'):
+    """
+    Calcula y guarda en la tabla Translation las traducciones de `textos`
+    para los idiomas indicados (por defecto, settings.TRANSLATION_LANGUAGES).
+    """
+    from .translation_service import translation_service
+
+    idiomas = idiomas or translation_service.languages
+    for idioma in idiomas:
+        if idioma != source_lang:
+            translation_service.translate_batch(textos, idioma, source_lang=source_lang)
+
+    logger.info(f"Pretraducidos {len(textos)} textos a {', '.join(idiomas)}")
+    return len(textos)
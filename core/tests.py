@@ -0,0 +1,238 @@
+from unittest import mock
+
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .http import CircuitoAbierto, ClienteHTTP, cliente
+from .models import Translation
+from .translation_cache import TranslationCache, translation_cache
+from .translation_service import translation_service
+
+
+URL = 'https://api.example.com/x'
+
+
+def respuesta(status_code):
+    return mock.Mock(status_code=status_code)
+
+
+def sesion(**kwargs):
+    """Reemplaza el envío de requests.Session (la red) por un mock."""
+    return mock.patch.object(requests.Session, 'request', **kwargs)
+
+
+def google_falso():
+    """Cliente HTTP falso de Google Translate: traduce 'x' como 'EN:x'."""
+    def post(url, data, **kwargs):
+        traducciones = [{'translatedText': f"EN:{texto}"} for texto in data['q']]
+        cuerpo = {'data': {'translations': traducciones}}
+        return mock.Mock(json=mock.Mock(return_value=cuerpo))
+    return mock.Mock(post=mock.Mock(side_effect=post))
+
+
+class TraduccionConGoogleFalsoMixin:
+    """Servicio de traducción habilitado contra google_falso(), cachés vacías."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        translation_cache.clear_local()
+        translation_cache.reset_stats()
+        self.google = google_falso()
+        parches = [
+            mock.patch.object(translation_service, 'client', True),
+            mock.patch.object(translation_service, 'api_key', 'clave'),
+            mock.patch.object(translation_service, 'languages', ['en']),
+            mock.patch('core.translation_service.cliente', return_value=self.google),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+
+
+@mock.patch('core.http.time.sleep')
+class ClienteHTTPTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cliente = ClienteHTTP(
+            'prueba', reintentos=2, umbral_fallos=2, enfriamiento=60
+        )
+
+    def test_reintenta_get_con_5xx(self, sleep):
+        with sesion(side_effect=[respuesta(503), respuesta(200)]) as request:
+            self.assertEqual(self.cliente.get(URL).status_code, 200)
+
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(request.call_args.kwargs['timeout'], (3.05, 10))
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(self.cliente.resumen()['reintentos'], 1)
+
+    def test_no_reintenta_post_ya_enviado(self, sleep):
+        with sesion(side_effect=requests.exceptions.ReadTimeout) as request:
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                self.cliente.post(URL, json={})
+        self.assertEqual(request.call_count, 1)
+
+        # Si no llegó a conectar sí se reintenta
+        with sesion(side_effect=[requests.exceptions.ConnectTimeout, respuesta(200)]):
+            self.assertEqual(self.cliente.post(URL, json={}).status_code, 200)
+
+    def test_circuito_se_abre_y_se_cierra(self, sleep):
+        with sesion(side_effect=requests.exceptions.ConnectionError) as request:
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.ConnectionError):
+                    self.cliente.get(URL, reintentos=0)
+            # Abierto: falla sin tocar la red
+            with self.assertRaises(CircuitoAbierto):
+                self.cliente.get(URL)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.cliente.resumen()['circuito'], 'abierto')
+        self.assertEqual(self.cliente.resumen()['rechazadas_por_circuito'], 1)
+
+        # Enfriado: una llamada de prueba exitosa lo cierra
+        self.cliente.breaker.abierto_hasta = 0
+        with sesion(return_value=respuesta(404)):
+            self.cliente.get(URL)
+        self.assertEqual(self.cliente.resumen()['circuito'], 'cerrado')
+
+
+class IntegrationStatsTests(TestCase):
+
+    def test_solo_staff(self):
+        cliente('prueba_stats')
+        url = reverse('core-api:integration-stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+        datos = self.client.get(url).json()
+        self.assertEqual(datos['prueba_stats']['llamadas'], 0)
+        self.assertEqual(datos['prueba_stats']['circuito'], 'cerrado')
+
+
+class TraduccionPorLotesTests(TraduccionConGoogleFalsoMixin, TestCase):
+
+    def productos(self, cantidad):
+        return [
+            {
+                'nombre': f'Ramo {i}',
+                'descripcion': 'Rosas rojas',
+                'categoria': {'nombre': 'Ramos'},
+                'ocasiones': [{'nombre': 'Cumpleaños'}],
+            }
+            for i in range(cantidad)
+        ]
+
+    def test_una_consulta_y_un_post_por_pagina(self):
+        Translation.objects.create(
+            source_text='Ramos', target_lang='en', translated_text='Bouquets'
+        )
+
+        # Una consulta IN para los faltantes de caché y un INSERT para los nuevos
+        with self.assertNumQueries(2):
+            traducidos = translation_service.translate_products(self.productos(5), 'en')
+
+        self.assertEqual(self.google.post.call_count, 1)
+        enviados = self.google.post.call_args.kwargs['data']['q']
+        self.assertCountEqual(
+            enviados, [f'Ramo {i}' for i in range(5)] + ['Rosas rojas', 'Cumpleaños']
+        )
+        self.assertEqual(traducidos[0]['nombre'], 'EN:Ramo 0')
+        self.assertEqual(traducidos[0]['categoria']['nombre'], 'Bouquets')
+        self.assertEqual(traducidos[4]['ocasiones'][0]['nombre'], 'EN:Cumpleaños')
+        # bulk_create guardó los que faltaban
+        self.assertEqual(Translation.objects.count(), 8)
+
+    def test_pagina_ya_traducida_no_consulta_ni_llama(self):
+        translation_service.translate_products(self.productos(3), 'en')
+        self.google.post.reset_mock()
+
+        with self.assertNumQueries(0):
+            translation_service.translate_products(self.productos(3), 'en')
+        self.google.post.assert_not_called()
+
+    def test_lotes_de_128_segmentos(self):
+        textos = [f'Texto {i}' for i in range(200)]
+        traducciones = translation_service.translate_batch(textos, 'en')
+
+        llamadas = self.google.post.call_args_list
+        self.assertEqual([len(c.kwargs['data']['q']) for c in llamadas], [128, 72])
+        self.assertEqual(traducciones['Texto 199'], 'EN:Texto 199')
+
+
+class TranslationCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        translation_cache.clear_local()
+        translation_cache.reset_stats()
+
+    def guardar(self, texto, traduccion):
+        return Translation.objects.create(
+            source_text=texto, target_lang='en', translated_text=traduccion
+        )
+
+    def traducir(self, texto):
+        return translation_service.translate_batch([texto], 'en')
+
+    def test_lru_local_acotado(self):
+        cache_local = TranslationCache(max_size=2)
+        cache_local.set_many({'uno': 'one', 'dos': 'two'}, 'es', 'en')
+        cache_local.get('uno', 'es', 'en')  # 'uno' pasa a ser el más reciente
+        cache_local.set('tres', 'three', 'es', 'en')
+        cache.clear()
+
+        self.assertEqual(
+            cache_local.get_many(['uno', 'dos', 'tres'], 'es', 'en'),
+            {'uno': 'one', 'tres': 'three'},
+        )
+
+    def test_local_luego_compartida_luego_base(self):
+        self.guardar('Rosa', 'Rose')
+
+        # Primera vez: fallo de caché resuelto desde la base
+        with self.assertNumQueries(1):
+            self.assertEqual(self.traducir('Rosa'), {'Rosa': 'Rose'})
+
+        # Otro worker (LRU vacío) la encuentra en la caché compartida
+        translation_cache.clear_local()
+        with self.assertNumQueries(0):
+            self.traducir('Rosa')
+
+        # Y de ahí en más en el LRU local
+        with self.assertNumQueries(0):
+            self.traducir('Rosa')
+
+        stats = translation_cache.stats()
+        contadores = ('local_hits', 'shared_hits', 'db_hits', 'misses', 'lookups')
+        self.assertEqual([stats[c] for c in contadores], [1, 1, 1, 1, 3])
+
+    def test_editar_traduccion_invalida_la_cache(self):
+        traduccion = self.guardar('Clavel', 'Clavel')
+        self.traducir('Clavel')
+
+        traduccion.translated_text = 'Carnation'
+        traduccion.save()
+
+        self.assertIsNone(translation_cache.get('Clavel', 'es', 'en'))
+        self.assertEqual(self.traducir('Clavel'), {'Clavel': 'Carnation'})
+
+    def test_cambiar_texto_original_invalida_la_clave_anterior(self):
+        traduccion = self.guardar('Tulipan', 'Tulip')
+        self.traducir('Tulipan')
+
+        traduccion.source_text = 'Tulipán'
+        traduccion.save()
+
+        self.assertIsNone(translation_cache.get('Tulipan', 'es', 'en'))
+
+    def test_borrar_traduccion_invalida_la_cache(self):
+        traduccion = self.guardar('Lirio', 'Lily')
+        self.traducir('Lirio')
+
+        traduccion.delete()
+
+        self.assertIsNone(translation_cache.get('Lirio', 'es', 'en'))
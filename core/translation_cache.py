@@ -0,0 +1,181 @@
+"""
+Caché de dos niveles delante de la tabla Translation.
+
+Nivel 1: LRU acotado en memoria del proceso (sin I/O).
+Nivel 2: caché compartida de Django (Redis si está configurado) con TTL.
+
+Las entradas del LRU local tienen además un TTL corto para que una edición
+hecha desde otro proceso se propague sin reiniciar los workers.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """LRU en proceso + caché compartida, con contadores de aciertos/fallos."""
+
+    KEY_PREFIX = 'translation'
+
+    def __init__(
+        self, max_size: int = None, local_ttl: int = None, shared_ttl: int = None
+    ):
+        self.max_size = max_size or getattr(
+            settings, 'TRANSLATION_CACHE_LOCAL_SIZE', 5000
+        )
+        self.local_ttl = local_ttl or getattr(
+            settings, 'TRANSLATION_CACHE_LOCAL_TTL', 300
+        )
+        self.shared_ttl = shared_ttl or getattr(
+            settings, 'TRANSLATION_CACHE_TIMEOUT', 60 * 60 * 24
+        )
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def make_key(cls, text: str, source_lang: str, target_lang: str) -> str:
+        texto = f'{source_lang}:{target_lang}:{text}'
+        digest = hashlib.sha1(texto.encode('utf-8')).hexdigest()
+        return f'{cls.KEY_PREFIX}:{digest}'
+
+    # ------------------------------------------------------------------
+    # Nivel local
+    # ------------------------------------------------------------------
+
+    def _local_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key: str, value: str):
+        with self._lock:
+            self._local[key] = (value, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def get(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Busca una traducción en ambos niveles. Devuelve None si no está."""
+        return self.get_many([text], source_lang, target_lang).get(text)
+
+    def get_many(
+        self, texts: Iterable[str], source_lang: str, target_lang: str
+    ) -> Dict[str, str]:
+        """
+        Busca varias traducciones. Lo que no está en el LRU local se pide a la
+        caché compartida con un único get_many y se copia al nivel local.
+        """
+        found = {}
+        pending = {}
+
+        for text in texts:
+            key = self.make_key(text, source_lang, target_lang)
+            value = self._local_get(key)
+            if value is not None:
+                found[text] = value
+            else:
+                pending[key] = text
+
+        self.local_hits += len(found)
+
+        if pending:
+            try:
+                shared = cache.get_many(list(pending))
+            except Exception as e:
+                logger.error(f'Error leyendo caché compartida de traducciones: {e}')
+                shared = {}
+
+            for key, value in shared.items():
+                found[pending[key]] = value
+                self._local_set(key, value)
+
+            self.shared_hits += len(shared)
+            self.misses += len(pending) - len(shared)
+
+        return found
+
+    def set_many(
+        self, translations: Dict[str, str], source_lang: str, target_lang: str
+    ):
+        """Guarda traducciones en ambos niveles."""
+        if not translations:
+            return
+
+        entries = {
+            self.make_key(text, source_lang, target_lang): translated
+            for text, translated in translations.items()
+        }
+        for key, value in entries.items():
+            self._local_set(key, value)
+
+        try:
+            cache.set_many(entries, timeout=self.shared_ttl)
+        except Exception as e:
+            logger.error(f'Error escribiendo caché compartida de traducciones: {e}')
+
+    def set(self, text: str, translated: str, source_lang: str, target_lang: str):
+        self.set_many({text: translated}, source_lang, target_lang)
+
+    def invalidate(self, text: str, source_lang: str, target_lang: str):
+        """Elimina una traducción de ambos niveles (p. ej. al editarla en el admin)."""
+        key = self.make_key(text, source_lang, target_lang)
+        with self._lock:
+            self._local.pop(key, None)
+        try:
+            cache.delete(key)
+        except Exception as e:
+            logger.error(f'Error invalidando caché compartida de traducciones: {e}')
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def reset_stats(self):
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def record_db_hits(self, count: int):
+        """Registra cuántos fallos de caché se resolvieron desde la base de datos."""
+        self.db_hits += count
+
+    def stats(self) -> Dict[str, object]:
+        """Contadores del proceso actual."""
+        lookups = self.local_hits + self.shared_hits + self.misses
+        cache_hits = self.local_hits + self.shared_hits
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'lookups': lookups,
+            'hit_rate': round(cache_hits / lookups, 4) if lookups else None,
+            'db_queries_avoided': cache_hits,
+            'local_size': len(self._local),
+            'local_max_size': self.max_size,
+        }
+
+
+# Instancia compartida por el servicio de traducción y las señales
+translation_cache = TranslationCache()
@@ -2,15 +2,16 @@ import os
 import logging
 from typing import Optional, Dict, Any, List
 
-from django.core.cache import cache
+from django.conf import settings
 
+from .http import cliente
 from .models import Translation
+from .translation_cache import translation_cache
 
 logger = logging.getLogger(__name__)
 
-# Usar requests para llamar a la API REST de Google Translate
+# Se llama a la API REST de Google Translate con el cliente HTTP compartido
 # Esto evita problemas de autenticación con google-cloud-translate v3.x
-import requests
 GOOGLE_TRANSLATE_AVAILABLE = True
 
 
@@ -18,11 +19,21 @@ class TranslationService:
     """
     Servicio de traducción con caché en base de datos.
     Usa Google Translate API para traducciones automáticas.
+    
+    Delante de la tabla Translation hay un LRU en memoria y la caché
+    compartida de Django (ver core.translation_cache).
     """
     
+    # Campos de texto propios del producto que se traducen
+    PRODUCT_FIELDS = ('nombre', 'descripcion', 'descripcion_corta')
+    
+    # Google Translate v2 acepta hasta 128 segmentos `q` por request
+    MAX_SEGMENTS_PER_REQUEST = 128
+    
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_TRANSLATE_API_KEY')
         self.api_url = 'https://translation.googleapis.com/language/translate/v2'
+        self.languages = getattr(settings, 'TRANSLATION_LANGUAGES', ['en'])
         logger.info(f'🔧 Inicializando TranslationService...')
         logger.info(f'📦 GOOGLE_TRANSLATE_AVAILABLE: {GOOGLE_TRANSLATE_AVAILABLE}')
         logger.info(f'🔑 API Key configurada: {bool(self.api_key)}')
@@ -37,7 +48,7 @@ class TranslationService:
     
     def translate_text(self, text: str, target_lang: str = 'en', source_lang: str = 'es') -> str:
         """
-        Traduce un texto simple con caché en DB.
+        Traduce un texto simple con caché en memoria, caché compartida y DB.
         
         Args:
             text: Texto a traducir
@@ -54,60 +65,8 @@ class TranslationService:
         if target_lang == source_lang:
             return text
         
-        # Buscar en caché de base de datos
-        try:
-            cached = Translation.objects.filter(
-                source_text=text,
-                source_lang=source_lang,
-                target_lang=target_lang
-            ).first()
-            
-            if cached:
-                logger.debug(f'Traducción encontrada en caché: {text[:50]}...')
-                return cached.translated_text
-        except Exception as e:
-            logger.error(f'Error buscando en caché: {e}')
-        
-        # Si no hay cliente de Google, retornar texto original
-        if not self.client:
-            logger.warning(f'Cliente de traducción no disponible. Retornando texto original.')
-            return text
-        
-        # Traducir con Google Translate API REST
-        try:
-            logger.info(f'Traduciendo con Google API: {text[:50]}...')
-            
-            params = {
-                'q': text,
-                'target': target_lang,
-                'source': source_lang,
-                'key': self.api_key,
-                'format': 'text'
-            }
-            
-            response = requests.post(self.api_url, params=params)
-            response.raise_for_status()
-            
-            result = response.json()
-            translated_text = result['data']['translations'][0]['translatedText']
-            
-            # Guardar en caché
-            try:
-                Translation.objects.create(
-                    source_text=text,
-                    source_lang=source_lang,
-                    target_lang=target_lang,
-                    translated_text=translated_text
-                )
-                logger.info(f'Traducción guardada en caché')
-            except Exception as e:
-                logger.error(f'Error guardando traducción en caché: {e}')
-            
-            return translated_text
-            
-        except Exception as e:
-            logger.error(f'Error traduciendo con Google API: {e}')
-            return text
+        # Misma ruta que el modo lote: caché en memoria, caché compartida, DB y API
+        return self.translate_batch([text], target_lang, source_lang).get(text, text)
     
     def translate_dict(self, data: Dict[str, Any], fields: List[str], target_lang: str = 'en') -> Dict[str, Any]:
         """
@@ -135,7 +94,10 @@ class TranslationService:
         
         return translated_data
     
-    def translate_product(self, product_data: Dict[str, Any], target_lang: str = 'en') -> Dict[str, Any]:
+    def translate_product(
+        self, product_data: Dict[str, Any], target_lang: str = 'en',
+        fetch_missing: bool = True,
+    ) -> Dict[str, Any]:
         """
         Traduce los campos de un producto.
         Los productos están originalmente en español en la base de datos.
@@ -143,6 +105,7 @@ class TranslationService:
         Args:
             product_data: Diccionario con datos del producto (originalmente en español)
             target_lang: Idioma destino ('es' para español, 'en' para inglés)
+            fetch_missing: Ver translate_batch
         
         Returns:
             Producto con campos traducidos
@@ -154,68 +117,296 @@ class TranslationService:
             logger.info(f'⏭️ Idioma es español (original), retornando sin traducir')
             return product_data
         
-        if not self.client:
-            logger.warning(f'⚠️ Cliente no disponible, retornando sin traducir')
-            return product_data
+        return self.translate_products(
+            [product_data], target_lang, fetch_missing=fetch_missing
+        )[0]
+    
+    def translate_batch(
+        self, texts: List[str], target_lang: str = 'en', source_lang: str = 'es',
+        fetch_missing: bool = True,
+    ) -> Dict[str, str]:
+        """
+        Traduce un conjunto de textos resolviendo el caché en una sola consulta.
         
-        translated = product_data.copy()
+        Los textos que no están en caché se envían a Google en una única
+        llamada con varios parámetros `q` (en bloques de MAX_SEGMENTS_PER_REQUEST)
+        y las traducciones nuevas se guardan con bulk_create.
         
-        # Traducir campos del producto (desde español al idioma destino)
-        if 'nombre' in translated and translated['nombre']:
-            translated['nombre'] = self.translate_text(translated['nombre'], target_lang, source_lang='es')
+        Args:
+            texts: Textos a traducir (puede contener repetidos o vacíos)
+            target_lang: Idioma destino
+            source_lang: Idioma origen
+            fetch_missing: Si es False no se llama a la API; los faltantes se
+                devuelven sin traducir y se encolan para traducirse en segundo plano
         
-        if 'descripcion' in translated and translated['descripcion']:
-            translated['descripcion'] = self.translate_text(translated['descripcion'], target_lang, source_lang='es')
+        Returns:
+            Diccionario {texto_original: texto_traducido}. Los textos que no se
+            pudieron traducir se devuelven sin cambios.
+        """
+        return self._translate_batch(texts, target_lang, source_lang, fetch_missing)[0]
+    
+    def _translate_batch(self, texts, target_lang, source_lang, fetch_missing):
+        """translate_batch que además devuelve las traducciones nuevas (de la API)."""
+        unique_texts = list(dict.fromkeys(t for t in texts if t and t.strip()))
+        translations = {text: text for text in unique_texts}
         
-        if 'descripcion_corta' in translated and translated['descripcion_corta']:
-            translated['descripcion_corta'] = self.translate_text(translated['descripcion_corta'], target_lang, source_lang='es')
+        if not unique_texts or target_lang == source_lang:
+            return translations, {}
         
-        # Traducir categoría si existe (desde español)
-        if 'categoria' in translated and translated['categoria']:
-            if isinstance(translated['categoria'], dict) and 'nombre' in translated['categoria']:
-                translated['categoria']['nombre'] = self.translate_text(
-                    translated['categoria']['nombre'],
-                    target_lang,
-                    source_lang='es'
-                )
+        # Nivel 1 y 2: LRU en memoria y caché compartida
+        hits = translation_cache.get_many(unique_texts, source_lang, target_lang)
+        translations.update(hits)
+        pending = [text for text in unique_texts if text not in hits]
         
-        # Traducir tipo de flor si existe (desde español)
-        if 'tipo_flor' in translated and translated['tipo_flor']:
-            if isinstance(translated['tipo_flor'], dict) and 'nombre' in translated['tipo_flor']:
-                translated['tipo_flor']['nombre'] = self.translate_text(
-                    translated['tipo_flor']['nombre'],
-                    target_lang,
-                    source_lang='es'
+        # Nivel 3: tabla Translation, con una sola consulta IN
+        db_hits = {}
+        if pending:
+            try:
+                cached = Translation.objects.filter(
+                    source_text__in=pending,
+                    source_lang=source_lang,
+                    target_lang=target_lang
+                ).values_list('source_text', 'translated_text')
+                db_hits = dict(cached)
+                translations.update(db_hits)
+                translation_cache.set_many(db_hits, source_lang, target_lang)
+                translation_cache.record_db_hits(len(db_hits))
+            except Exception as e:
+                logger.error(f'Error buscando en caché: {e}')
+        
+        misses = [text for text in pending if text not in db_hits]
+        logger.debug(
+            f'Traducción por lote: {len(hits)} en memoria, {len(db_hits)} en DB, '
+            f'{len(misses)} pendientes'
+        )
+        
+        if not misses:
+            return translations, {}
+        
+        if not self.client:
+            logger.warning(
+                'Cliente de traducción no disponible. Retornando textos originales.'
+            )
+            return translations, {}
+        
+        if not fetch_missing:
+            self.schedule_pretranslation(misses, target_lang, source_lang)
+            return translations, {}
+        
+        nuevas = {}
+        for start in range(0, len(misses), self.MAX_SEGMENTS_PER_REQUEST):
+            chunk = misses[start:start + self.MAX_SEGMENTS_PER_REQUEST]
+            try:
+                logger.info(
+                    f'Traduciendo {len(chunk)} textos con Google API '
+                    'en una sola llamada'
                 )
+                
+                # Los textos van en el cuerpo para no exceder el largo máximo de la URL
+                response = cliente('google_translate').post(
+                    self.api_url,
+                    idempotente=True,
+                    params={'key': self.api_key},
+                    data={
+                        'q': chunk,
+                        'target': target_lang,
+                        'source': source_lang,
+                        'format': 'text'
+                    }
+                )
+                response.raise_for_status()
+                
+                result = response.json()
+                for text, item in zip(chunk, result['data']['translations']):
+                    nuevas[text] = item['translatedText']
+            except Exception as e:
+                logger.error(f'Error traduciendo lote con Google API: {e}')
         
-        # Traducir ocasiones si existen (desde español)
-        if 'ocasiones' in translated and translated['ocasiones']:
-            if isinstance(translated['ocasiones'], list):
-                for ocasion in translated['ocasiones']:
-                    if isinstance(ocasion, dict) and 'nombre' in ocasion:
-                        ocasion['nombre'] = self.translate_text(
-                            ocasion['nombre'],
-                            target_lang,
-                            source_lang='es'
+        if nuevas:
+            translations.update(nuevas)
+            translation_cache.set_many(nuevas, source_lang, target_lang)
+            
+            # Guardar en caché; ignore_conflicts evita fallar si otro proceso ya
+            # la guardó
+            try:
+                Translation.objects.bulk_create(
+                    [
+                        Translation(
+                            source_text=text,
+                            source_lang=source_lang,
+                            target_lang=target_lang,
+                            translated_text=translated_text
                         )
+                        for text, translated_text in nuevas.items()
+                    ],
+                    ignore_conflicts=True
+                )
+                logger.info(f'{len(nuevas)} traducciones guardadas en caché')
+            except Exception as e:
+                logger.error(f'Error guardando traducciones en caché: {e}')
+        
+        return translations, nuevas
+    
+    def _product_texts(self, product_data: Dict[str, Any]) -> List[str]:
+        """Devuelve los textos traducibles de un producto serializado."""
+        texts = [product_data.get(field) for field in self.PRODUCT_FIELDS]
+        
+        for field in ('categoria', 'tipo_flor'):
+            nested = product_data.get(field)
+            if isinstance(nested, dict):
+                texts.append(nested.get('nombre'))
+        
+        ocasiones = product_data.get('ocasiones')
+        if isinstance(ocasiones, list):
+            texts.extend(o.get('nombre') for o in ocasiones if isinstance(o, dict))
+        
+        return [t for t in texts if isinstance(t, str)]
+    
+    def _apply_product_translations(
+        self, product_data: Dict[str, Any], translations: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """Reemplaza los textos de un producto serializado según las traducciones."""
+        translated = product_data.copy()
+        
+        for field in self.PRODUCT_FIELDS:
+            if translated.get(field):
+                texto = translated[field]
+                translated[field] = translations.get(texto, texto)
+        
+        for field in ('categoria', 'tipo_flor'):
+            nested = translated.get(field)
+            if isinstance(nested, dict) and nested.get('nombre'):
+                nested['nombre'] = translations.get(nested['nombre'], nested['nombre'])
+        
+        ocasiones = translated.get('ocasiones')
+        if isinstance(ocasiones, list):
+            for ocasion in ocasiones:
+                if isinstance(ocasion, dict) and ocasion.get('nombre'):
+                    nombre = ocasion['nombre']
+                    ocasion['nombre'] = translations.get(nombre, nombre)
         
         return translated
     
-    def translate_products(self, products: List[Dict[str, Any]], target_lang: str = 'en') -> List[Dict[str, Any]]:
+    def translate_products(
+        self, products: List[Dict[str, Any]], target_lang: str = 'en',
+        fetch_missing: bool = True,
+    ) -> List[Dict[str, Any]]:
         """
-        Traduce una lista de productos.
+        Traduce una lista de productos en modo lote.
+        
+        Junta todos los textos distintos de la página (nombre, descripciones,
+        categoría, tipo de flor y ocasiones) y los resuelve con translate_batch,
+        de modo que el costo es una consulta al caché y como máximo una llamada
+        a la API, sin importar cuántos productos tenga la página.
         
         Args:
             products: Lista de productos
             target_lang: Idioma destino
+            fetch_missing: Ver translate_batch
         
         Returns:
             Lista de productos traducidos
         """
-        if target_lang == 'es':
+        if target_lang == 'es' or not products:
             return products
         
-        return [self.translate_product(product, target_lang) for product in products]
+        texts = []
+        for product in products:
+            texts.extend(self._product_texts(product))
+        
+        translations = self.translate_batch(
+            texts, target_lang, source_lang='es', fetch_missing=fetch_missing
+        )
+        
+        return [
+            self._apply_product_translations(product, translations)
+            for product in products
+        ]
+    
+    def translate_items(
+        self, items: List[Dict[str, Any]], fields: List[str],
+        target_lang: str = 'en', fetch_missing: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Traduce campos planos de una lista de diccionarios (categorías,
+        ocasiones, slides, etc.) con una sola pasada por translate_batch.
+        
+        Args:
+            items: Lista de diccionarios serializados
+            fields: Campos a traducir
+            target_lang: Idioma destino
+            fetch_missing: Ver translate_batch
+        
+        Returns:
+            Nueva lista con los campos traducidos
+        """
+        if target_lang == 'es' or not items:
+            return items
+        
+        texts = [item.get(field) for item in items for field in fields]
+        translations = self.translate_batch(
+            [t for t in texts if isinstance(t, str)],
+            target_lang,
+            source_lang='es',
+            fetch_missing=fetch_missing
+        )
+        
+        translated_items = []
+        for item in items:
+            translated = item.copy()
+            for field in fields:
+                if translated.get(field):
+                    texto = translated[field]
+                    translated[field] = translations.get(texto, texto)
+            translated_items.append(translated)
+        return translated_items
+    
+    def pretranslate(
+        self, texts: List[str], languages: Optional[List[str]] = None
+    ) -> int:
+        """
+        Calcula y guarda las traducciones de `texts` para todos los idiomas
+        configurados (settings.TRANSLATION_LANGUAGES).
+        
+        Returns:
+            Cantidad de traducciones nuevas (las que no estaban guardadas), sumando
+            todos los idiomas
+        """
+        languages = languages or self.languages
+        unique_texts = list(dict.fromkeys(t for t in texts if t and t.strip()))
+        
+        nuevas = 0
+        for lang in languages:
+            if lang != 'es':
+                _, nuevas_lang = self._translate_batch(
+                    unique_texts, lang, 'es', fetch_missing=True
+                )
+                nuevas += len(nuevas_lang)
+        
+        return nuevas
+    
+    def schedule_pretranslation(
+        self, texts: List[str], target_lang: str, source_lang: str = 'es'
+    ):
+        """
+        Encola en Celery la traducción de textos que faltaron al servir una
+        respuesta, para que la próxima vez salgan del caché.
+        
+        Con CELERY_TASK_ALWAYS_EAGER la tarea correría dentro del request, así
+        que en ese caso sólo se registra: el comando pretraducir_catalogo o el
+        guardado en el admin se encargan de completarlos.
+        """
+        if getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+            logger.info(
+                f'{len(texts)} textos sin traducción precalculada para {target_lang}'
+            )
+            return
+        
+        try:
+            from .tasks import pretraducir_textos
+            pretraducir_textos.delay(list(texts), [target_lang], source_lang)
+        except Exception as e:
+            logger.error(f'Error encolando traducciones pendientes: {e}')
 
 
 # Instancia singleton del servicio
@@ -7,6 +7,7 @@ from django.conf import settings
 
 # Modelos del catálogo
 from catalogo.models import Producto, Categoria
+from catalogo.search import buscar_productos
 # from .models import Testimonial, BlogPost, Subscriber
 
 def profile_view(request):
@@ -119,35 +120,13 @@ def search(request):
     results = []
     
     if query:
-        # Search in products
-        # products = Product.objects.filter(
-        #     Q(name__icontains=query) | 
-        #     Q(description__icontains=query) |
-        #     Q(short_description__icontains=query),
-        #     is_active=True
-        # )
-        
-        # Search in blog posts
-        # posts = BlogPost.objects.filter(
-        #     Q(title__icontains=query) | 
-        #     Q(content__icontains=query) |
-        #     Q(excerpt__icontains=query),
-        #     is_published=True
-        # )
-        
-        # Search in categories
-        # categories = Category.objects.filter(
-        #     Q(name__icontains=query) | 
-        #     Q(description__icontains=query)
-        # )
-        
-        # Combine results
-        # results = {
-        #     'products': products,
-        #     'posts': posts,
-        #     'categories': categories,
-        # }
-        pass
+        # Mismo motor que el parámetro `search` de la API del catálogo
+        productos = Producto.objects.filter(is_active=True).select_related(
+            'categoria'
+        ).prefetch_related('imagenes')
+        results = {
+            'products': buscar_productos(productos, query)[:48],
+        }
     
     return render(request, 'core/search.html', {
         'query': query,
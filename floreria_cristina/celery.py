@@ -1,5 +1,7 @@
+import logging
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Establecer el módulo de configuración de Django predeterminado para 'celery'.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'floreria_cristina.settings')
@@ -19,12 +21,46 @@ app.conf.beat_schedule = {
         'task': 'notificaciones.tasks.procesar_notificaciones_pendientes',
         'schedule': 300.0,  # Cada 5 minutos
     },
+    'despachar-outbox-notificaciones': {
+        'task': 'notificaciones.tasks.despachar_outbox',
+        'schedule': 30.0,  # Reintentos del outbox cada 30 segundos
+    },
     'limpiar-notificaciones-antiguas': {
         'task': 'notificaciones.tasks.limpiar_notificaciones_antiguas',
         'schedule': 86400.0,  # Cada 24 horas
     },
+    'liberar-reservas-stock-vencidas': {
+        'task': 'pedidos.tasks.liberar_reservas_stock_vencidas',
+        'schedule': 60.0,  # Cada minuto
+    },
+    'procesar-eventos-pago': {
+        'task': 'pedidos.tasks.procesar_eventos_pago',
+        'schedule': 60.0,  # Reintentos de webhooks de pago cada minuto
+    },
+    'actualizar-cotizacion-dolar': {
+        'task': 'pedidos.tasks.actualizar_cotizacion_dolar',
+        'schedule': 1800.0,  # Cada 30 minutos, antes de que venza la cotización
+    },
+    'recalcular-estadisticas-pedidos': {
+        'task': 'pedidos.tasks.recalcular_estadisticas_pedidos',
+        'schedule': 86400.0,  # Cada 24 horas, corrige desfasajes de los contadores
+    },
 }
 
+
+@worker_process_init.connect
+def precargar_plantillas(**kwargs):
+    """Compila las plantillas de notificación al iniciar cada proceso del worker"""
+    try:
+        from notificaciones.plantillas import plantillas_cache
+        plantillas_cache.precargar()
+    except Exception as e:
+        # Sin precarga las plantillas se compilan en el primer uso
+        logging.getLogger(__name__).warning(
+            f'No se pudieron precargar las plantillas: {e}'
+        )
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
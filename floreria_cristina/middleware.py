@@ -1,7 +1,9 @@
 """
-Middleware personalizado para el manejo de conexiones a la base de datos.
+Middleware personalizado para el manejo de conexiones a la base de datos y
+la renovación de sesiones.
 """
 import logging
+import time
 from django.db import connection, reset_queries
 from django.conf import settings
 
@@ -44,3 +46,69 @@ class ConnectionMiddleware:
                 logger.debug("Conexión a la base de datos cerrada")
         except Exception as e:
             logger.warning(f"Error al cerrar la conexión: {str(e)}")
+
+
+class RenovarSesionMiddleware:
+    """
+    Con SESSION_SAVE_EVERY_REQUEST = False la sesión sólo se guarda cuando
+    cambia, así que la actividad ya no extiende su vencimiento. Este
+    middleware marca como modificada una sesión usada a lo sumo una vez cada
+    SESSION_RENEW_INTERVAL segundos: un carrito activo no vence y el resto de
+    los requests no escribe en django_session.
+
+    Va después de SessionMiddleware.
+    """
+    KEY = '_renovada'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.intervalo = getattr(settings, 'SESSION_RENEW_INTERVAL', 60 * 60 * 24)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        # Sólo sesiones que el request ya leyó: no se agrega una lectura
+        if session is None or not session.accessed or session.is_empty():
+            return response
+
+        ahora = int(time.time())
+        if ahora - session.get(self.KEY, 0) >= self.intervalo:
+            session[self.KEY] = ahora
+        return response
+
+
+class CarritoCookieMiddleware:
+    """
+    Escribe en la respuesta la cookie firmada del carrito anónimo cuando el
+    request lo modificó (ver carrito.cart.Cart con CARRITO_ANONIMO = 'cookie').
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if not getattr(request, '_carrito_modificado', False):
+            return response
+
+        from carrito.cart import serializar_carrito
+
+        if request._carrito:
+            response.set_cookie(
+                settings.CARRITO_COOKIE_NAME,
+                serializar_carrito(request._carrito),
+                max_age=settings.CARRITO_COOKIE_AGE,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        else:
+            response.delete_cookie(
+                settings.CARRITO_COOKIE_NAME,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
@@ -144,9 +144,38 @@ else:
 
 CSRF_USE_SESSIONS = False
 SESSION_COOKIE_HTTPONLY = True
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_NAME = 'sessionid'
-SESSION_SAVE_EVERY_REQUEST = True
+
+# Caché y sesiones: con REDIS_URL la caché es compartida por todos los
+# procesos y las sesiones se leen de Redis con respaldo en la base
+# (cached_db). Sin Redis, caché local del proceso y sesiones en la base.
+REDIS_URL = env('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'floreria',
+        }
+    }
+    SESSION_ENGINE = env(
+        'SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db'
+    )
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'floreria',
+        }
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# La sesión se guarda sólo cuando cambia; RenovarSesionMiddleware extiende
+# el vencimiento de las sesiones activas a lo sumo una vez por intervalo
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_RENEW_INTERVAL = env.int(
+    'SESSION_RENEW_INTERVAL', default=60 * 60 * 24
+)  # 1 día
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
@@ -237,6 +266,8 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise para archivos estáticos en Railway
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'floreria_cristina.middleware.RenovarSesionMiddleware',
+    'floreria_cristina.middleware.CarritoCookieMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -487,6 +518,11 @@ INTERNAL_IPS = [
 
 # Configuración del carrito
 CART_SESSION_ID = 'carrito'
+# Carrito de usuarios anónimos: 'cookie' (cookie firmada, no escribe en
+# django_session) o 'session'
+CARRITO_ANONIMO = env('CARRITO_ANONIMO', default='cookie')
+CARRITO_COOKIE_NAME = 'carrito'
+CARRITO_COOKIE_AGE = env.int('CARRITO_COOKIE_AGE', default=60 * 60 * 24 * 14)  # 14 días
 
 # Serializer personalizado para sesiones que maneja Decimal
 SESSION_SERIALIZER = 'floreria_cristina.session_serializer.CustomJSONSerializer'
@@ -512,6 +548,39 @@ CELERY_TIMEZONE = 'America/Argentina/Buenos_Aires'
 # Celery Beat Configuration
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Minutos que se reserva el stock de un pedido mientras se espera el pago
+# online (ver pedidos.stock); las reservas vencidas las libera Celery Beat
+STOCK_HOLD_MINUTES = env.int('STOCK_HOLD_MINUTES', default=30)
+
+# Outbox de notificaciones (ver notificaciones.outbox): envíos simultáneos
+# por canal, reintentos y backoff exponencial (segundos)
+NOTIFICACIONES_OUTBOX_CONCURRENCIA = {
+    'email': env.int('OUTBOX_CONCURRENCIA_EMAIL', default=4),
+    'whatsapp': env.int('OUTBOX_CONCURRENCIA_WHATSAPP', default=2),
+}
+NOTIFICACIONES_OUTBOX_MAX_INTENTOS = env.int('OUTBOX_MAX_INTENTOS', default=5)
+NOTIFICACIONES_OUTBOX_BACKOFF_SEGUNDOS = 30
+NOTIFICACIONES_OUTBOX_BACKOFF_MAXIMO = 3600
+NOTIFICACIONES_OUTBOX_BLOQUEO_SEGUNDOS = 300
+
+# Webhooks de pago procesados en segundo plano (ver pedidos.pagos):
+# reintentos de la consulta al proveedor y backoff exponencial (segundos)
+PAGOS_EVENTOS_MAX_INTENTOS = env.int('PAGOS_EVENTOS_MAX_INTENTOS', default=8)
+PAGOS_EVENTOS_BACKOFF_SEGUNDOS = 30
+PAGOS_EVENTOS_BACKOFF_MAXIMO = 3600
+PAGOS_EVENTOS_BLOQUEO_SEGUNDOS = 300
+
+# Los dashboards leen los contadores de pedidos de PedidoStats en vez de
+# contar la tabla (ver pedidos.estadisticas)
+PEDIDOS_STATS_MATERIALIZADAS = env.bool('PEDIDOS_STATS_MATERIALIZADAS', default=True)
+# Filas por contador, para que los checkouts simultáneos no esperen la misma
+PEDIDOS_STATS_FRAGMENTOS = env.int('PEDIDOS_STATS_FRAGMENTOS', default=8)
+
+# Cliente HTTP compartido de las integraciones externas (ver core.http).
+# Ajustes por integración sobre los defaults, por ejemplo:
+# {'n8n': {'timeout': (3.05, 30), 'reintentos': 0}, 'bcra': {'umbral_fallos': 3}}
+INTEGRACIONES_HTTP = {}
+
 # Configuración de autenticación social
 SOCIALACCOUNT_PROVIDERS = {
     'google': {
@@ -620,3 +689,40 @@ N8N_API_KEY = env('N8N_API_KEY', default='')
 N8N_ENABLED = env.bool('N8N_ENABLED', default=False)
 
 FACEBOOK_PIXEL_ID = env('FACEBOOK_PIXEL_ID', default='')
+
+# ==============================================================================
+# TRANSLATION CACHE
+# ==============================================================================
+# LRU en memoria por proceso + caché compartida delante de la tabla Translation
+TRANSLATION_CACHE_LOCAL_SIZE = env.int('TRANSLATION_CACHE_LOCAL_SIZE', default=5000)
+# Vencimientos en segundos: 5 minutos en memoria, 24 horas en la caché compartida
+TRANSLATION_CACHE_LOCAL_TTL = env.int('TRANSLATION_CACHE_LOCAL_TTL', default=300)
+TRANSLATION_CACHE_TIMEOUT = env.int('TRANSLATION_CACHE_TIMEOUT', default=60 * 60 * 24)
+
+# Idiomas a los que se pretraduce el catálogo al guardar (ver catalogo.signals)
+TRANSLATION_LANGUAGES = env.list('TRANSLATION_LANGUAGES', default=['en'])
+# Si es False, la API del catálogo sólo sirve traducciones ya guardadas y
+# encola las faltantes en vez de llamar a Google dentro del request
+TRANSLATION_API_ON_REQUEST = env.bool('TRANSLATION_API_ON_REQUEST', default=False)
+
+# ==============================================================================
+# CATALOG RESPONSE CACHE
+# ==============================================================================
+# Respuestas completas de la API pública del catálogo (ver catalogo.cache).
+# Se invalidan al guardar o eliminar objetos del catálogo.
+# Requiere una caché compartida entre procesos (Redis o DatabaseCache): la
+# generación que invalida las respuestas vive en la caché, y con la caché
+# local de cada proceso un cambio hecho en otro (Celery, el daemon del outbox,
+# otro worker de gunicorn) no se vería hasta CATALOGO_CACHE_TIMEOUT. Por eso
+# sólo se activa por defecto con REDIS_URL (ver el check catalogo.W001).
+CATALOGO_CACHE_ENABLED = env.bool('CATALOGO_CACHE_ENABLED', default=bool(REDIS_URL))
+CATALOGO_CACHE_TIMEOUT = env.int('CATALOGO_CACHE_TIMEOUT', default=60 * 5)  # 5 minutos
+# max-age para navegadores/CDN; 0 obliga a revalidar con ETag en cada request
+CATALOGO_CACHE_MAX_AGE = env.int('CATALOGO_CACHE_MAX_AGE', default=0)
+
+# Catálogo PDF del taller (ver catalogo.miniaturas): descargas simultáneas de
+# imágenes y directorio de la caché de miniaturas (default: temporal del sistema)
+CATALOGO_PDF_DESCARGAS_PARALELAS = env.int(
+    'CATALOGO_PDF_DESCARGAS_PARALELAS', default=8
+)
+CATALOGO_PDF_CACHE_DIR = env('CATALOGO_PDF_CACHE_DIR', default='')
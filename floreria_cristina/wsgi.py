@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'floreria_cristina.settings')
 
 application = get_wsgi_application()
+
+# Cada worker arma sus índices de sugerencias sin esperar la primera búsqueda
+from catalogo.suggest import suggest_service  # noqa: E402
+
+suggest_service.precargar()
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import PlantillaNotificacion, Notificacion, ConfiguracionNotificacion
+from django.utils import timezone
+
+from .models import (
+    PlantillaNotificacion, Notificacion, ConfiguracionNotificacion, MensajeOutbox
+)
 
 
 @admin.register(PlantillaNotificacion)
@@ -93,3 +97,28 @@ class ConfiguracionNotificacionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
+
+
+@admin.register(MensajeOutbox)
+class MensajeOutboxAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'canal', 'pedido_id', 'estado', 'intentos', 'proximo_intento',
+        'enviado', 'creado',
+    ]
+    list_filter = ['canal', 'estado', 'creado']
+    search_fields = ['pedido_id', 'ultimo_error']
+    readonly_fields = ['creado', 'actualizado', 'enviado', 'bloqueado_hasta']
+    date_hierarchy = 'creado'
+    
+    actions = ['reintentar_ahora']
+    
+    def reintentar_ahora(self, request, queryset):
+        """Vuelve a poner en cola los mensajes fallidos o en espera de reintento"""
+        count = queryset.filter(estado__in=['fallido', 'pendiente']).update(
+            estado='pendiente',
+            intentos=0,
+            proximo_intento=timezone.now(),
+        )
+        self.message_user(request, f'{count} mensajes reencolados.')
+    
+    reintentar_ahora.short_description = "Reintentar ahora los mensajes seleccionados"
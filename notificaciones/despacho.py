@@ -0,0 +1,209 @@
+"""
+Despacho por lotes de las notificaciones pendientes.
+
+Reemplaza el envío de a una notificación por tarea:
+
+- Las notificaciones se reclaman de a lotes con SELECT ... FOR UPDATE SKIP
+  LOCKED y se marcan "reintentando", así varios workers pueden despachar en
+  paralelo sin tomar las mismas filas.
+- Cada lote se agrupa por canal. Los emails salen por una única conexión del
+  backend (una sesión SMTP o una sesión HTTP keep-alive) y, si el backend
+  tiene `enviar_lote` (SendGrid, Resend), por sus endpoints de envío masivo.
+- Los resultados se guardan con un UPDATE por estado, no un save() por fila.
+
+Las notificaciones de pedido confirmado las despacha el outbox
+(notificaciones.outbox) y se excluyen acá.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CanalNotificacion, EstadoNotificacion, Notificacion
+
+logger = logging.getLogger(__name__)
+
+LOTE_DEFAULT = 100
+
+# Una notificación "reintentando" sin novedades en este tiempo quedó de un
+# worker caído y se vuelve a reclamar
+BLOQUEO_MINUTOS = 15
+
+
+def reclamar_lote(tamano, excluir=()):
+    """Reclama hasta `tamano` notificaciones listas para enviar."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Notificacion.objects.select_for_update(skip_locked=True).filter(
+                Q(estado__in=[EstadoNotificacion.PENDIENTE, EstadoNotificacion.FALLIDA])
+                | Q(
+                    estado=EstadoNotificacion.REINTENTANDO,
+                    updated_at__lt=ahora - timedelta(minutes=BLOQUEO_MINUTOS),
+                ),
+                intentos__lt=F('max_intentos'),
+            ).exclude(
+                metadatos__has_key='outbox'
+            ).exclude(
+                id__in=list(excluir)
+            ).order_by('created_at', 'id').values_list('id', flat=True)[:tamano]
+        )
+        if not ids:
+            return []
+
+        Notificacion.objects.filter(id__in=ids).update(
+            estado=EstadoNotificacion.REINTENTANDO,
+            intentos=F('intentos') + 1,
+            updated_at=ahora,
+        )
+    return list(Notificacion.objects.filter(id__in=ids).order_by('created_at', 'id'))
+
+
+def _error(e):
+    return f'{type(e).__name__}: {str(e)}'
+
+
+def _enviar_emails(notificaciones):
+    """Envía los emails por una sola conexión; devuelve un error por notificación."""
+    from_email = getattr(
+        settings, 'DEFAULT_FROM_EMAIL', 'no-reply@floreriacristina.com'
+    )
+    mensajes = [
+        EmailMessage(
+            notificacion.asunto, notificacion.mensaje, from_email,
+            [notificacion.destinatario],
+        )
+        for notificacion in notificaciones
+    ]
+
+    try:
+        timeout = getattr(settings, 'EMAIL_TIMEOUT', None) or 10
+        with get_connection(fail_silently=False, timeout=timeout) as conexion:
+            if hasattr(conexion, 'enviar_lote'):
+                return conexion.enviar_lote(mensajes)
+
+            errores = []
+            for mensaje in mensajes:
+                try:
+                    conexion.send_messages([mensaje])
+                    errores.append('')
+                except Exception as e:
+                    errores.append(_error(e))
+            return errores
+    except Exception as e:
+        # No se pudo abrir la conexión: falla todo el lote
+        logger.error(f"❌ Error conectando con el backend de email: {str(e)}")
+        return [_error(e)] * len(notificaciones)
+
+
+def _enviar_twilio(notificaciones):
+    """
+    WhatsApp y SMS salen de a uno por el cliente de Twilio (sesión HTTP
+    compartida).
+    """
+    from .services import notificacion_service
+
+    enviar = {
+        CanalNotificacion.WHATSAPP: notificacion_service._enviar_whatsapp,
+        CanalNotificacion.SMS: notificacion_service._enviar_sms,
+    }
+    errores = []
+    for notificacion in notificaciones:
+        try:
+            enviar[notificacion.canal](notificacion)
+            errores.append('')
+        except Exception as e:
+            errores.append(_error(e))
+    return errores
+
+
+ENVIOS_POR_CANAL = {
+    CanalNotificacion.EMAIL: _enviar_emails,
+    CanalNotificacion.WHATSAPP: _enviar_twilio,
+    CanalNotificacion.SMS: _enviar_twilio,
+}
+
+
+def _enviar(notificaciones):
+    """
+    Envía un lote agrupado por canal y guarda los resultados. Devuelve
+    (enviadas, fallidas).
+    """
+    por_canal = defaultdict(list)
+    for notificacion in notificaciones:
+        por_canal[notificacion.canal].append(notificacion)
+
+    enviadas, fallidas = [], defaultdict(list)
+    for canal, grupo in por_canal.items():
+        envio = ENVIOS_POR_CANAL.get(canal)
+        if envio:
+            errores = envio(grupo)
+        else:
+            errores = [f'Canal no soportado: {canal}'] * len(grupo)
+        for notificacion, error in zip(grupo, errores):
+            if error:
+                fallidas[error].append(notificacion.id)
+            else:
+                enviadas.append(notificacion.id)
+
+    ahora = timezone.now()
+    Notificacion.objects.filter(id__in=enviadas).update(
+        estado=EstadoNotificacion.ENVIADA, fecha_envio=ahora, error_mensaje='',
+        updated_at=ahora,
+    )
+    for error, ids in fallidas.items():
+        Notificacion.objects.filter(id__in=ids).update(
+            estado=EstadoNotificacion.FALLIDA, error_mensaje=error, updated_at=ahora
+        )
+        logger.error(f"❌ {len(ids)} notificaciones fallidas: {error}")
+
+    return len(enviadas), sum(len(ids) for ids in fallidas.values())
+
+
+def despachar_pendientes(lote=LOTE_DEFAULT, maximo=None):
+    """
+    Despacha las notificaciones pendientes de a lotes hasta agotarlas (o
+    hasta `maximo`). Cada notificación se intenta a lo sumo una vez por
+    llamada; las fallidas quedan para la próxima pasada.
+
+    Returns:
+        dict: enviadas, fallidas, segundos y mensajes_por_segundo.
+    """
+    inicio = time.monotonic()
+    procesadas = set()
+    enviadas = fallidas = 0
+
+    while maximo is None or len(procesadas) < maximo:
+        tamano = lote if maximo is None else min(lote, maximo - len(procesadas))
+        notificaciones = reclamar_lote(tamano, excluir=procesadas)
+        if not notificaciones:
+            break
+        procesadas.update(notificacion.id for notificacion in notificaciones)
+
+        ok, error = _enviar(notificaciones)
+        enviadas += ok
+        fallidas += error
+
+    segundos = time.monotonic() - inicio
+    total = enviadas + fallidas
+    resultado = {
+        'enviadas': enviadas,
+        'fallidas': fallidas,
+        'segundos': round(segundos, 3),
+        'mensajes_por_segundo': (
+            round(total / segundos, 1) if total and segundos else 0.0
+        ),
+    }
+    if total:
+        logger.info(
+            f"📊 {total} notificaciones despachadas en {segundos:.2f}s "
+            f"({resultado['mensajes_por_segundo']} msg/s): "
+            f"{enviadas} enviadas, {fallidas} fallidas"
+        )
+    return resultado
@@ -0,0 +1,50 @@
+"""
+Comando para despachar el outbox de notificaciones cuando Celery está apagado
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notificaciones.outbox import despachar
+from notificaciones.plantillas import plantillas_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Despacha los mensajes del outbox de notificaciones '
+        '(daemon; usar --una-vez para una sola pasada)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Despachar lo pendiente y salir'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5.0,
+            help='Segundos de espera cuando no hay mensajes listos (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        self.stdout.write('📤 Despachando outbox de notificaciones...')
+        plantillas_cache.precargar()
+        try:
+            while True:
+                close_old_connections()
+                procesados = despachar()
+                total += procesados
+                if procesados:
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} mensajes procesados'))
@@ -0,0 +1,148 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:23
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def crear_plantilla_confirmacion(apps, schema_editor):
+    """
+    La plantilla de email de pedido confirmado antes se creaba al vuelo en
+    Pedido.confirmar_pedido; ahora se garantiza acá.
+    """
+    PlantillaNotificacion = apps.get_model('notificaciones', 'PlantillaNotificacion')
+    PlantillaNotificacion.objects.get_or_create(
+        tipo='pedido_confirmado',
+        canal='email',
+        defaults={
+            'asunto': '✅ Pedido #{pedido_id} Confirmado - Florería Cristina',
+            'mensaje': '''¡Hola {nombre}!
+
+Tu pedido #{pedido_id} ha sido confirmado exitosamente.
+
+📋 Detalles del pedido:
+• Número de pedido: #{pedido_id}
+• Total: ${total}
+• Fecha: {fecha}
+• Cantidad de productos: {items_count}
+• Tipo de envío: {tipo_envio}
+
+📦 ¿Qué sigue?
+Te notificaremos cuando tu pedido esté en camino.
+
+💐 ¡Gracias por elegir Florería Cristina!
+
+Saludos,
+El equipo de Florería Cristina
+🌸 Hacemos que cada momento sea especial 🌸''',
+            'activa': True,
+        }
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notificaciones", "0003_actualizar_plantilla_entregado"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MensajeOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "canal",
+                    models.CharField(
+                        choices=[
+                            ("email", "Email"),
+                            ("whatsapp", "WhatsApp"),
+                            ("sms", "SMS"),
+                        ],
+                        max_length=20,
+                        verbose_name="Canal",
+                    ),
+                ),
+                (
+                    "payload",
+                    models.JSONField(default=dict, verbose_name="Datos del mensaje"),
+                ),
+                (
+                    "pedido_id",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="ID del Pedido"
+                    ),
+                ),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendiente", "Pendiente"),
+                            ("procesando", "Procesando"),
+                            ("enviado", "Enviado"),
+                            ("fallido", "Fallido"),
+                        ],
+                        default="pendiente",
+                        max_length=20,
+                        verbose_name="Estado",
+                    ),
+                ),
+                (
+                    "intentos",
+                    models.PositiveIntegerField(default=0, verbose_name="Intentos"),
+                ),
+                (
+                    "max_intentos",
+                    models.PositiveIntegerField(
+                        default=5, verbose_name="Máximo Intentos"
+                    ),
+                ),
+                (
+                    "proximo_intento",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Próximo Intento",
+                    ),
+                ),
+                (
+                    "bloqueado_hasta",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Un worker lo está procesando; si se cae, se vuelve a tomar al vencer",
+                        null=True,
+                        verbose_name="Bloqueado hasta",
+                    ),
+                ),
+                (
+                    "ultimo_error",
+                    models.TextField(blank=True, verbose_name="Último Error"),
+                ),
+                (
+                    "enviado",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Fecha de Envío"
+                    ),
+                ),
+                ("creado", models.DateTimeField(auto_now_add=True)),
+                ("actualizado", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Mensaje en outbox",
+                "verbose_name_plural": "Outbox de mensajes",
+                "ordering": ["proximo_intento", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["canal", "estado", "proximo_intento"],
+                        name="outbox_despacho_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(crear_plantilla_confirmacion, migrations.RunPython.noop),
+    ]
@@ -217,3 +217,72 @@ class ConfiguracionNotificacion(models.Model):
 
     def __str__(self):
         return f'Configuración de {self.usuario.username}'
+
+
+class MensajeOutbox(models.Model):
+    """
+    Mensaje pendiente de despacho (outbox transaccional).
+
+    Se escribe en la misma transacción que el cambio que lo origina (p. ej. la
+    confirmación del pedido) y lo despacha después un worker (ver
+    notificaciones.outbox), con reintentos y backoff, fuera del request.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    canal = models.CharField(
+        max_length=20,
+        choices=CanalNotificacion.choices,
+        verbose_name='Canal'
+    )
+    payload = models.JSONField(
+        default=dict,
+        verbose_name='Datos del mensaje'
+    )
+    pedido_id = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='ID del Pedido'
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS,
+        default='pendiente',
+        verbose_name='Estado'
+    )
+    intentos = models.PositiveIntegerField(default=0, verbose_name='Intentos')
+    max_intentos = models.PositiveIntegerField(
+        default=5, verbose_name='Máximo Intentos'
+    )
+    proximo_intento = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Próximo Intento'
+    )
+    bloqueado_hasta = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Bloqueado hasta',
+        help_text='Un worker lo está procesando; si se cae, se vuelve a tomar al vencer'
+    )
+    ultimo_error = models.TextField(blank=True, verbose_name='Último Error')
+    enviado = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de Envío')
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Mensaje en outbox'
+        verbose_name_plural = 'Outbox de mensajes'
+        ordering = ['proximo_intento', 'id']
+        indexes = [
+            models.Index(
+                fields=['canal', 'estado', 'proximo_intento'],
+                name='outbox_despacho_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.get_canal_display()} #{self.id} ({self.get_estado_display()})'
@@ -8,6 +8,8 @@ import requests
 import logging
 from django.conf import settings
 
+from core.http import cliente
+
 logger = logging.getLogger(__name__)
 
 
@@ -137,7 +139,7 @@ class N8NService:
             # Enviar a n8n
             logger.info(f"📤 Enviando notificación n8n para pedido #{pedido.numero_pedido} (tipo: {tipo})")
             
-            response = requests.post(
+            response = cliente('n8n').post(
                 f"{self.base_url}{webhook_path}",
                 json=data,
                 headers={
@@ -221,7 +223,7 @@ class N8NService:
             logger.debug(f"🔍 Payload completo: {data}")
             logger.debug(f"🔍 URL: {self.base_url}{webhook_path}")
             
-            response = requests.post(
+            response = cliente('n8n').post(
                 f"{self.base_url}{webhook_path}",
                 json=data,
                 headers={
@@ -0,0 +1,345 @@
+"""
+Outbox transaccional de notificaciones.
+
+Quien quiere notificar algo no envía nada: escribe un MensajeOutbox en la
+misma transacción que el cambio que lo origina (si la transacción se revierte,
+el mensaje desaparece con ella). Un worker los despacha después:
+
+- Con Celery, la tarea `despachar_outbox` se dispara al hacer commit y Celery
+  Beat la repite periódicamente para los reintentos.
+- Sin Celery (CELERY_TASK_ALWAYS_EAGER, el default en Railway) el mensaje se
+  envía en el mismo proceso al hacer commit, como antes, y el comando
+  `python manage.py procesar_outbox` corre como daemon para los reintentos
+  (proceso `worker` del Procfile; en Railway lo arranca railway_start.sh).
+
+Cada worker reclama mensajes con SELECT ... FOR UPDATE SKIP LOCKED y los marca
+como "procesando" por un tiempo limitado (si el worker se cae, otro los vuelve
+a tomar al vencer). Por canal nunca se reclaman más mensajes que los cupos
+libres de settings.NOTIFICACIONES_OUTBOX_CONCURRENCIA (los cupos se cuentan
+bajo un advisory lock del canal), así un SMTP lento no acapara el pool ni se
+satura n8n. Los fallos se reintentan con backoff
+exponencial hasta max_intentos.
+"""
+import hashlib
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CanalNotificacion, EstadoNotificacion, MensajeOutbox, Notificacion
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCIA_DEFAULT = {
+    CanalNotificacion.EMAIL: 4,
+    CanalNotificacion.WHATSAPP: 2,
+}
+
+
+class ErrorPermanente(Exception):
+    """El mensaje no se puede enviar y reintentar no va a cambiar nada."""
+
+
+def _config(nombre, default):
+    return getattr(settings, f'NOTIFICACIONES_OUTBOX_{nombre}', default)
+
+
+# ----------------------------------------------------------------------
+# Encolado
+# ----------------------------------------------------------------------
+
+def _despertar_worker():
+    from .tasks import despachar_outbox
+    try:
+        despachar_outbox.delay()
+    except Exception as e:
+        # Sin broker el mensaje queda en la tabla: lo toma Beat o el daemon
+        logger.warning(f"No se pudo disparar el despacho del outbox: {str(e)}")
+
+
+def _despachar_ahora(mensaje):
+    """Sin Celery: envía el mensaje recién encolado después del commit."""
+    try:
+        for reclamado in reclamar(mensaje.canal, 1, ids=[mensaje.pk]):
+            procesar(reclamado)
+    except Exception as e:
+        # El cambio ya se guardó: si algo falla el mensaje queda para el daemon
+        logger.error(f"Error despachando el outbox {mensaje.pk}: {str(e)}")
+
+
+def encolar(canal, payload, pedido_id=None):
+    """
+    Escribe un mensaje en el outbox. Llamar dentro de la transacción del
+    cambio que lo origina.
+    """
+    mensaje = MensajeOutbox.objects.create(
+        canal=canal,
+        payload=payload,
+        pedido_id=pedido_id,
+        max_intentos=_config('MAX_INTENTOS', 5),
+    )
+    if getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        # Sin worker de Celery: se envía acá, pero recién con el cambio
+        # guardado, así un error de envío no lo revierte
+        transaction.on_commit(lambda: _despachar_ahora(mensaje))
+    else:
+        transaction.on_commit(_despertar_worker)
+    return mensaje
+
+
+def encolar_notificacion(notificacion):
+    """Encola una Notificacion de email ya creada (la saca del despacho por lotes)."""
+    notificacion.metadatos['outbox'] = True
+    notificacion.save(update_fields=['metadatos'])
+    return encolar(
+        CanalNotificacion.EMAIL, {'notificacion_id': notificacion.id},
+        pedido_id=notificacion.pedido_id,
+    )
+
+
+def encolar_confirmacion_pedido(pedido):
+    """
+    Encola el email (y el WhatsApp vía n8n, si corresponde) de pedido
+    confirmado. Devuelve la lista de mensajes encolados.
+    """
+    from django.contrib.auth.models import User
+    from .models import TipoNotificacion
+    from .n8n_service import n8n_service
+    from .services import notificacion_service
+
+    mensajes = []
+
+    # PRIORIDAD 1: email del formulario; PRIORIDAD 2: email del usuario registrado
+    usuario = email_destino = None
+    nombre_destino = 'Cliente'
+    if pedido.email_comprador:
+        email_destino = pedido.email_comprador
+        nombre_destino = pedido.nombre_comprador or 'Cliente'
+        # Los invitados se registran a nombre del admin
+        usuario = pedido.cliente or User.objects.filter(is_superuser=True).first()
+    elif pedido.cliente:
+        usuario = pedido.cliente
+        email_destino = pedido.cliente.email
+        nombre_destino = pedido.cliente.first_name or pedido.cliente.username
+
+    if usuario and email_destino:
+        contexto = {
+            'pedido_id': pedido.id,
+            'nombre': nombre_destino,
+            'total': str(pedido.total),
+            'fecha': pedido.creado.strftime('%d/%m/%Y'),
+            'items_count': pedido.items.count(),
+            'tipo_envio': (
+                pedido.get_tipo_envio_display() if pedido.tipo_envio
+                else 'No especificado'
+            ),
+        }
+        try:
+            notificacion = notificacion_service.crear_notificacion(
+                usuario=usuario,
+                tipo=TipoNotificacion.PEDIDO_CONFIRMADO,
+                canal=CanalNotificacion.EMAIL,
+                destinatario=email_destino,
+                contexto=contexto,
+                pedido_id=pedido.id,
+                # La despacha el outbox, no el despacho por lotes
+                metadatos={'outbox': True}
+            )
+        except ValueError as e:
+            logger.error(f"No se encoló el email del pedido {pedido.id}: {str(e)}")
+        else:
+            mensajes.append(encolar(
+                CanalNotificacion.EMAIL, {'notificacion_id': notificacion.id},
+                pedido_id=pedido.id,
+            ))
+    else:
+        logger.warning(f"No se pudo determinar usuario o email para pedido {pedido.id}")
+
+    tiene_telefono = pedido.telefono_comprador or pedido.telefono_destinatario
+    if tiene_telefono and n8n_service.enabled and n8n_service.api_key:
+        mensajes.append(encolar(
+            CanalNotificacion.WHATSAPP, {'pedido_id': pedido.id, 'tipo': 'confirmado'},
+            pedido_id=pedido.id,
+        ))
+
+    logger.info(f"Pedido {pedido.id}: {len(mensajes)} notificaciones encoladas")
+    return mensajes
+
+
+# ----------------------------------------------------------------------
+# Envío por canal
+# ----------------------------------------------------------------------
+
+def _enviar_email(payload):
+    from .services import notificacion_service
+
+    try:
+        notificacion = Notificacion.objects.get(pk=payload['notificacion_id'])
+    except Notificacion.DoesNotExist:
+        raise ErrorPermanente(
+            f"Notificación {payload['notificacion_id']} no encontrada"
+        )
+
+    if notificacion.estado == EstadoNotificacion.ENVIADA:
+        return True
+    if not notificacion.puede_reintentar():
+        raise ErrorPermanente(f"Notificación {notificacion.id} no puede reintentarse")
+    return notificacion_service.enviar_notificacion(notificacion)
+
+
+def _enviar_whatsapp(payload):
+    from pedidos.models import Pedido
+    from .n8n_service import n8n_service
+
+    try:
+        pedido = Pedido.objects.get(pk=payload['pedido_id'])
+    except Pedido.DoesNotExist:
+        raise ErrorPermanente(f"Pedido {payload['pedido_id']} no encontrado")
+    return n8n_service.enviar_notificacion_pedido(
+        pedido=pedido, tipo=payload.get('tipo', 'confirmado')
+    )
+
+
+ENVIOS = {
+    CanalNotificacion.EMAIL: _enviar_email,
+    CanalNotificacion.WHATSAPP: _enviar_whatsapp,
+}
+
+
+# ----------------------------------------------------------------------
+# Despacho
+# ----------------------------------------------------------------------
+
+def calcular_backoff(intentos):
+    """Segundos hasta el próximo intento: exponencial con tope y algo de jitter."""
+    base = _config('BACKOFF_SEGUNDOS', 30)
+    retraso = min(base * 2 ** max(intentos - 1, 0), _config('BACKOFF_MAXIMO', 3600))
+    return retraso + random.uniform(0, base)
+
+
+def _bloquear_canal(canal):
+    """
+    Serializa los reclamos de un canal hasta el fin de la transacción. Sin
+    esto dos workers podrían contar los mismos cupos libres y reclamar cada
+    uno `limite` mensajes. En SQLite las escrituras ya van de a una.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    digest = hashlib.sha256(f'outbox:{canal}'.encode()).digest()
+    clave = int.from_bytes(digest[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [clave])
+
+
+def reclamar(canal, limite, ids=None):
+    """
+    Reclama hasta `limite` mensajes listos del canal (sólo entre `ids`, si se
+    indican), descontando los que otros workers tienen en vuelo. Cuenta el
+    intento al reclamar: un worker que se cae a mitad de envío también
+    consume un intento.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        # El conteo y el reclamo van bajo el mismo lock por canal
+        _bloquear_canal(canal)
+        en_vuelo = MensajeOutbox.objects.filter(
+            canal=canal, estado='procesando', bloqueado_hasta__gt=ahora
+        ).count()
+        libres = limite - en_vuelo
+        if libres <= 0:
+            return []
+
+        listos = MensajeOutbox.objects.select_for_update(skip_locked=True).filter(
+            Q(estado='pendiente', proximo_intento__lte=ahora)
+            | Q(estado='procesando', bloqueado_hasta__lte=ahora),
+            canal=canal,
+        )
+        if ids is not None:
+            listos = listos.filter(id__in=ids)
+        listos = listos.order_by('proximo_intento', 'id')
+        ids = list(listos.values_list('id', flat=True)[:libres])
+        if not ids:
+            return []
+
+        MensajeOutbox.objects.filter(id__in=ids).update(
+            estado='procesando',
+            bloqueado_hasta=ahora + timedelta(seconds=_config('BLOQUEO_SEGUNDOS', 300)),
+            intentos=F('intentos') + 1,
+        )
+    return list(MensajeOutbox.objects.filter(id__in=ids))
+
+
+def procesar(mensaje):
+    """Envía un mensaje reclamado y registra el resultado. Devuelve True si salió."""
+    error = ''
+    try:
+        enviado = ENVIOS[mensaje.canal](mensaje.payload)
+        if not enviado:
+            error = 'El canal informó un envío fallido'
+    except ErrorPermanente as e:
+        enviado, error = False, str(e)
+        mensaje.intentos = mensaje.max_intentos
+    except Exception as e:
+        enviado, error = False, f'{type(e).__name__}: {str(e)}'
+
+    ahora = timezone.now()
+    if enviado:
+        cambios = {'estado': 'enviado', 'enviado': ahora, 'ultimo_error': ''}
+    elif mensaje.intentos >= mensaje.max_intentos:
+        cambios = {'estado': 'fallido', 'ultimo_error': error}
+        logger.error(
+            f"Outbox {mensaje.id} ({mensaje.canal}) descartado tras "
+            f"{mensaje.intentos} intentos: {error}"
+        )
+    else:
+        cambios = {
+            'estado': 'pendiente',
+            'ultimo_error': error,
+            'proximo_intento': (
+                ahora + timedelta(seconds=calcular_backoff(mensaje.intentos))
+            ),
+        }
+        logger.warning(
+            f"Outbox {mensaje.id} ({mensaje.canal}) falló, "
+            f"intento {mensaje.intentos}: {error}"
+        )
+
+    MensajeOutbox.objects.filter(pk=mensaje.pk).update(
+        bloqueado_hasta=None, actualizado=ahora, **cambios
+    )
+    for campo, valor in cambios.items():
+        setattr(mensaje, campo, valor)
+    return enviado
+
+
+def _procesar_en_hilo(mensaje):
+    try:
+        return procesar(mensaje)
+    finally:
+        # Cada hilo abre su propia conexión
+        connection.close()
+
+
+def despachar():
+    """
+    Reclama y envía una tanda de mensajes de todos los canales; los de canales
+    distintos salen en paralelo. Devuelve la cantidad de mensajes procesados.
+    """
+    concurrencia = {**CONCURRENCIA_DEFAULT, **_config('CONCURRENCIA', {})}
+    mensajes = []
+    for canal, limite in concurrencia.items():
+        if canal in ENVIOS:
+            mensajes.extend(reclamar(canal, limite))
+
+    if len(mensajes) <= 1:
+        for mensaje in mensajes:
+            procesar(mensaje)
+    else:
+        with ThreadPoolExecutor(max_workers=len(mensajes)) as pool:
+            list(pool.map(_procesar_en_hilo, mensajes))
+    return len(mensajes)
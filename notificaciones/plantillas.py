@@ -0,0 +1,192 @@
+"""
+Caché en proceso de las plantillas de notificación compiladas.
+
+Cada notificación buscaba su PlantillaNotificacion en la base y volvía a
+interpretar el texto con str.format. Ahora cada plantilla activa se compila
+una vez (el texto se separa en literales y variables) y queda en memoria por
+(tipo, canal), junto con su updated_at.
+
+Invalidación:
+- Al guardar o eliminar una plantilla (ver notificaciones.signals) se
+  incrementa una generación en la caché de Django. Cada proceso compara su
+  generación local antes de usar la caché, así que con una caché compartida
+  (Redis) todos los workers se enteran del cambio.
+- Además cada entrada vence a los TTL_SEGUNDOS, por si la caché de Django es
+  local al proceso.
+
+Los workers la precargan al iniciar (`precargar`), con lo que renderizar una
+notificación no hace consultas.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+
+from .models import CanalNotificacion, PlantillaNotificacion, TipoNotificacion
+
+logger = logging.getLogger(__name__)
+
+GENERACION_KEY = 'notificaciones:plantillas:generacion'
+TTL_SEGUNDOS = 300
+
+_formatter = Formatter()
+
+# (literal, variable, format_spec, conversión) tal como los devuelve Formatter.parse
+Parte = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+def compilar(texto: str) -> Optional[List[Parte]]:
+    """
+    Separa el texto en literales y variables. Devuelve None si el texto no
+    se puede compilar (llaves desbalanceadas, variables anidadas en el
+    formato): en ese caso se renderiza con str.format como siempre.
+    """
+    try:
+        partes = list(_formatter.parse(texto))
+    except ValueError:
+        return None
+    for _, variable, formato, _ in partes:
+        if variable == '' or (formato and '{' in formato):
+            return None
+    return partes
+
+
+def renderizar(
+    texto: str, partes: Optional[List[Parte]], contexto: Dict[str, Any]
+) -> str:
+    """
+    Renderiza una plantilla compilada con el contexto dado. Igual que antes,
+    si falta una variable o algo falla se devuelve el texto sin renderizar.
+    """
+    try:
+        if partes is None:
+            return texto.format(**contexto)
+
+        salida = []
+        for literal, variable, formato, conversion in partes:
+            salida.append(literal)
+            if variable is not None:
+                valor, _ = _formatter.get_field(variable, (), contexto)
+                valor = _formatter.convert_field(valor, conversion)
+                salida.append(format(valor, formato or ''))
+        return ''.join(salida)
+    except KeyError as e:
+        logger.warning(f"Variable faltante en template: {str(e)}")
+        return texto
+    except Exception as e:
+        logger.error(f"Error renderizando template: {str(e)}")
+        return texto
+
+
+@dataclass
+class PlantillaCompilada:
+    tipo: str
+    canal: str
+    updated_at: Any
+    asunto: str
+    mensaje: str
+    partes_asunto: Optional[List[Parte]]
+    partes_mensaje: Optional[List[Parte]]
+
+    @classmethod
+    def desde(cls, plantilla):
+        return cls(
+            tipo=plantilla.tipo,
+            canal=plantilla.canal,
+            updated_at=plantilla.updated_at,
+            asunto=plantilla.asunto,
+            mensaje=plantilla.mensaje,
+            partes_asunto=compilar(plantilla.asunto),
+            partes_mensaje=compilar(plantilla.mensaje),
+        )
+
+    def renderizar(self, contexto: Dict[str, Any]) -> Tuple[str, str]:
+        """(asunto, mensaje) renderizados"""
+        return (
+            renderizar(self.asunto, self.partes_asunto, contexto),
+            renderizar(self.mensaje, self.partes_mensaje, contexto),
+        )
+
+
+def get_generacion():
+    generacion = cache.get(GENERACION_KEY)
+    if generacion is None:
+        cache.add(GENERACION_KEY, 1, timeout=None)
+        generacion = cache.get(GENERACION_KEY, 1)
+    return generacion
+
+
+def invalidar_plantillas():
+    """Incrementa la generación: todos los procesos recompilan al próximo uso."""
+    try:
+        cache.incr(GENERACION_KEY)
+    except ValueError:
+        cache.set(GENERACION_KEY, 2, timeout=None)
+    plantillas_cache.limpiar()
+
+
+class CachePlantillas:
+    """{(tipo, canal): (PlantillaCompilada o None si no hay activa, vence)}"""
+
+    def __init__(self):
+        self._plantillas = {}
+        self._generacion = None
+        self._lock = threading.Lock()
+
+    def limpiar(self):
+        with self._lock:
+            self._plantillas = {}
+            self._generacion = None
+
+    def _verificar_generacion(self):
+        generacion = get_generacion()
+        if generacion != self._generacion:
+            with self._lock:
+                self._plantillas = {}
+                self._generacion = generacion
+
+    def obtener(self, tipo: str, canal: str) -> Optional[PlantillaCompilada]:
+        """Plantilla activa compilada para (tipo, canal), o None si no existe."""
+        self._verificar_generacion()
+
+        entrada = self._plantillas.get((tipo, canal))
+        if entrada is not None and entrada[1] > time.monotonic():
+            return entrada[0]
+
+        plantilla = PlantillaNotificacion.objects.filter(
+            tipo=tipo, canal=canal, activa=True
+        ).first()
+        compilada = PlantillaCompilada.desde(plantilla) if plantilla else None
+        # También se recuerda que no hay plantilla, para no consultar en cada envío
+        self._plantillas[(tipo, canal)] = (compilada, time.monotonic() + TTL_SEGUNDOS)
+        return compilada
+
+    def precargar(self):
+        """Compila todas las plantillas activas con una sola consulta."""
+        self._verificar_generacion()
+        vence = time.monotonic() + TTL_SEGUNDOS
+        # Las combinaciones sin plantilla activa quedan registradas como None
+        plantillas = {
+            (tipo, canal): (None, vence)
+            for tipo in TipoNotificacion.values
+            for canal in CanalNotificacion.values
+        }
+        activas = 0
+        for plantilla in PlantillaNotificacion.objects.filter(activa=True):
+            plantillas[(plantilla.tipo, plantilla.canal)] = (
+                PlantillaCompilada.desde(plantilla), vence
+            )
+            activas += 1
+
+        with self._lock:
+            self._plantillas.update(plantillas)
+        logger.info(f"{activas} plantillas de notificación precargadas")
+        return activas
+
+
+# Instancia global de la caché
+plantillas_cache = CachePlantillas()
@@ -1,12 +1,17 @@
 """
 Backend personalizado para Resend
 https://resend.com/docs/send-with-python
+
+Usa el cliente HTTP compartido de la integración (pool keep-alive, ver
+core.http) y envía de a lotes con el endpoint /emails/batch.
 """
 import logging
 import requests
 from django.conf import settings
 from django.core.mail.backends.base import BaseEmailBackend
 
+from core.http import cliente
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,90 +19,120 @@ class ResendEmailBackend(BaseEmailBackend):
     """
     Backend de email usando Resend API
     """
-    
+
+    # Límite de emails por request de /emails/batch
+    MAXIMO_LOTE = 100
+
     def __init__(self, fail_silently=False, **kwargs):
         super().__init__(fail_silently=fail_silently, **kwargs)
         self.api_key = getattr(settings, 'RESEND_API_KEY', '')
         self.api_url = 'https://api.resend.com/emails'
-    
+        self.batch_url = 'https://api.resend.com/emails/batch'
+        self.session = None
+
+    def open(self):
+        """Toma el cliente HTTP compartido; devuelve True si lo tomó ahora"""
+        if self.session is not None:
+            return False
+        self.session = cliente('resend')
+        self.headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+        }
+        return True
+
+    def close(self):
+        # El pool de conexiones es del proceso: no se cierra
+        self.session = None
+
     def send_messages(self, email_messages):
         """
         Enviar mensajes de email usando Resend API
         """
+        if not email_messages:
+            return 0
+
+        errores = self.enviar_lote(email_messages)
+        if not self.fail_silently:
+            for error in errores:
+                if error:
+                    raise Exception(error)
+
+        return errores.count('')
+
+    def enviar_lote(self, email_messages):
+        """
+        Envía los mensajes de a lotes de MAXIMO_LOTE por la misma sesión HTTP.
+
+        Returns:
+            list: un error por mensaje, '' si se envió. Resend acepta o
+            rechaza cada lote completo.
+        """
         if not self.api_key:
             logger.error("❌ RESEND_API_KEY no configurada")
-            if not self.fail_silently:
-                raise ValueError("RESEND_API_KEY no configurada")
-            return 0
-        
-        num_sent = 0
-        for message in email_messages:
-            try:
-                sent = self._send(message)
-                if sent:
-                    num_sent += 1
-            except Exception as e:
-                logger.error(f"❌ Error enviando email via Resend: {e}")
-                if not self.fail_silently:
-                    raise
-        
-        return num_sent
-    
-    def _send(self, message):
+            return ['RESEND_API_KEY no configurada'] * len(email_messages)
+
+        sesion_nueva = self.open()
+        try:
+            errores = []
+            for inicio in range(0, len(email_messages), self.MAXIMO_LOTE):
+                lote = email_messages[inicio:inicio + self.MAXIMO_LOTE]
+                error = self._enviar(lote)
+                errores.extend([error] * len(lote))
+            return errores
+        finally:
+            if sesion_nueva:
+                self.close()
+
+    def _enviar(self, lote):
+        """Envía un lote (un mensaje solo va por /emails); devuelve '' o el error"""
+        payloads = [self._payload(message) for message in lote]
+        if len(lote) == 1:
+            url, cuerpo = self.api_url, payloads[0]
+        else:
+            url, cuerpo = self.batch_url, payloads
+
+        try:
+            logger.info(f"📧 Enviando {len(lote)} email(s) via Resend")
+            response = self.session.post(
+                url, json=cuerpo, headers=self.headers, timeout=10
+            )
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ Error de conexión con Resend: {e}")
+            return f"Error de conexión con Resend: {e}"
+
+        if response.status_code == 200:
+            logger.info(f"✅ {len(lote)} email(s) enviados exitosamente via Resend")
+            return ''
+
+        logger.error(f"❌ Error Resend ({response.status_code}): {response.text}")
+        return f"Resend API error: {response.text}"
+
+    def _payload(self, message):
         """
-        Enviar un mensaje individual
+        Payload de Resend para un mensaje
         """
-        # Preparar payload para Resend
         payload = {
             'from': message.from_email or settings.DEFAULT_FROM_EMAIL,
             'to': message.to,
             'subject': message.subject,
         }
-        
+
         # Agregar CC y BCC si existen
         if message.cc:
             payload['cc'] = message.cc
         if message.bcc:
             payload['bcc'] = message.bcc
-        
+
         # Agregar cuerpo del mensaje
         if message.content_subtype == 'html':
             payload['html'] = message.body
         else:
             payload['text'] = message.body
-        
+
         # Si hay alternativas (texto plano + HTML)
-        for alt_content, alt_type in message.alternatives:
+        for alt_content, alt_type in getattr(message, 'alternatives', []):
             if alt_type == 'text/html':
                 payload['html'] = alt_content
-        
-        # Headers
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json',
-        }
-        
-        # Enviar request
-        try:
-            logger.info(f"📧 Enviando email a {message.to} via Resend")
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"✅ Email enviado exitosamente via Resend a {message.to}")
-                return True
-            else:
-                logger.error(f"❌ Error Resend ({response.status_code}): {response.text}")
-                if not self.fail_silently:
-                    raise Exception(f"Resend API error: {response.text}")
-                return False
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Error de conexión con Resend: {e}")
-            if not self.fail_silently:
-                raise
-            return False
+
+        return payload
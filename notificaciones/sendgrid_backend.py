@@ -1,12 +1,19 @@
 """
 Backend personalizado de email usando SendGrid API
+
+Usa el cliente HTTP compartido de la integración (pool keep-alive, ver
+core.http). Los mensajes con el mismo remitente y cuerpo se agrupan en un solo
+request a /v3/mail/send, con una "personalization" (destinatario y asunto)
+por mensaje.
 """
 
 import logging
+import requests
 from django.conf import settings
 from django.core.mail.backends.base import BaseEmailBackend
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
+from sendgrid.helpers.mail import Mail, Email, To, Content, Personalization
+
+from core.http import cliente
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +22,12 @@ class SendGridAPIBackend(BaseEmailBackend):
     """
     Backend de email que usa la API de SendGrid en lugar de SMTP
     """
-    
+
+    api_url = 'https://api.sendgrid.com/v3/mail/send'
+
+    # Límite de personalizations por request de SendGrid
+    MAXIMO_LOTE = 1000
+
     def __init__(self, fail_silently=False, **kwargs):
         super().__init__(fail_silently=fail_silently, **kwargs)
         self.api_key = getattr(settings, 'SENDGRID_API_KEY', None)
@@ -23,62 +35,101 @@ class SendGridAPIBackend(BaseEmailBackend):
             logger.error("SENDGRID_API_KEY no configurada")
             if not fail_silently:
                 raise ValueError("SENDGRID_API_KEY no configurada")
-        
-        self.client = SendGridAPIClient(self.api_key)
+
+        self.session = None
         logger.info("✅ SendGrid API Backend inicializado")
-    
+
+    def open(self):
+        """Toma el cliente HTTP compartido; devuelve True si lo tomó ahora"""
+        if self.session is not None:
+            return False
+        self.session = cliente('sendgrid')
+        self.headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+        }
+        return True
+
+    def close(self):
+        # El pool de conexiones es del proceso: no se cierra
+        self.session = None
+
     def send_messages(self, email_messages):
         """
         Envía una lista de mensajes de email usando SendGrid API
         """
         if not email_messages:
             return 0
-        
-        num_sent = 0
-        for message in email_messages:
-            try:
-                sent = self._send(message)
-                if sent:
-                    num_sent += 1
-            except Exception as e:
-                logger.error(f"❌ Error enviando email: {str(e)}")
-                if not self.fail_silently:
-                    raise
-        
-        return num_sent
-    
-    def _send(self, message):
+
+        errores = self.enviar_lote(email_messages)
+        if not self.fail_silently:
+            for error in errores:
+                if error:
+                    raise Exception(error)
+
+        return errores.count('')
+
+    def enviar_lote(self, email_messages):
         """
-        Envía un mensaje individual usando SendGrid API
+        Envía los mensajes agrupando los de igual remitente y cuerpo en un
+        mismo request, por la misma sesión HTTP.
+
+        Returns:
+            list: un error por mensaje, '' si se envió.
         """
+        grupos = {}
+        for indice, message in enumerate(email_messages):
+            clave = (message.from_email, message.content_subtype, message.body)
+            grupos.setdefault(clave, []).append(indice)
+
+        errores = [''] * len(email_messages)
+        sesion_nueva = self.open()
         try:
-            # Preparar email
-            from_email = Email(message.from_email)
-            to_email = To(message.to[0])  # SendGrid API envía a un destinatario a la vez
-            subject = message.subject
-            content = Content("text/plain", message.body)
-            
-            mail = Mail(from_email, to_email, subject, content)
-            
-            logger.info(f"📤 Enviando email vía SendGrid API...")
-            logger.info(f"   📮 Desde: {from_email.email}")
-            logger.info(f"   📬 Para: {to_email.email}")
-            logger.info(f"   📋 Asunto: {subject}")
-            
-            # Enviar usando API
-            response = self.client.send(mail)
-            
-            logger.info(f"✅ Email enviado exitosamente vía SendGrid API")
-            logger.info(f"   📊 Status Code: {response.status_code}")
+            for indices in grupos.values():
+                for inicio in range(0, len(indices), self.MAXIMO_LOTE):
+                    lote = indices[inicio:inicio + self.MAXIMO_LOTE]
+                    error = self._enviar([email_messages[i] for i in lote])
+                    for i in lote:
+                        errores[i] = error
+            return errores
+        finally:
+            if sesion_nueva:
+                self.close()
+
+    def _enviar(self, lote):
+        """
+        Envía mensajes que comparten remitente y cuerpo; devuelve '' o el error
+        """
+        primero = lote[0]
+        tipo = 'text/html' if primero.content_subtype == 'html' else 'text/plain'
+
+        mail = Mail(from_email=Email(primero.from_email))
+        mail.add_content(Content(tipo, primero.body))
+        for message in lote:
+            personalization = Personalization()
+            for destinatario in message.to:
+                personalization.add_to(To(destinatario))
+            personalization.subject = message.subject
+            mail.add_personalization(personalization)
+
+        logger.info(f"📤 Enviando {len(lote)} email(s) vía SendGrid API...")
+        try:
+            response = self.session.post(
+                self.api_url, json=mail.get(), headers=self.headers, timeout=10
+            )
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ Error de conexión con SendGrid API: {str(e)}")
+            return f"Error de conexión con SendGrid API: {str(e)}"
+
+        if response.status_code in (200, 202):
+            logger.info(
+                f"✅ {len(lote)} email(s) enviados exitosamente vía SendGrid API"
+            )
             logger.info(f"   📝 Message ID: {response.headers.get('X-Message-Id', 'N/A')}")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Error enviando email vía SendGrid API: {str(e)}")
-            logger.error(f"   Tipo: {type(e).__name__}")
-            
-            if hasattr(e, 'body'):
-                logger.error(f"   Body: {e.body}")
-            
-            raise
+            return ''
+
+        logger.error(
+            f"❌ Error enviando email vía SendGrid API ({response.status_code}): "
+            f"{response.text}"
+        )
+        return f"SendGrid API error ({response.status_code}): {response.text}"
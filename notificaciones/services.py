@@ -12,6 +12,7 @@ from .models import (
     Notificacion, PlantillaNotificacion, TipoNotificacion, 
     CanalNotificacion, EstadoNotificacion
 )
+from .plantillas import plantillas_cache
 
 logger = logging.getLogger(__name__)
 
@@ -57,20 +58,14 @@ class NotificacionService:
         contexto = contexto or {}
         metadatos = metadatos or {}
         
-        try:
-            # Obtener plantilla
-            plantilla = PlantillaNotificacion.objects.get(
-                tipo=tipo,
-                canal=canal,
-                activa=True
-            )
-        except PlantillaNotificacion.DoesNotExist:
+        # Obtener plantilla compilada (caché en proceso, ver notificaciones.plantillas)
+        plantilla = plantillas_cache.obtener(tipo, canal)
+        if plantilla is None:
             logger.error(f"No se encontró plantilla para {tipo} - {canal}")
             raise ValueError(f"No existe plantilla para {tipo} en canal {canal}")
         
         # Renderizar mensaje y asunto
-        asunto_renderizado = self._renderizar_template(plantilla.asunto, contexto)
-        mensaje_renderizado = self._renderizar_template(plantilla.mensaje, contexto)
+        asunto_renderizado, mensaje_renderizado = plantilla.renderizar(contexto)
         
         # Crear notificación
         notificacion = Notificacion.objects.create(
@@ -88,22 +83,6 @@ class NotificacionService:
         logger.info(f"Notificación creada: {notificacion.id}")
         return notificacion
     
-    def _renderizar_template(self, template_string: str, contexto: Dict[str, Any]) -> str:
-        """Renderiza una plantilla con el contexto dado usando format()"""
-        try:
-            # Usar format() de Python para reemplazar {variable}
-            return template_string.format(**contexto)
-        except KeyError as e:
-            logger.warning(f"Variable faltante en template: {str(e)}")
-            # Intentar con las variables disponibles
-            try:
-                return template_string.format_map(contexto)
-            except Exception:
-                return template_string
-        except Exception as e:
-            logger.error(f"Error renderizando template: {str(e)}")
-            return template_string
-    
     def enviar_notificacion(self, notificacion: Notificacion) -> bool:
         """
         Envía una notificación según su canal
@@ -271,10 +250,12 @@ class NotificacionService:
         usuario,
         tipo_notificacion: str,
         pedido_id: int,
-        contexto_adicional: Dict[str, Any] = None
+        contexto_adicional: Dict[str, Any] = None,
+        enviar: bool = True
     ):
         """
-        Envía notificaciones relacionadas con pedidos
+        Envía notificaciones relacionadas con pedidos. Con enviar=False sólo
+        las crea (quedan pendientes para el outbox o el despacho por lotes)
         """
         contexto = {
             'nombre': usuario.first_name or usuario.username,
@@ -320,6 +301,9 @@ class NotificacionService:
             except Exception as e:
                 logger.error(f"Error creando notificación WhatsApp: {str(e)}")
         
+        if not enviar:
+            return notificaciones_creadas
+        
         # Enviar todas las notificaciones
         for notificacion in notificaciones_creadas:
             try:
@@ -2,10 +2,16 @@
 Señales para integrar notificaciones automáticamente
 """
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import ConfiguracionNotificacion
+from pedidos.signals import estado_changed
+from .models import (
+    CanalNotificacion, ConfiguracionNotificacion, PlantillaNotificacion,
+    TipoNotificacion,
+)
+from .plantillas import invalidar_plantillas, plantillas_cache
 from .tasks import notificar_registro_usuario
 
 
@@ -31,14 +37,28 @@ def crear_configuracion_notificacion(sender, instance, created, **kwargs):
         notificar_registro_usuario.delay(instance.id)
 
 
+@receiver(post_save, sender=PlantillaNotificacion)
+@receiver(post_delete, sender=PlantillaNotificacion)
+def invalidar_cache_plantillas(sender, instance, raw=False, **kwargs):
+    """
+    Una plantilla editada deja obsoletas las compiladas en memoria
+    """
+    if raw:
+        return
+    
+    # La caché de este proceso se limpia ya; la generación compartida, al confirmar
+    plantillas_cache.limpiar()
+    transaction.on_commit(invalidar_plantillas)
+
+
 # Señal para notificaciones de pedidos
 @receiver(post_save, sender='pedidos.Pedido')
 def notificar_cambio_estado_pedido(sender, instance, created, **kwargs):
     """
-    Notifica cambios en el estado de los pedidos
+    Notifica los pedidos creados ya confirmados (los cambios de estado los
+    notifica notificar_estado_pedido)
     """
     from .tasks import notificar_pedido_confirmado
-    from .models import TipoNotificacion
     import logging
     
     logger = logging.getLogger(__name__)
@@ -52,63 +72,74 @@ def notificar_cambio_estado_pedido(sender, instance, created, **kwargs):
             notificar_pedido_confirmado.delay(instance.id, usuario.id)
         else:
             logger.info(f"Pedido {instance.id} es de usuario invitado, no se envían notificaciones automáticas")
+
+
+TIPOS_POR_ESTADO = {
+    'en_camino': TipoNotificacion.PEDIDO_ENVIADO,
+    'entregado': TipoNotificacion.PEDIDO_ENTREGADO,
+    'cancelado': TipoNotificacion.PEDIDO_CANCELADO,
+}
+
+
+@receiver(estado_changed, sender='pedidos.Pedido')
+def notificar_estado_pedido(sender, pedido, anterior, nuevo, en_lote=False, **kwargs):
+    """
+    Notifica los cambios de estado de los pedidos de clientes registrados.
+    Los emails salen por el outbox, fuera del request (también en los
+    cambios masivos del admin).
+    """
+    import logging
+    
+    logger = logging.getLogger(__name__)
+    
+    tipo_notificacion = TIPOS_POR_ESTADO.get(nuevo)
+    usuario = pedido.cliente
+    if not tipo_notificacion or not usuario:
+        return
+    
+    try:
+        from .services import notificacion_service
+        from .outbox import encolar_notificacion
+        
+        # Formatear tipo de envío para mostrar
+        tipo_envio_display = 'No especificado'
+        if pedido.tipo_envio == 'retiro':
+            tipo_envio_display = '🏪 Retiro en tienda'
+        elif pedido.tipo_envio == 'express':
+            tipo_envio_display = '⚡ Envío Express (2-4 horas)'
+        elif pedido.tipo_envio == 'programado':
+            franja = pedido.get_franja_horaria_display()
+            tipo_envio_display = f'📅 Envío Programado ({franja})'
+        
+        contexto = {
+            'pedido_id': pedido.id,
+            'estado': pedido.get_estado_display(),
+            'fecha': pedido.actualizado.strftime('%d/%m/%Y %H:%M'),
+            'total': pedido.total,
+            'tipo_envio': tipo_envio_display
+        }
+        
+        with transaction.atomic():
+            notificaciones = notificacion_service.enviar_notificacion_pedido(
+                usuario=usuario,
+                tipo_notificacion=tipo_notificacion,
+                pedido_id=pedido.id,
+                contexto_adicional=contexto,
+                enviar=False
+            ) or []
+            # Los emails van al outbox; los WhatsApp (Twilio) los envía el
+            # despacho por lotes
+            for notificacion in notificaciones:
+                if notificacion.canal == CanalNotificacion.EMAIL:
+                    encolar_notificacion(notificacion)
+        
+        logger.info(
+            f"Pedido {pedido.id}: {anterior} → {nuevo}, "
+            f"{len(notificaciones)} notificaciones encoladas"
+        )
     
-    elif not created and usuario:
-        # Pedido actualizado - verificar cambio de estado
-        try:
-            # Obtener el estado anterior desde la base de datos
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT estado FROM pedidos_pedido WHERE id = %s",
-                    [instance.id]
-                )
-                result = cursor.fetchone()
-                if result:
-                    estado_anterior = result[0]
-                    
-                    if estado_anterior != instance.estado:
-                        # El estado cambió, enviar notificación correspondiente
-                        tipo_notificacion = None
-                        
-                        if instance.estado == 'en_camino':
-                            tipo_notificacion = TipoNotificacion.PEDIDO_ENVIADO
-                        elif instance.estado == 'entregado':
-                            tipo_notificacion = TipoNotificacion.PEDIDO_ENTREGADO
-                        elif instance.estado == 'cancelado':
-                            tipo_notificacion = TipoNotificacion.PEDIDO_CANCELADO
-                        
-                        if tipo_notificacion:
-                            from .services import notificacion_service
-                            
-                            # Formatear tipo de envío para mostrar
-                            tipo_envio_display = 'No especificado'
-                            if instance.tipo_envio == 'retiro':
-                                tipo_envio_display = '🏪 Retiro en tienda'
-                            elif instance.tipo_envio == 'express':
-                                tipo_envio_display = '⚡ Envío Express (2-4 horas)'
-                            elif instance.tipo_envio == 'programado':
-                                tipo_envio_display = f'📅 Envío Programado ({instance.get_franja_horaria_display()})'
-                            
-                            contexto = {
-                                'pedido_id': instance.id,
-                                'estado': instance.get_estado_display(),
-                                'fecha': instance.actualizado.strftime('%d/%m/%Y %H:%M'),
-                                'total': instance.total,
-                                'tipo_envio': tipo_envio_display
-                            }
-                            
-                            notificacion_service.enviar_notificacion_pedido(
-                                usuario=usuario,
-                                tipo_notificacion=tipo_notificacion,
-                                pedido_id=instance.id,
-                                contexto_adicional=contexto
-                            )
-                            
-                            logger.info(f"Notificación enviada para pedido {instance.id}: {tipo_notificacion}")
-                        
-        except Exception as e:
-            logger.error(f"Error notificando cambio de estado pedido {instance.id}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error notificando cambio de estado pedido {pedido.id}: {str(e)}")
 
 
 # Señal para notificaciones de stock bajo
@@ -46,23 +46,33 @@ def enviar_notificacion_async(self, notificacion_id):
 @shared_task
 def procesar_notificaciones_pendientes():
     """
-    Tarea periódica para procesar notificaciones pendientes
+    Tarea periódica para procesar notificaciones pendientes, de a lotes
+    (ver notificaciones.despacho)
     """
-    from .models import Notificacion, EstadoNotificacion
+    from .despacho import despachar_pendientes
     
-    notificaciones_pendientes = Notificacion.objects.filter(
-        estado__in=[EstadoNotificacion.PENDIENTE, EstadoNotificacion.FALLIDA]
-    ).filter(
-        intentos__lt=3
-    )[:50]  # Procesar máximo 50 por vez
-    
-    count = 0
-    for notificacion in notificaciones_pendientes:
-        enviar_notificacion_async.delay(notificacion.id)
-        count += 1
-    
-    logger.info(f"Programadas {count} notificaciones para envío")
-    return count
+    # Procesar máximo 500 por vez
+    return despachar_pendientes(maximo=500)
+
+
+@shared_task
+def despachar_outbox():
+    """
+    Despacha los mensajes listos del outbox transaccional (ver
+    notificaciones.outbox). Se dispara al hacer commit y periódicamente
+    desde Celery Beat para los reintentos.
+    """
+    from .outbox import despachar
+
+    total = 0
+    while True:
+        procesados = despachar()
+        total += procesados
+        if not procesados:
+            break
+    if total:
+        logger.info(f"Outbox: {total} mensajes procesados")
+    return total
 
 
 @shared_task
@@ -0,0 +1,161 @@
+from unittest import mock
+
+import requests
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+
+from .despacho import despachar_pendientes
+from .models import EstadoNotificacion, Notificacion, PlantillaNotificacion
+from .plantillas import compilar, plantillas_cache, renderizar
+from .resend_backend import ResendEmailBackend
+from .services import notificacion_service
+
+
+class BackendPorLotes(BaseEmailBackend):
+    """Backend de prueba con envío masivo: rechaza las direcciones @rebota"""
+    lotes = []
+
+    def enviar_lote(self, email_messages):
+        BackendPorLotes.lotes.append(len(email_messages))
+        return [
+            'rebotado' if m.to[0].endswith('@rebota.com') else ''
+            for m in email_messages
+        ]
+
+
+class DespachoPorLotesTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('ana', 'ana@example.com', 'x')
+        BackendPorLotes.lotes = []
+
+    def crear(self, destinatario, **kwargs):
+        return Notificacion.objects.create(
+            usuario=self.usuario, tipo='promocion', canal='email',
+            destinatario=destinatario, asunto='Promo', mensaje='Hola', **kwargs
+        )
+
+    def test_envia_por_una_sola_conexion(self):
+        for i in range(5):
+            self.crear(f'cliente{i}@example.com')
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as abrir:
+            resultado = despachar_pendientes(lote=10)
+
+        self.assertEqual(abrir.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual((resultado['enviadas'], resultado['fallidas']), (5, 0))
+        self.assertIn('mensajes_por_segundo', resultado)
+        self.assertFalse(
+            Notificacion.objects.exclude(estado=EstadoNotificacion.ENVIADA).exists()
+        )
+        self.assertEqual(
+            set(Notificacion.objects.values_list('intentos', flat=True)), {1}
+        )
+
+    @override_settings(EMAIL_BACKEND='notificaciones.tests.BackendPorLotes')
+    def test_usa_envio_masivo_y_registra_fallidas(self):
+        for i in range(3):
+            self.crear(f'cliente{i}@example.com')
+        fallida = self.crear('x@rebota.com')
+
+        resultado = despachar_pendientes(lote=2)
+
+        # Dos lotes; la fallida no se reintenta en la misma pasada
+        self.assertEqual(BackendPorLotes.lotes, [2, 2])
+        self.assertEqual((resultado['enviadas'], resultado['fallidas']), (3, 1))
+        fallida.refresh_from_db()
+        self.assertEqual(
+            (fallida.estado, fallida.error_mensaje),
+            (EstadoNotificacion.FALLIDA, 'rebotado'),
+        )
+
+        despachar_pendientes()
+        fallida.refresh_from_db()
+        self.assertEqual(fallida.intentos, 2)
+
+    def test_ignora_las_del_outbox_y_las_agotadas(self):
+        self.crear('outbox@example.com', metadatos={'outbox': True})
+        self.crear('agotada@example.com', estado=EstadoNotificacion.FALLIDA, intentos=3)
+
+        self.assertEqual(despachar_pendientes()['enviadas'], 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@override_settings(RESEND_API_KEY='re_test')
+class ResendLotesTests(TestCase):
+
+    def test_envia_de_a_100_por_la_misma_sesion(self):
+        mensajes = [
+            EmailMessage('Hola', 'Texto', 'tienda@example.com', [f'c{i}@example.com'])
+            for i in range(150)
+        ]
+        respuesta = mock.Mock(status_code=200)
+
+        with mock.patch.object(
+            requests.Session, 'request', return_value=respuesta
+        ) as request:
+            enviados = ResendEmailBackend().send_messages(mensajes)
+
+        self.assertEqual(enviados, 150)
+        self.assertEqual(request.call_count, 2)
+        metodo, url = request.call_args_list[0].args
+        self.assertEqual(metodo, 'POST')
+        self.assertTrue(url.endswith('/emails/batch'))
+        self.assertEqual(len(request.call_args_list[0].kwargs['json']), 100)
+        self.assertEqual(len(request.call_args_list[1].kwargs['json']), 50)
+
+
+class CachePlantillasTests(TestCase):
+
+    def setUp(self):
+        plantillas_cache.limpiar()
+        self.usuario = User.objects.create_user('ana', 'ana@example.com', 'x')
+        self.plantilla = PlantillaNotificacion.objects.create(
+            tipo='pedido_enviado', canal='email',
+            asunto='Pedido #{pedido_id} en camino',
+            mensaje='Hola {nombre}, total ${total:>8} {{ok}}',
+        )
+
+    def crear(self):
+        return notificacion_service.crear_notificacion(
+            usuario=self.usuario, tipo='pedido_enviado', canal='email',
+            destinatario='ana@example.com',
+            contexto={'pedido_id': 7, 'nombre': 'Ana', 'total': '1500'},
+        )
+
+    def test_renderiza_igual_que_format(self):
+        texto = self.plantilla.mensaje
+        contexto = {'nombre': 'Ana', 'total': '1500'}
+
+        self.assertEqual(
+            renderizar(texto, compilar(texto), contexto), texto.format(**contexto)
+        )
+        # Si falta una variable se devuelve el texto sin renderizar, como antes
+        self.assertEqual(renderizar(texto, compilar(texto), {'nombre': 'Ana'}), texto)
+
+    def test_precargada_no_consulta_la_plantilla(self):
+        plantillas_cache.precargar()
+
+        # Sólo el INSERT de la notificación
+        with self.assertNumQueries(1):
+            notificacion = self.crear()
+        self.assertEqual(notificacion.asunto, 'Pedido #7 en camino')
+
+        # Sin plantilla tampoco se consulta
+        with self.assertNumQueries(0), self.assertRaises(ValueError):
+            notificacion_service.crear_notificacion(
+                usuario=self.usuario, tipo='promocion', canal='sms', destinatario='1',
+                contexto={},
+            )
+
+    def test_guardar_invalida(self):
+        self.crear()
+        self.plantilla.asunto = 'Pedido #{pedido_id} despachado'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plantilla.save()
+
+        self.assertEqual(self.crear().asunto, 'Pedido #7 despachado')
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Pedido, PedidoItem, CarritoAbandonado
+from .models import (
+    Pedido, PedidoItem, CarritoAbandonado, CotizacionDolar, PaymentEvent, PedidoStats,
+    StockHold,
+)
 from .notificaciones import enviar_whatsapp_actualizacion_estado
 
 # Importar modelos de shipping solo si existen (para evitar errores antes de migrar)
@@ -17,6 +20,16 @@ class PedidoItemInline(admin.TabularInline):
     readonly_fields = ('producto', 'cantidad')
 
 
+class StockHoldInline(admin.TabularInline):
+    model = StockHold
+    extra = 0
+    can_delete = False
+    readonly_fields = ('producto', 'cantidad', 'estado', 'expira', 'creado')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 
 
 @admin.register(Pedido)
@@ -26,10 +39,24 @@ class PedidoAdmin(admin.ModelAdmin):
     list_editable = ('estado',)
     search_fields = ('id', 'nombre_destinatario', 'cliente__username', 'cliente__email')
     date_hierarchy = 'creado'
-    inlines = [PedidoItemInline]
-    readonly_fields = ('creado', 'actualizado', 'cliente', 'dedicatoria', 'firmado_como', 'nombre_destinatario', 'direccion', 'telefono_destinatario', 'fecha_entrega', 'hora_retiro', 'franja_horaria', 'tipo_envio', 'instrucciones', 'regalo_anonimo', 'medio_pago')
+    inlines = [PedidoItemInline, StockHoldInline]
+    readonly_fields = (
+        'creado', 'actualizado', 'cliente', 'dedicatoria', 'firmado_como',
+        'nombre_destinatario', 'direccion', 'telefono_destinatario', 'fecha_entrega',
+        'hora_retiro', 'franja_horaria', 'tipo_envio', 'instrucciones',
+        'regalo_anonimo', 'medio_pago', 'stock_descontado', 'cotizacion_usd',
+    )
     exclude = ('metodo_envio',)  # Ocultar el campo legacy
 
+    def get_search_results(self, request, queryset, search_term):
+        # Número de pedido/teléfono exactos o texto indexado (ver pedidos.busqueda)
+        from .busqueda import buscar_pedidos
+        if search_term.strip().isdigit():
+            por_id = queryset.filter(pk=int(search_term))
+            if por_id.exists():
+                return por_id, False
+        return buscar_pedidos(search_term, queryset), False
+
     def save_model(self, request, obj, form, change):
         # Guardar el estado original antes de guardar los cambios
         if obj.pk:
@@ -197,3 +224,62 @@ class CarritoAbandonadoAdmin(admin.ModelAdmin):
     estado_display.short_description = 'Estado'
 
 
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'provider', 'payment_id', 'status', 'pedido', 'estado', 'intentos',
+        'recibido', 'procesado',
+    )
+    list_filter = ('provider', 'estado', 'status', 'recibido')
+    search_fields = ('payment_id', 'pedido__id', 'error')
+    raw_id_fields = ('pedido',)
+    readonly_fields = ('recibido', 'procesado', 'bloqueado_hasta')
+    date_hierarchy = 'recibido'
+
+    actions = ['reprocesar']
+
+    def reprocesar(self, request, queryset):
+        """Vuelve a poner en cola los eventos fallidos o ignorados"""
+        from .pagos import reintentar
+        count = reintentar(queryset.filter(estado__in=['fallido', 'ignorado']))
+        self.message_user(request, f'{count} eventos reencolados.')
+
+    reprocesar.short_description = "Reprocesar los eventos seleccionados"
+
+
+@admin.register(CotizacionDolar)
+class CotizacionDolarAdmin(admin.ModelAdmin):
+    list_display = ('obtenida', 'valor', 'fuente')
+    list_filter = ('fuente',)
+    date_hierarchy = 'obtenida'
+
+    # Historial de auditoría: no se edita
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PedidoStats)
+class PedidoStatsAdmin(admin.ModelAdmin):
+    list_display = ('dimension', 'valor', 'fragmento', 'cantidad', 'actualizado')
+    list_filter = ('dimension',)
+    actions = ['recalcular']
+
+    # Se mantienen solos (ver pedidos.estadisticas)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def recalcular(self, request, queryset):
+        """Reconstruye todos los contadores desde la tabla de pedidos"""
+        from .estadisticas import recalcular
+        conteo = recalcular()
+        self.message_user(
+            request, f"Contadores recalculados ({conteo['total']} pedidos)."
+        )
+
+    recalcular.short_description = "Recalcular todos los contadores"
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PedidosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pedidos'
+
+    def ready(self):
+        import pedidos.estadisticas  # noqa: F401 (post_delete de los contadores)
@@ -0,0 +1,119 @@
+"""
+Búsqueda de pedidos para el admin.
+
+Cada pedido guarda en `busqueda` un texto normalizado (minúsculas, sin
+acentos) con el número de pedido, nombres, emails (también los del usuario
+cliente) y los teléfonos en dígitos, y en `telefono_*_normalizado` los
+teléfonos en formato internacional (ver pedidos.utils.normalizar_telefono_whatsapp).
+Pedido.save() los mantiene al día cuando cambia alguno de esos campos (un
+cambio de email en el usuario no se refleja hasta que se vuelva a guardar el
+pedido).
+
+`buscar_pedidos` prueba primero los caminos exactos, que usan índices
+b-tree:
+
+1. Número de pedido exacto (índice único).
+2. Teléfono exacto, normalizado igual que al guardarlo.
+
+Si no hay coincidencias exactas busca cada palabra como subcadena de
+`busqueda`. En PostgreSQL esa columna tiene un índice GIN de trigramas
+(pg_trgm), así que el LIKE '%...%' no recorre toda la tabla ni hace el join
+con auth_user.
+"""
+import re
+import unicodedata
+
+from django.db.models import Q
+
+from .utils import normalizar_telefono_whatsapp
+
+# Campos del pedido que alimentan la búsqueda
+CAMPOS_TEXTO = (
+    'numero_pedido', 'nombre_comprador', 'nombre_destinatario', 'email_comprador',
+)
+CAMPOS_TELEFONO = ('telefono_destinatario', 'telefono_comprador')
+CAMPOS_FUENTE = CAMPOS_TEXTO + CAMPOS_TELEFONO + ('cliente_id',)
+# Campos que se calculan a partir de los anteriores
+CAMPOS_DERIVADOS = (
+    'busqueda', 'telefono_destinatario_normalizado', 'telefono_comprador_normalizado',
+)
+
+PARECE_TELEFONO = re.compile(r'[\d\s()+.-]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con los espacios colapsados."""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def solo_digitos(texto):
+    return ''.join(filter(str.isdigit, str(texto or '')))
+
+
+def telefono_normalizado(telefono):
+    """Teléfono en formato internacional, sólo dígitos ('' si no es un teléfono)."""
+    if len(solo_digitos(telefono)) < 6:
+        return ''
+    return (normalizar_telefono_whatsapp(telefono) or '').lstrip('+')
+
+
+def actualizar_busqueda(pedido):
+    """Recalcula los CAMPOS_DERIVADOS del pedido (no lo guarda)."""
+    pedido.telefono_destinatario_normalizado = telefono_normalizado(
+        pedido.telefono_destinatario
+    )
+    pedido.telefono_comprador_normalizado = telefono_normalizado(
+        pedido.telefono_comprador
+    )
+
+    partes = [getattr(pedido, campo) or '' for campo in CAMPOS_TEXTO]
+    if pedido.cliente_id:
+        partes += [pedido.cliente.username, pedido.cliente.email]
+    for campo in CAMPOS_TELEFONO:
+        partes.append(solo_digitos(getattr(pedido, campo)))
+    partes += [
+        pedido.telefono_destinatario_normalizado,
+        pedido.telefono_comprador_normalizado,
+    ]
+
+    pedido.busqueda = normalizar(' '.join(parte for parte in partes if parte))
+
+
+def buscar_pedidos(termino, queryset=None):
+    """Filtra `queryset` (default: todos los pedidos) por el texto buscado."""
+    from .models import Pedido
+
+    queryset = Pedido.objects.all() if queryset is None else queryset
+    termino = (termino or '').strip()
+    if not termino:
+        return queryset
+
+    # Camino rápido 1: número de pedido exacto
+    por_numero = queryset.filter(numero_pedido=termino.upper())
+    if por_numero.exists():
+        return por_numero
+
+    # Camino rápido 2: teléfono exacto
+    es_telefono = PARECE_TELEFONO.fullmatch(termino) is not None
+    if es_telefono and len(solo_digitos(termino)) >= 8:
+        telefono = telefono_normalizado(termino)
+        if telefono:
+            por_telefono = queryset.filter(
+                Q(telefono_destinatario_normalizado=telefono)
+                | Q(telefono_comprador_normalizado=telefono)
+            )
+            if por_telefono.exists():
+                return por_telefono
+
+    # Subcadena sobre la columna desnormalizada; un teléfono con espacios o
+    # guiones se busca como sus dígitos
+    if es_telefono and solo_digitos(termino):
+        palabras = [solo_digitos(termino)]
+    else:
+        palabras = normalizar(termino).split()
+    filtro = Q()
+    for palabra in palabras:
+        filtro &= Q(busqueda__contains=palabra)
+    return queryset.filter(filtro)
@@ -1,16 +1,43 @@
 """
 Servicio para conversión de moneda ARS → USD
 Obtiene cotización oficial del dólar y aplica margen del 15%
+
+La cotización nunca se consulta a la red dentro de un request (salvo la
+primera vez, cuando todavía no hay ninguna guardada):
+
+- Cada cotización obtenida se guarda en CotizacionDolar (historial
+  auditable) y en la caché.
+- get_usd_rate sirve la última conocida (caché, o la base si la caché está
+  vacía) aunque esté vencida, y si tiene más de REFRESH_AHEAD segundos
+  dispara una actualización en segundo plano (stale-while-revalidate).
+- Celery Beat la actualiza cada media hora, antes de que venza.
+- Cada proveedor tiene su circuit breaker (core.http): uno que viene
+  fallando se saltea sin esperar el timeout.
 """
-import requests
 import logging
+import threading
 from decimal import Decimal
 from django.core.cache import cache
 from django.conf import settings
+from django.db import connection
+from django.utils import timezone
 import os
 
+from core.http import cliente
+
+from .models import CotizacionDolar
+
 logger = logging.getLogger(__name__)
 
+# Los proveedores de cotización no se reintentan: si uno falla se pasa al
+# siguiente, y tras 3 fallos seguidos se lo saltea por 10 minutos
+CONFIG_PROVEEDOR = {
+    'timeout': 5, 'reintentos': 0, 'umbral_fallos': 3, 'enfriamiento': 600,
+}
+
+# Sólo si nunca se obtuvo una cotización
+EMERGENCY_RATE = Decimal('1050.00')
+
 
 class CurrencyService:
     """
@@ -21,9 +48,13 @@ class CurrencyService:
     BCRA_API_URL = "https://api.estadisticasbcra.com/usd_of"
     DOLAR_API_URL = "https://dolarapi.com/v1/dolares/oficial"
     
-    # Tiempo de caché en segundos (1 hora)
+    # Una cotización se considera vigente por una hora; pasados REFRESH_AHEAD
+    # segundos se actualiza en segundo plano sin dejar de servirla
     CACHE_TIMEOUT = 3600
-    CACHE_KEY = 'usd_exchange_rate'
+    REFRESH_AHEAD = 45 * 60
+    CACHE_KEY = 'cotizacion_usd'
+    LOCK_KEY = 'cotizacion_usd:actualizando'
+    LOCK_TIMEOUT = 60
     
     def __init__(self):
         # Obtener margen desde settings o usar 15% por defecto
@@ -40,38 +71,124 @@ class CurrencyService:
         Returns:
             Decimal: Cotización en ARS por USD (ej: 1050.00)
         """
-        # Intentar obtener del caché primero
-        if use_cache:
-            cached_rate = cache.get(self.CACHE_KEY)
-            if cached_rate:
-                logger.info(f"💰 Cotización desde caché: ${cached_rate} ARS/USD")
-                return Decimal(str(cached_rate))
+        cotizacion = self.get_cotizacion(use_cache=use_cache)
+        return cotizacion.valor if cotizacion else EMERGENCY_RATE
+    
+    def get_cotizacion(self, use_cache=True):
+        """
+        Última cotización conocida, sin esperar a la red salvo que no haya
+        ninguna guardada (o use_cache=False).
+        
+        Returns:
+            CotizacionDolar o None si nunca se pudo obtener una
+        """
+        if not use_cache:
+            return self.actualizar() or self._ultima_guardada()
         
-        # Si no hay caché, obtener de la API
-        rate = self._fetch_rate_from_apis()
+        cotizacion = self._desde_cache()
+        if cotizacion is None:
+            cotizacion = self._ultima_guardada()
+            if cotizacion is None:
+                # Primera vez: no hay nada que servir mientras se actualiza
+                cotizacion = self.actualizar()
+                if cotizacion is None:
+                    logger.warning(
+                        f"⚠️ Usando cotización de emergencia: ${EMERGENCY_RATE} ARS/USD"
+                    )
+                return cotizacion
+            self._guardar_en_cache(cotizacion)
         
-        if rate:
-            # Guardar en caché
-            cache.set(self.CACHE_KEY, float(rate), self.CACHE_TIMEOUT)
-            logger.info(f"💰 Cotización actualizada: ${rate} ARS/USD (guardada en caché)")
-            return rate
+        edad = (timezone.now() - cotizacion.obtenida).total_seconds()
+        if edad > self.REFRESH_AHEAD:
+            self._programar_actualizacion()
+        if edad > self.CACHE_TIMEOUT:
+            vencida = int(edad - self.CACHE_TIMEOUT)
+            logger.warning(
+                f"⚠️ Sirviendo cotización vencida hace {vencida}s: ${cotizacion.valor}"
+            )
+        return cotizacion
+    
+    def actualizar(self):
+        """
+        Consulta los proveedores y guarda la cotización obtenida.
         
-        # Si falla todo, usar cotización de emergencia
-        emergency_rate = Decimal('1050.00')
-        logger.warning(f"⚠️ Usando cotización de emergencia: ${emergency_rate} ARS/USD")
-        return emergency_rate
+        Returns:
+            CotizacionDolar o None si fallaron todos
+        """
+        resultado = self._fetch_rate_from_apis()
+        if resultado is None:
+            return None
+        
+        fuente, rate = resultado
+        cotizacion = CotizacionDolar.objects.create(
+            fuente=fuente, valor=rate.quantize(Decimal('0.0001'))
+        )
+        self._guardar_en_cache(cotizacion)
+        logger.info(f"💰 Cotización actualizada: ${cotizacion.valor} ARS/USD ({fuente})")
+        return cotizacion
+    
+    def _ultima_guardada(self):
+        return CotizacionDolar.objects.order_by('-obtenida').first()
+    
+    def _desde_cache(self):
+        datos = cache.get(self.CACHE_KEY)
+        if not isinstance(datos, dict):
+            return None
+        return CotizacionDolar(
+            id=datos['id'],
+            fuente=datos['fuente'],
+            valor=Decimal(datos['valor']),
+            obtenida=datos['obtenida'],
+        )
+    
+    def _guardar_en_cache(self, cotizacion):
+        # Sin vencimiento: la frescura la decide la fecha de la cotización
+        cache.set(self.CACHE_KEY, {
+            'id': cotizacion.id,
+            'fuente': cotizacion.fuente,
+            'valor': str(cotizacion.valor),
+            'obtenida': cotizacion.obtenida,
+        }, None)
+    
+    def _programar_actualizacion(self):
+        """Actualiza en segundo plano; a lo sumo una vez por LOCK_TIMEOUT."""
+        if not cache.add(self.LOCK_KEY, True, self.LOCK_TIMEOUT):
+            return
+        
+        if not getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+            from .tasks import actualizar_cotizacion_dolar
+            try:
+                actualizar_cotizacion_dolar.delay()
+                return
+            except Exception as e:
+                logger.warning(
+                    f"No se pudo encolar la actualización de la cotización: {str(e)}"
+                )
+        
+        # Sin Celery: un hilo, para no demorar el request
+        threading.Thread(
+            target=self._actualizar_en_hilo, name='cotizacion-usd', daemon=True
+        ).start()
+    
+    def _actualizar_en_hilo(self):
+        try:
+            self.actualizar()
+        except Exception as e:
+            logger.error(f"❌ Error actualizando cotización: {str(e)}")
+        finally:
+            connection.close()
     
     def _fetch_rate_from_apis(self):
         """
         Intenta obtener la cotización de múltiples APIs (con fallback)
         
         Returns:
-            Decimal: Cotización o None si falla
+            tuple: (fuente, Decimal) o None si falla
         """
         # Intentar API del BCRA primero
         try:
             logger.info("🌐 Consultando API del BCRA...")
-            response = requests.get(self.BCRA_API_URL, timeout=5)
+            response = cliente('bcra', **CONFIG_PROVEEDOR).get(self.BCRA_API_URL)
             
             if response.status_code == 200:
                 data = response.json()
@@ -79,14 +196,14 @@ class CurrencyService:
                 if data and len(data) > 0:
                     rate = Decimal(str(data[-1]['v']))
                     logger.info(f"✅ Cotización BCRA obtenida: ${rate}")
-                    return rate
+                    return 'bcra', rate
         except Exception as e:
             logger.warning(f"⚠️ Error consultando BCRA: {str(e)}")
         
         # Fallback: Intentar DolarAPI
         try:
             logger.info("🌐 Consultando DolarAPI (fallback)...")
-            response = requests.get(self.DOLAR_API_URL, timeout=5)
+            response = cliente('dolarapi', **CONFIG_PROVEEDOR).get(self.DOLAR_API_URL)
             
             if response.status_code == 200:
                 data = response.json()
@@ -95,19 +212,21 @@ class CurrencyService:
                 venta = Decimal(str(data['venta']))
                 rate = (compra + venta) / 2
                 logger.info(f"✅ Cotización DolarAPI obtenida: ${rate}")
-                return rate
+                return 'dolarapi', rate
         except Exception as e:
             logger.warning(f"⚠️ Error consultando DolarAPI: {str(e)}")
         
         return None
     
-    def convert_ars_to_usd(self, amount_ars, apply_margin=True):
+    def convert_ars_to_usd(self, amount_ars, apply_margin=True, cotizacion=None):
         """
         Convierte un monto de ARS a USD
         
         Args:
             amount_ars (Decimal|float): Monto en pesos argentinos
             apply_margin (bool): Si aplicar el margen del 15%
+            cotizacion (CotizacionDolar): Cotización a usar (default: la última);
+                para convertir todos los montos de un pago con la misma
             
         Returns:
             dict: {
@@ -122,7 +241,9 @@ class CurrencyService:
             amount_ars = Decimal(str(amount_ars))
             
             # Obtener cotización oficial
-            official_rate = self.get_usd_rate()
+            if cotizacion is None:
+                cotizacion = self.get_cotizacion()
+            official_rate = cotizacion.valor if cotizacion else EMERGENCY_RATE
             
             # Calcular monto en USD: (ARS / cotización_oficial) * margen
             # Ejemplo: $60,000 ARS / $1,000 = $60 USD → $60 * 1.15 = $69 USD
@@ -143,7 +264,8 @@ class CurrencyService:
                 'exchange_rate': official_rate,
                 'effective_rate': effective_rate,
                 'margin_applied': self.margin if apply_margin else Decimal('1.00'),
-                'original_amount_ars': amount_ars
+                'original_amount_ars': amount_ars,
+                'cotizacion': cotizacion
             }
             
             logger.info(f"💱 Conversión: ${amount_ars} ARS → ${amount_usd} USD (tasa: ${effective_rate})")
@@ -154,14 +276,16 @@ class CurrencyService:
             logger.error(f"❌ Error en conversión: {str(e)}")
             raise
     
-    def get_conversion_info(self):
+    def get_conversion_info(self, cotizacion=None):
         """
         Obtiene información sobre la conversión actual
         
         Returns:
             dict: Información de cotización y margen
         """
-        official_rate = self.get_usd_rate()
+        if cotizacion is None:
+            cotizacion = self.get_cotizacion()
+        official_rate = cotizacion.valor if cotizacion else EMERGENCY_RATE
         # Tasa efectiva es MENOR porque dividimos por ella después de aplicar margen
         effective_rate = official_rate / self.margin
         
@@ -170,5 +294,7 @@ class CurrencyService:
             'effective_rate': effective_rate,
             'margin_percentage': (self.margin - 1) * 100,
             'margin_multiplier': self.margin,
-            'last_update': 'Cotización actualizada cada hora'
+            'last_update': cotizacion.obtenida.isoformat() if cotizacion else None,
+            'source': cotizacion.fuente if cotizacion else 'emergencia',
+            'cotizacion_id': cotizacion.id if cotizacion else None
         }
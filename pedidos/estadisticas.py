@@ -0,0 +1,161 @@
+"""
+Contadores de pedidos para los dashboards del admin.
+
+`resumen()` devuelve el total de pedidos y la cantidad por estado y por estado
+de pago:
+
+- Con PEDIDOS_STATS_MATERIALIZADAS (default) los lee de PedidoStats: unas
+  pocas filas, el costo no depende de cuántos pedidos haya.
+- Si no, los cuenta con una sola consulta de agregados condicionales
+  (`contar_pedidos`), en vez de un COUNT(*) por badge.
+
+PedidoStats se mantiene en la misma transacción que el cambio del pedido:
+Pedido.save() (altas y cambios de estado/estado_pago, dentro de un atomic()),
+el cambio masivo Pedido.objects.cambiar_estado() y el borrado (post_delete).
+Los UPDATE masivos que no pasan por ahí no lo actualizan; `recalcular()`
+(tarea diaria y comando recalcular_estadisticas_pedidos) lo reconstruye desde
+la tabla de pedidos.
+
+Contención: cada alta suma en 'total' y en los contadores del estado
+inicial, y esas filas quedan bloqueadas hasta el commit de la transacción del
+checkout. Para que los checkouts simultáneos no se encolen en la misma fila,
+cada contador se reparte en PEDIDOS_STATS_FRAGMENTOS filas: cada cambio suma
+en un fragmento al azar y `resumen` suma los fragmentos. Las filas se
+actualizan siempre en el mismo orden, así dos transacciones no se bloquean
+en orden cruzado.
+"""
+import logging
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ESTADOS, ESTADOS_PAGO, Pedido, PedidoStats
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONES = {
+    'estado': [valor for valor, _ in ESTADOS],
+    'estado_pago': [valor for valor, _ in ESTADOS_PAGO],
+}
+
+
+def _fragmentos():
+    return max(getattr(settings, 'PEDIDOS_STATS_FRAGMENTOS', 8), 1)
+
+
+def _vacio():
+    return {
+        'total': 0,
+        **{
+            dimension: dict.fromkeys(valores, 0)
+            for dimension, valores in DIMENSIONES.items()
+        },
+    }
+
+
+def contar_pedidos(queryset=None):
+    """
+    Cuenta los pedidos con una sola consulta:
+    {'total': n, 'estado': {valor: n}, 'estado_pago': {valor: n}}.
+    """
+    queryset = Pedido.objects.all() if queryset is None else queryset
+    agregados = {'total': Count('pk')}
+    for dimension, valores in DIMENSIONES.items():
+        for valor in valores:
+            agregados[f'{dimension}__{valor}'] = Count(
+                'pk', filter=Q(**{dimension: valor})
+            )
+
+    resultado = _vacio()
+    for clave, cantidad in queryset.aggregate(**agregados).items():
+        if clave == 'total':
+            resultado['total'] = cantidad
+        else:
+            dimension, valor = clave.split('__')
+            resultado[dimension][valor] = cantidad
+    return resultado
+
+
+def resumen():
+    """Contadores para los dashboards (ver docstring del módulo)."""
+    if not getattr(settings, 'PEDIDOS_STATS_MATERIALIZADAS', True):
+        return contar_pedidos()
+
+    filas = list(PedidoStats.objects.values_list('dimension', 'valor', 'cantidad'))
+    if not filas:
+        # Nunca se calcularon (p. ej. se vació la tabla)
+        return recalcular()
+
+    resultado = _vacio()
+    for dimension, valor, cantidad in filas:
+        if dimension == 'total':
+            resultado['total'] += cantidad
+        else:
+            contadores = resultado.setdefault(dimension, {})
+            contadores[valor] = contadores.get(valor, 0) + cantidad
+    return resultado
+
+
+def recalcular():
+    """
+    Reconstruye PedidoStats contando los pedidos (todo en el fragmento 0).
+    Devuelve los contadores.
+    """
+    with transaction.atomic():
+        # Bloquea las filas para que ningún pedido las actualice a la vez
+        list(PedidoStats.objects.select_for_update())
+        conteo = contar_pedidos()
+        filas = [PedidoStats(dimension='total', valor='', cantidad=conteo['total'])]
+        for dimension in DIMENSIONES:
+            filas += [
+                PedidoStats(dimension=dimension, valor=valor, cantidad=cantidad)
+                for valor, cantidad in conteo[dimension].items()
+            ]
+        PedidoStats.objects.all().delete()
+        PedidoStats.objects.bulk_create(filas)
+    logger.info(f"Contadores de pedidos recalculados: {conteo['total']} pedidos")
+    return conteo
+
+
+def _sumar(deltas):
+    """
+    Aplica {(dimension, valor): delta} a PedidoStats con UPDATE atómicos, en un
+    fragmento al azar y en orden de (dimension, valor).
+    """
+    fragmento = random.randrange(_fragmentos())
+    for (dimension, valor), delta in sorted(deltas.items()):
+        if not delta or valor is None:
+            continue
+        clave = {'dimension': dimension, 'valor': valor, 'fragmento': fragmento}
+        filas = PedidoStats.objects.filter(**clave)
+        if not filas.update(cantidad=F('cantidad') + delta):
+            PedidoStats.objects.get_or_create(**clave)
+            filas.update(cantidad=F('cantidad') + delta)
+
+
+def registrar_alta(pedido, signo=1):
+    """Cuenta un pedido nuevo (o lo descuenta con signo=-1)."""
+    _sumar({
+        ('total', ''): signo,
+        ('estado', pedido.estado): signo,
+        ('estado_pago', pedido.estado_pago): signo,
+    })
+
+
+def registrar_cambios(campo, anteriores, nuevo):
+    """Mueve los pedidos que pasaron de `anteriores` (valores de `campo`) a `nuevo`."""
+    deltas = Counter()
+    for anterior in anteriores:
+        deltas[(campo, anterior)] -= 1
+        deltas[(campo, nuevo)] += 1
+    _sumar(deltas)
+
+
+@receiver(post_delete, sender=Pedido)
+def descontar_pedido_borrado(sender, instance, **kwargs):
+    registrar_alta(instance, signo=-1)
@@ -0,0 +1,197 @@
+"""
+Exportación de pedidos y ventas para contabilidad (CSV y XLSX).
+
+Una fila por ítem de pedido, con los datos del pedido repetidos; un pedido
+sin ítems sale en una fila con las columnas del producto vacías.
+
+Los pedidos se leen en lotes de CHUNK_SIZE por clave primaria (keyset), con
+sus ítems precargados por lote, así que la memoria no crece con el rango
+exportado. No se usa .iterator(): con DISABLE_SERVER_SIDE_CURSORS psycopg2
+traería igual todo el resultado a memoria.
+
+- CSV: las filas se generan a medida que se envían (StreamingHttpResponse,
+  `csv_streaming`) o se escriben en un archivo (`escribir_csv`).
+- XLSX: openpyxl en modo write_only escribe las filas en un temporal y el
+  archivo se envía por partes (`escribir_xlsx`). openpyxl es opcional.
+
+Los textos que carga el cliente (nombres, emails, productos) se escapan con
+un apóstrofo si empiezan como una fórmula, para que Excel o LibreOffice no
+la ejecuten al abrir el archivo (inyección CSV).
+
+Lo usan la vista admin_simple:pedidos-exportar y el comando exportar_pedidos.
+"""
+import csv
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Pedido
+
+try:
+    from openpyxl import Workbook
+    XLSX_DISPONIBLE = True
+except ImportError:
+    XLSX_DISPONIBLE = False
+
+CHUNK_SIZE = 2000
+
+# Caracteres con los que una celda se interpreta como fórmula
+INICIOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+COLUMNAS = [
+    'Número', 'ID', 'Creado', 'Estado', 'Estado de pago', 'Medio de pago',
+    'Forma de envío', 'Cliente', 'Comprador', 'Email comprador', 'Destinatario',
+    'Fecha de entrega', 'Costo de envío', 'Total pedido', 'Producto', 'SKU',
+    'Cantidad', 'Precio unitario', 'Subtotal',
+]
+
+
+class FiltroInvalido(ValueError):
+    """Un filtro de la exportación no tiene un valor válido."""
+
+
+def _fecha(valor, nombre):
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(str(valor), '%Y-%m-%d').date()
+    except ValueError:
+        raise FiltroInvalido(f"{nombre} debe tener formato AAAA-MM-DD: {valor}")
+
+
+def filtrar_pedidos(desde=None, hasta=None, estado=None, medio_pago=None):
+    """
+    Pedidos a exportar, en orden de id (el de creación). `desde` y `hasta` son fechas
+    (date o 'AAAA-MM-DD') incluidas, en la zona horaria local.
+    """
+    pedidos = Pedido.objects.select_related('cliente').prefetch_related(
+        'items__producto'
+    )
+
+    desde, hasta = _fecha(desde, 'desde'), _fecha(hasta, 'hasta')
+    zona = timezone.get_current_timezone()
+    if desde:
+        inicio = datetime.combine(desde, time.min)
+        pedidos = pedidos.filter(creado__gte=timezone.make_aware(inicio, zona))
+    if hasta:
+        fin = datetime.combine(hasta + timedelta(days=1), time.min)
+        pedidos = pedidos.filter(creado__lt=timezone.make_aware(fin, zona))
+
+    if estado:
+        if estado not in dict(Pedido._meta.get_field('estado').choices):
+            raise FiltroInvalido(f"Estado inválido: {estado}")
+        pedidos = pedidos.filter(estado=estado)
+    if medio_pago:
+        if medio_pago not in dict(Pedido.MEDIOS_PAGO):
+            raise FiltroInvalido(f"Medio de pago inválido: {medio_pago}")
+        pedidos = pedidos.filter(medio_pago=medio_pago)
+
+    return pedidos.order_by('id')
+
+
+def _por_lotes(pedidos):
+    ultimo = 0
+    while True:
+        lote = list(pedidos.filter(id__gt=ultimo).order_by('id')[:CHUNK_SIZE])
+        yield from lote
+        if len(lote) < CHUNK_SIZE:
+            return
+        ultimo = lote[-1].id
+
+
+def celda(valor):
+    """Neutraliza los textos que una planilla ejecutaría como fórmula."""
+    if isinstance(valor, str) and valor.startswith(INICIOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def filas(pedidos):
+    """Genera las filas (listas) de los pedidos, sin encabezado, ya escapadas."""
+    for pedido in _por_lotes(pedidos):
+        datos = [
+            pedido.numero_pedido or '',
+            pedido.id,
+            timezone.localtime(pedido.creado).strftime('%Y-%m-%d %H:%M'),
+            pedido.get_estado_display(),
+            pedido.get_estado_pago_display(),
+            pedido.get_medio_pago_display(),
+            pedido.tipo_envio or '',
+            pedido.cliente.email if pedido.cliente else '',
+            pedido.nombre_comprador or '',
+            pedido.email_comprador or '',
+            pedido.nombre_destinatario,
+            pedido.fecha_entrega.isoformat() if pedido.fecha_entrega else '',
+            pedido.costo_envio,
+            pedido.total,
+        ]
+        items = pedido.items.all()
+        if not items:
+            yield [celda(valor) for valor in datos] + [''] * 5
+        for item in items:
+            yield [celda(valor) for valor in datos + [
+                item.producto.nombre,
+                item.producto.sku or '',
+                item.cantidad,
+                item.precio,
+                item.get_cost(),
+            ]]
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def csv_streaming(pedidos):
+    """Genera el CSV de a una línea (con BOM para que Excel lea bien los acentos)."""
+    writer = csv.writer(_Eco())
+    yield '\ufeff'
+    yield writer.writerow(COLUMNAS)
+    for fila in filas(pedidos):
+        yield writer.writerow(fila)
+
+
+def escribir_csv(pedidos, destino):
+    """
+    Escribe el CSV en `destino` (archivo de texto abierto). Devuelve las
+    filas escritas.
+    """
+    writer = csv.writer(destino)
+    writer.writerow(COLUMNAS)
+    cantidad = 0
+    for fila in filas(pedidos):
+        writer.writerow(fila)
+        cantidad += 1
+    return cantidad
+
+
+def escribir_xlsx(pedidos, destino=None):
+    """
+    Escribe el XLSX en `destino` (ruta o archivo binario; por defecto un
+    temporal que se borra al cerrarlo) y lo devuelve posicionado al inicio
+    si es un archivo.
+    """
+    if not XLSX_DISPONIBLE:
+        raise RuntimeError('Para exportar a XLSX hace falta instalar openpyxl')
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Pedidos')
+    hoja.append(COLUMNAS)
+    for fila in filas(pedidos):
+        hoja.append(fila)
+
+    destino = tempfile.TemporaryFile() if destino is None else destino
+    libro.save(destino)
+    if hasattr(destino, 'seek'):
+        destino.seek(0)
+    return destino
+
+
+def nombre_archivo(formato, desde=None, hasta=None):
+    rango = '_'.join(str(fecha) for fecha in (desde, hasta) if fecha)
+    rango = rango or timezone.localdate().isoformat()
+    return f'pedidos_{rango}.{formato}'
@@ -0,0 +1,63 @@
+"""
+Comando para exportar pedidos y ventas a CSV o XLSX (contabilidad)
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from pedidos import exportacion
+
+
+class Command(BaseCommand):
+    help = 'Exporta pedidos e ítems a CSV o XLSX sin cargar todo el rango en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial incluida (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final incluida (AAAA-MM-DD)')
+        parser.add_argument(
+            '--estado', help='Estado del pedido (recibido, entregado, ...)'
+        )
+        parser.add_argument('--medio-pago', help='mercadopago, paypal o transferencia')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument(
+            '--salida',
+            help=(
+                'Archivo de salida (default: pedidos_<rango>.<formato>; '
+                '"-" para stdout, sólo CSV)'
+            )
+        )
+
+    def handle(self, *args, **options):
+        formato = options['formato']
+        try:
+            pedidos = exportacion.filtrar_pedidos(
+                desde=options['desde'],
+                hasta=options['hasta'],
+                estado=options['estado'],
+                medio_pago=options['medio_pago'],
+            )
+        except exportacion.FiltroInvalido as e:
+            raise CommandError(str(e))
+
+        salida = options['salida'] or exportacion.nombre_archivo(
+            formato, options['desde'], options['hasta']
+        )
+
+        if formato == 'xlsx':
+            if salida == '-':
+                raise CommandError(
+                    'El XLSX no se puede escribir en stdout: indicá --salida'
+                )
+            try:
+                exportacion.escribir_xlsx(pedidos, salida)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'✅ Pedidos exportados a {salida}'))
+            return
+
+        if salida == '-':
+            exportacion.escribir_csv(pedidos, self.stdout)
+            return
+        with open(salida, 'w', newline='', encoding='utf-8-sig') as archivo:
+            cantidad = exportacion.escribir_csv(pedidos, archivo)
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {cantidad} filas exportadas a {salida}')
+        )
@@ -0,0 +1,53 @@
+"""
+Comando para procesar los eventos de pago (webhooks) cuando Celery está apagado
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pedidos.pagos import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesa los eventos de pago registrados por los webhooks '
+        '(daemon; usar --una-vez para una sola pasada)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar lo pendiente y salir'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5.0,
+            help='Segundos de espera cuando no hay eventos listos (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        total = {}
+        self.stdout.write('💳 Procesando eventos de pago...')
+        try:
+            while True:
+                close_old_connections()
+                resumen = procesar_pendientes(maximo=500)
+                for estado, cantidad in resumen.items():
+                    total[estado] = total.get(estado, 0) + cantidad
+                if resumen:
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        for estado, cantidad in sorted(total.items()):
+            self.stdout.write(f'   {estado}: {cantidad}')
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {sum(total.values())} eventos procesados')
+        )
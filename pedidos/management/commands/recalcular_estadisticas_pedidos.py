@@ -0,0 +1,19 @@
+"""
+Comando para reconstruir los contadores de pedidos de los dashboards
+"""
+
+from django.core.management.base import BaseCommand
+
+from pedidos.estadisticas import recalcular
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los contadores de PedidoStats desde la tabla de pedidos'
+
+    def handle(self, *args, **options):
+        conteo = recalcular()
+        self.stdout.write(f"📊 {conteo['total']} pedidos")
+        for dimension in ('estado', 'estado_pago'):
+            for valor, cantidad in conteo[dimension].items():
+                self.stdout.write(f'   {dimension} {valor}: {cantidad}')
+        self.stdout.write(self.style.SUCCESS('✅ Contadores recalculados'))
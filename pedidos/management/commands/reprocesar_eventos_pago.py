@@ -0,0 +1,61 @@
+"""
+Comando para reprocesar los webhooks de pago que fallaron
+"""
+
+from django.core.management.base import BaseCommand
+
+from pedidos.models import PaymentEvent
+from pedidos.pagos import procesar_pendientes, reintentar
+
+
+class Command(BaseCommand):
+    help = (
+        'Vuelve a encolar los eventos de pago fallidos (o los indicados por id) '
+        'y procesa la cola'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'ids',
+            nargs='*',
+            type=int,
+            help='Ids de PaymentEvent a reprocesar (default: todos los fallidos)'
+        )
+        parser.add_argument(
+            '--incluir-ignorados',
+            action='store_true',
+            help=(
+                'Reprocesar también los eventos ignorados '
+                '(p. ej. pedido no encontrado)'
+            )
+        )
+        parser.add_argument(
+            '--solo-encolar',
+            action='store_true',
+            help='Sólo volver a encolarlos; los procesa el worker'
+        )
+
+    def handle(self, *args, **options):
+        estados = ['fallido']
+        if options['incluir_ignorados']:
+            estados.append('ignorado')
+        eventos = PaymentEvent.objects.filter(estado__in=estados)
+        if options['ids']:
+            eventos = eventos.filter(id__in=options['ids'])
+
+        encolados = reintentar(eventos)
+        self.stdout.write(f'🔁 {encolados} eventos de pago reencolados')
+        if options['solo_encolar']:
+            return
+
+        # Procesa toda la cola, no sólo los reencolados: también los
+        # pendientes atrasados
+        resumen = procesar_pendientes()
+        for estado, cantidad in sorted(resumen.items()):
+            self.stdout.write(f'   {estado}: {cantidad}')
+        if resumen.get('fallido'):
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {resumen['fallido']} eventos volvieron a fallar"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Reproceso terminado'))
@@ -1,13 +1,38 @@
 import mercadopago
+from mercadopago.http import HttpClient
 from django.conf import settings
 from django.urls import reverse
 from decimal import Decimal
 import logging
 import os
 
+from core.http import cliente
+
 logger = logging.getLogger(__name__)
 
 
+class PooledHttpClient(HttpClient):
+    """
+    HttpClient del SDK de Mercado Pago sobre el cliente HTTP compartido. El
+    SDK por defecto abre una Session nueva en cada llamada; los reintentos y
+    el circuit breaker los maneja core.http.
+    """
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        api_result = cliente('mercadopago').request(
+            method, url, reintentos=maxretries, **kwargs
+        )
+        response = {"status": api_result.status_code, "response": None}
+
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response["response"] = api_result.json()
+            except ValueError as e:
+                logger.error(f"Respuesta de Mercado Pago no es JSON: {str(e)}")
+
+        return response
+
+
 class MercadoPagoService:
     """
     Servicio para integración con Mercado Pago
@@ -24,7 +49,7 @@ class MercadoPagoService:
         else:
             logger.error("❌ ACCESS_TOKEN is None or empty!")
         
-        self.sdk = mercadopago.SDK(access_token)
+        self.sdk = mercadopago.SDK(access_token, http_client=PooledHttpClient())
     
     def create_preference(self, pedido, request):
         """
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+def marcar_confirmados(apps, schema_editor):
+    # Los pedidos confirmados hasta ahora ya descontaron su stock
+    Pedido = apps.get_model("pedidos", "Pedido")
+    Pedido.objects.filter(confirmado=True).update(stock_descontado=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0029_pedido_hora_retiro"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pedido",
+            name="stock_descontado",
+            field=models.BooleanField(
+                default=False,
+                help_text="Indica si el stock de los items ya se descontó (ver pedidos.stock)",
+            ),
+        ),
+        migrations.RunPython(marcar_confirmados, migrations.RunPython.noop),
+    ]
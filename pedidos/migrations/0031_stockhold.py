@@ -0,0 +1,54 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0008_producto_cursor_indexes"),
+        ("pedidos", "0030_pedido_stock_descontado"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockHold",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("cantidad", models.PositiveIntegerField()),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[("activo", "Activo"), ("convertido", "Convertido"), ("liberado", "Liberado")],
+                        default="activo",
+                        max_length=20,
+                    ),
+                ),
+                ("expira", models.DateTimeField()),
+                ("creado", models.DateTimeField(auto_now_add=True)),
+                ("actualizado", models.DateTimeField(auto_now=True)),
+                (
+                    "pedido",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="holds", to="pedidos.pedido"
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="holds", to="catalogo.producto"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Reserva de stock",
+                "verbose_name_plural": "Reservas de stock",
+                "indexes": [
+                    models.Index(fields=["producto", "estado", "expira"], name="stockhold_producto_idx"),
+                    models.Index(fields=["estado", "expira"], name="stockhold_vencimiento_idx"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(fields=("pedido", "producto"), name="stockhold_pedido_producto_unico"),
+                ],
+            },
+        ),
+    ]
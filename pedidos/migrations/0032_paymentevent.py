@@ -0,0 +1,67 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0031_stockhold"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("provider", models.CharField(default="mercadopago", max_length=20)),
+                ("payment_id", models.CharField(max_length=64)),
+                (
+                    "status",
+                    models.CharField(
+                        blank=True, default="", help_text="Estado del pago según el proveedor", max_length=30
+                    ),
+                ),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendiente", "Pendiente"),
+                            ("procesando", "Procesando"),
+                            ("procesado", "Procesado"),
+                            ("ignorado", "Ignorado"),
+                            ("fallido", "Fallido"),
+                        ],
+                        default="pendiente",
+                        max_length=20,
+                    ),
+                ),
+                ("intentos", models.PositiveIntegerField(default=0)),
+                ("proximo_intento", models.DateTimeField(default=django.utils.timezone.now)),
+                ("bloqueado_hasta", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+                ("recibido", models.DateTimeField(auto_now_add=True)),
+                ("procesado", models.DateTimeField(blank=True, null=True)),
+                (
+                    "pedido",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="eventos_pago",
+                        to="pedidos.pedido",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Evento de pago",
+                "verbose_name_plural": "Eventos de pago",
+                "ordering": ["-recibido"],
+                "indexes": [models.Index(fields=["estado", "proximo_intento"], name="paymentevent_cola_idx")],
+                "constraints": [
+                    models.UniqueConstraint(fields=("provider", "payment_id", "status"), name="paymentevent_unico")
+                ],
+            },
+        ),
+    ]
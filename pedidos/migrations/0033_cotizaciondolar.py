@@ -0,0 +1,40 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0032_paymentevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CotizacionDolar",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("fuente", models.CharField(choices=[("bcra", "BCRA"), ("dolarapi", "DolarAPI")], max_length=20)),
+                ("valor", models.DecimalField(decimal_places=4, help_text="ARS por USD", max_digits=12)),
+                ("obtenida", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Cotización del dólar",
+                "verbose_name_plural": "Cotizaciones del dólar",
+                "ordering": ["-obtenida"],
+                "get_latest_by": "obtenida",
+            },
+        ),
+        migrations.AddField(
+            model_name="pedido",
+            name="cotizacion_usd",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Cotización usada para convertir el pedido a USD (PayPal)",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="pedidos",
+                to="pedidos.cotizaciondolar",
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def calcular_contadores(apps, schema_editor):
+    Pedido = apps.get_model("pedidos", "Pedido")
+    PedidoStats = apps.get_model("pedidos", "PedidoStats")
+    filas = [PedidoStats(dimension="total", valor="", cantidad=Pedido.objects.count())]
+    for dimension, valores in (
+        ("estado", ["recibido", "preparando", "en_camino", "entregado", "cancelado"]),
+        ("estado_pago", ["pendiente", "approved", "rejected"]),
+    ):
+        conteo = Pedido.objects.aggregate(**{v: Count("pk", filter=Q(**{dimension: v})) for v in valores})
+        filas += [PedidoStats(dimension=dimension, valor=v, cantidad=n) for v, n in conteo.items()]
+    PedidoStats.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0033_cotizaciondolar"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PedidoStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[("total", "Total"), ("estado", "Estado"), ("estado_pago", "Estado de pago")],
+                        max_length=20,
+                    ),
+                ),
+                ("valor", models.CharField(blank=True, default="", max_length=20)),
+                ("cantidad", models.IntegerField(default=0)),
+                ("actualizado", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Contador de pedidos",
+                "verbose_name_plural": "Contadores de pedidos",
+                "ordering": ["dimension", "valor"],
+                "constraints": [models.UniqueConstraint(fields=("dimension", "valor"), name="pedidostats_unico")],
+            },
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+
+def completar_busqueda(apps, schema_editor):
+    from pedidos.busqueda import CAMPOS_DERIVADOS, actualizar_busqueda
+
+    Pedido = apps.get_model("pedidos", "Pedido")
+    lote = []
+    for pedido in Pedido.objects.select_related("cliente").iterator(chunk_size=500):
+        actualizar_busqueda(pedido)
+        lote.append(pedido)
+        if len(lote) == 500:
+            Pedido.objects.bulk_update(lote, CAMPOS_DERIVADOS)
+            lote = []
+    if lote:
+        Pedido.objects.bulk_update(lote, CAMPOS_DERIVADOS)
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    # LIKE '%...%' sobre la columna de búsqueda con índice; sólo en PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS pedido_busqueda_trgm ON pedidos_pedido USING gin (busqueda gin_trgm_ops)"
+    )
+
+
+def borrar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS pedido_busqueda_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0034_pedidostats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pedido",
+            name="busqueda",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="pedido",
+            name="telefono_comprador_normalizado",
+            field=models.CharField(blank=True, db_index=True, default="", editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name="pedido",
+            name="telefono_destinatario_normalizado",
+            field=models.CharField(blank=True, db_index=True, default="", editable=False, max_length=20),
+        ),
+        migrations.RunPython(completar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_trigramas, borrar_indice_trigramas),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0035_pedido_busqueda"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pedido",
+            index=models.Index(fields=["-creado"], name="pedido_creado_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pedido",
+            index=models.Index(fields=["estado", "-creado"], name="pedido_estado_creado_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pedido",
+            index=models.Index(fields=["estado_pago", "-creado"], name="pedido_pago_creado_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pedido",
+            index=models.Index(fields=["tipo_envio", "-creado"], name="pedido_envio_creado_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pedido",
+            index=models.Index(fields=["cliente", "-creado"], name="pedido_cliente_creado_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pedido",
+            index=models.Index(fields=["fecha_entrega", "franja_horaria"], name="pedido_entrega_idx"),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0036_pedido_indices"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pedidostats",
+            name="fragmento",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RemoveConstraint(
+            model_name="pedidostats",
+            name="pedidostats_unico",
+        ),
+        migrations.AddConstraint(
+            model_name="pedidostats",
+            constraint=models.UniqueConstraint(
+                fields=("dimension", "valor", "fragmento"), name="pedidostats_unico_fragmento"
+            ),
+        ),
+        migrations.AlterModelOptions(
+            name="pedidostats",
+            options={
+                "verbose_name": "Contador de pedidos",
+                "verbose_name_plural": "Contadores de pedidos",
+                "ordering": ["dimension", "valor", "fragmento"],
+            },
+        ),
+    ]
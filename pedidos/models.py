@@ -1,6 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from catalogo.models import Producto  # Asume que tu modelo Producto está en la app catalogo
+from .busqueda import (
+    CAMPOS_DERIVADOS as CAMPOS_BUSQUEDA_DERIVADOS,
+    CAMPOS_FUENTE as CAMPOS_BUSQUEDA,
+)
+from .signals import estado_changed
 
 User = get_user_model()
 
@@ -19,7 +25,44 @@ ESTADOS_PAGO = [
     ('rejected', 'Rechazado')
 ]
 
+
+class PedidoQuerySet(models.QuerySet):
+
+    def cambiar_estado(self, nuevo_estado):
+        """
+        Cambia el estado de todos los pedidos del queryset con un solo UPDATE
+        y envía estado_changed (en_lote=True) por cada pedido que cambió.
+
+        Returns:
+            list: los pedidos que cambiaron de estado.
+        """
+        with transaction.atomic():
+            anteriores = dict(
+                self.select_for_update()
+                .exclude(estado=nuevo_estado)
+                .values_list('pk', 'estado')
+            )
+            if not anteriores:
+                return []
+
+            cambiados = Pedido.objects.filter(pk__in=list(anteriores))
+            cambiados.update(estado=nuevo_estado, actualizado=timezone.now())
+            from .estadisticas import registrar_cambios
+            registrar_cambios('estado', anteriores.values(), nuevo_estado)
+            pedidos = list(cambiados.select_related('cliente'))
+            for pedido in pedidos:
+                estado_changed.send(
+                    sender=Pedido, pedido=pedido, anterior=anteriores[pedido.pk],
+                    nuevo=nuevo_estado, en_lote=True,
+                )
+        return pedidos
+
+
 class Pedido(models.Model):
+    # Campos cuyo valor al cargar se recuerda (ver has_changed / previous).
+    # Incluye los que alimentan la búsqueda (ver pedidos.busqueda)
+    CAMPOS_SEGUIDOS = ('estado', 'estado_pago', 'confirmado') + CAMPOS_BUSQUEDA
+
     cliente = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     nombre_comprador = models.CharField(max_length=100, help_text="Nombre de quien realiza la compra (si es invitado)", blank=True, null=True)
     telefono_comprador = models.CharField(max_length=20, help_text="Teléfono de quien realiza la compra para notificaciones (si es invitado)", blank=True, null=True)
@@ -63,6 +106,10 @@ class Pedido(models.Model):
     costo_envio = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Costo del envío")
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     confirmado = models.BooleanField(default=False)
+    stock_descontado = models.BooleanField(
+        default=False,
+        help_text="Indica si el stock de los items ya se descontó (ver pedidos.stock)"
+    )
     numero_pedido = models.CharField(max_length=20, unique=True, blank=True, null=True)
     token_acceso = models.CharField(
         max_length=32, 
@@ -83,8 +130,91 @@ class Pedido(models.Model):
         null=True,
         help_text="Link de pago generado (Mercado Pago, PayPal, etc.)"
     )
+    cotizacion_usd = models.ForeignKey(
+        'CotizacionDolar',
+        related_name='pedidos',
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        help_text="Cotización usada para convertir el pedido a USD (PayPal)"
+    )
+    # Búsqueda del admin (ver pedidos.busqueda); se calculan al guardar
+    busqueda = models.TextField(blank=True, default='', editable=False)
+    telefono_destinatario_normalizado = models.CharField(
+        max_length=20, blank=True, default='', editable=False, db_index=True
+    )
+    telefono_comprador_normalizado = models.CharField(
+        max_length=20, blank=True, default='', editable=False, db_index=True
+    )
+
+    objects = PedidoQuerySet.as_manager()
+
+    class Meta:
+        # Accesos frecuentes (ver PedidoQueryPlanTests): listado del admin
+        # ordenado por fecha con filtros de estado/pago/envío, "mis pedidos"
+        # de un cliente y la agenda de entregas
+        indexes = [
+            models.Index(fields=['-creado'], name='pedido_creado_idx'),
+            models.Index(fields=['estado', '-creado'], name='pedido_estado_creado_idx'),
+            models.Index(
+                fields=['estado_pago', '-creado'], name='pedido_pago_creado_idx'
+            ),
+            models.Index(
+                fields=['tipo_envio', '-creado'], name='pedido_envio_creado_idx'
+            ),
+            models.Index(
+                fields=['cliente', '-creado'], name='pedido_cliente_creado_idx'
+            ),
+            models.Index(
+                fields=['fecha_entrega', 'franja_horaria'], name='pedido_entrega_idx'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._recordar_valores()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._recordar_valores(fields)
+
+    def _recordar_valores(self, campos=None):
+        """Guarda los valores actuales de CAMPOS_SEGUIDOS como iniciales"""
+        iniciales = self.__dict__.setdefault('_valores_iniciales', {})
+        for campo in campos or self.CAMPOS_SEGUIDOS:
+            # Los campos diferidos (only/defer) no se cargaron: no se siguen
+            if campo in self.CAMPOS_SEGUIDOS and campo in self.__dict__:
+                iniciales[campo] = self.__dict__[campo]
+
+    def has_changed(self, campo):
+        """
+        True si `campo` cambió desde que se cargó (o guardó) el pedido.
+        Un pedido nuevo no tiene valores previos: devuelve False.
+        """
+        iniciales = self.__dict__.get('_valores_iniciales', {})
+        return campo in iniciales and iniciales[campo] != getattr(self, campo)
+
+    def previous(self, campo):
+        """Valor de `campo` al cargar (o guardar) el pedido; None si no se conoce"""
+        return self.__dict__.get('_valores_iniciales', {}).get(campo)
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        estado_anterior = None
+        guarda_estado = update_fields is None or 'estado' in update_fields
+        if self.has_changed('estado') and guarda_estado:
+            estado_anterior = self.previous('estado')
+        # Para los contadores de PedidoStats
+        nuevo = self._state.adding
+        cambios = {
+            campo: self.previous(campo)
+            for campo in ('estado', 'estado_pago')
+            if self.has_changed(campo)
+            and (update_fields is None or campo in update_fields)
+        }
+
         if not self.numero_pedido:
             # Generar número de pedido único
             import random
@@ -95,8 +225,36 @@ class Pedido(models.Model):
             # Generar token de acceso único
             import secrets
             self.token_acceso = secrets.token_urlsafe(16)
+
+        # Campos de búsqueda: sólo si cambió algo de lo que los alimenta
+        fuentes = CAMPOS_BUSQUEDA
+        if update_fields is not None:
+            fuentes = set(CAMPOS_BUSQUEDA) & set(update_fields)
+        cambio = any(self.has_changed(campo) for campo in fuentes)
+        if nuevo or not self.busqueda or cambio:
+            from .busqueda import actualizar_busqueda
+            actualizar_busqueda(self)
+            if update_fields is not None:
+                derivados = set(CAMPOS_BUSQUEDA_DERIVADOS)
+                kwargs['update_fields'] = set(update_fields) | derivados
         
-        super().save(*args, **kwargs)
+        from .estadisticas import registrar_alta, registrar_cambios
+        # El pedido y sus contadores se guardan juntos o no se guarda ninguno
+        # (sin savepoint, como Model.save_base: dentro de otra transacción se
+        # suma a ella)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if nuevo:
+                registrar_alta(self)
+            for campo, anterior in cambios.items():
+                registrar_cambios(campo, [anterior], getattr(self, campo))
+        self._recordar_valores(update_fields)
+
+        if estado_anterior is not None:
+            estado_changed.send(
+                sender=Pedido, pedido=self, anterior=estado_anterior,
+                nuevo=self.estado, en_lote=False,
+            )
 
     def __str__(self):
         return f"Pedido #{self.numero_pedido or self.id} para {self.nombre_destinatario} ({self.get_estado_display()})"
@@ -104,173 +262,63 @@ class Pedido(models.Model):
     def confirmar_pedido(self):
         """
         Confirma el pedido y reduce el stock de los productos
-        También activa las notificaciones automáticas
+        También encola las notificaciones automáticas (outbox)
         """
+        from django.db import transaction
+        from .stock import StockInsuficiente, descontar_stock
+        
         if self.confirmado:
             return False, "El pedido ya está confirmado"
         
-        # Verificar stock disponible para todos los productos
-        for item in self.items.all():
-            if item.producto.stock < item.cantidad:
-                return False, f"Stock insuficiente para {item.producto.nombre}. Disponible: {item.producto.stock}, solicitado: {item.cantidad}"
-        
-        # Si hay stock suficiente, reducir stock y confirmar pedido
-        for item in self.items.all():
-            item.producto.stock -= item.cantidad
-            item.producto.save()
+        # Descontar stock (si no se descontó ya en el checkout), confirmar y
+        # encolar las notificaciones en la misma transacción: el email y el
+        # WhatsApp los envía el worker del outbox, fuera del request
+        try:
+            with transaction.atomic():
+                descontar_stock(self)
+                self.confirmado = True
+                self.save()
+                self._encolar_notificaciones_confirmacion()
+        except StockInsuficiente as e:
+            self.confirmado = False
+            return False, str(e)
         
-        self.confirmado = True
-        self.save()
+        return True, "Pedido confirmado exitosamente"
+    
+    def _encolar_notificaciones_confirmacion(self):
+        import logging
+        from django.db import transaction
+        logger = logging.getLogger(__name__)
         
-        # Activar notificaciones para todos los pedidos
         try:
-            from notificaciones.services import notificacion_service
-            from notificaciones.models import TipoNotificacion, CanalNotificacion, PlantillaNotificacion
-            from django.contrib.auth.models import User
-            import logging
-            
-            logger = logging.getLogger(__name__)
-            logger.info(f"🔔 Iniciando notificación para pedido {self.id}")
-            
-            # Verificar y crear plantillas si no existen
-            plantilla_existe = PlantillaNotificacion.objects.filter(
-                tipo=TipoNotificacion.PEDIDO_CONFIRMADO,
-                canal=CanalNotificacion.EMAIL
-            ).exists()
-            
-            if not plantilla_existe:
-                logger.warning("⚠️ Plantilla de email no existe, creándola...")
-                PlantillaNotificacion.objects.create(
-                    tipo=TipoNotificacion.PEDIDO_CONFIRMADO,
-                    canal=CanalNotificacion.EMAIL,
-                    asunto='✅ Pedido #{pedido_id} Confirmado - Florería Cristina',
-                    mensaje='''¡Hola {nombre}!
-
-Tu pedido #{pedido_id} ha sido confirmado exitosamente.
-
-📋 Detalles del pedido:
-• Número de pedido: #{pedido_id}
-• Total: ${total}
-• Fecha: {fecha}
-• Cantidad de productos: {items_count}
-• Tipo de envío: {tipo_envio}
-
-📦 ¿Qué sigue?
-Te notificaremos cuando tu pedido esté en camino.
-
-💐 ¡Gracias por elegir Florería Cristina!
-
-Saludos,
-El equipo de Florería Cristina
-🌸 Hacemos que cada momento sea especial 🌸''',
-                    activa=True
-                )
-                logger.info("✅ Plantilla de email creada")
-            
-            # Determinar usuario y email
-            usuario = None
-            email_destino = None
-            nombre_destino = 'Cliente'
-            
-            # PRIORIDAD 1: Usar email_comprador del formulario si está disponible
-            if self.email_comprador:
-                email_destino = self.email_comprador
-                nombre_destino = self.nombre_comprador or 'Cliente'
-                # Si hay usuario autenticado, usarlo; sino usar admin temporal
-                if self.cliente:
-                    usuario = self.cliente
-                    logger.info(f"📧 Usuario autenticado con email del formulario: {email_destino}")
-                else:
-                    usuario = User.objects.filter(is_superuser=True).first()
-                    logger.info(f"📧 Cliente invitado: {email_destino}")
-            # PRIORIDAD 2: Si no hay email_comprador, usar email del usuario autenticado
-            elif self.cliente:
-                usuario = self.cliente
-                email_destino = self.cliente.email
-                nombre_destino = self.cliente.first_name or self.cliente.username
-                logger.info(f"📧 Cliente registrado (sin email en formulario): {email_destino}")
-            
-            if usuario and email_destino:
-                # Preparar contexto
-                contexto = {
-                    'pedido_id': self.id,
-                    'nombre': nombre_destino,
-                    'total': str(self.total),
-                    'fecha': self.creado.strftime('%d/%m/%Y'),
-                    'items_count': self.items.count(),
-                    'tipo_envio': self.get_tipo_envio_display() if self.tipo_envio else 'No especificado'
-                }
-                
-                logger.info(f"📝 Contexto preparado: {contexto}")
-                
-                # Crear y enviar notificación inmediatamente
-                try:
-                    notif = notificacion_service.crear_notificacion(
-                        usuario=usuario,
-                        tipo=TipoNotificacion.PEDIDO_CONFIRMADO,
-                        canal=CanalNotificacion.EMAIL,
-                        destinatario=email_destino,
-                        contexto=contexto,
-                        pedido_id=self.id
-                    )
-                    
-                    logger.info(f"✅ Notificación {notif.id} creada")
-                    
-                    # Enviar INMEDIATAMENTE (sin Celery, sin threading)
-                    logger.info(f"📤 Enviando notificación {notif.id} de forma directa...")
-                    
-                    try:
-                        success = notificacion_service.enviar_notificacion(notif)
-                        if success:
-                            logger.info(f"✅ Email enviado exitosamente a {email_destino}")
-                        else:
-                            logger.warning(f"⚠️ Email no se pudo enviar a {email_destino}")
-                    except Exception as e:
-                        logger.error(f"❌ Error enviando email: {str(e)}")
-                    
-                    # Enviar WhatsApp vía n8n si hay teléfono destinatario
-                    if self.telefono_comprador or self.telefono_destinatario:
-                        try:
-                            from notificaciones.n8n_service import n8n_service
-                            logger.info(f"📱 Enviando WhatsApp vía n8n a {self.telefono_comprador or self.telefono_destinatario}")
-                            whatsapp_success = n8n_service.enviar_notificacion_pedido(
-                                pedido=self,
-                                tipo='confirmado'
-                            )
-                            if whatsapp_success:
-                                logger.info(f"✅ WhatsApp enviado exitosamente vía n8n")
-                            else:
-                                logger.warning(f"⚠️ WhatsApp no se pudo enviar vía n8n")
-                        except Exception as e:
-                            logger.error(f"❌ Error enviando WhatsApp vía n8n: {str(e)}")
-                        
-                except Exception as e:
-                    logger.error(f"❌ Error creando/enviando notificación: {str(e)}", exc_info=True)
-            else:
-                logger.warning(f"⚠️ No se pudo determinar usuario o email para pedido {self.id}")
-                
+            from notificaciones.outbox import encolar_confirmacion_pedido
+            # Savepoint: si falla, no arrastra la transacción de la confirmación
+            with transaction.atomic():
+                encolar_confirmacion_pedido(self)
         except ImportError as e:
             logger.error(f"❌ Módulo de notificaciones no disponible: {str(e)}")
         except Exception as e:
-            logger.error(f"❌ Error general en notificación: {str(e)}", exc_info=True)
-        
-        return True, "Pedido confirmado exitosamente"
+            # Un problema con las notificaciones no impide confirmar el pedido
+            logger.error(
+                f"❌ Error encolando notificaciones del pedido {self.id}: {str(e)}",
+                exc_info=True,
+            )
     
     def cancelar_pedido(self):
         """
         Cancela el pedido y restaura el stock de los productos
         """
+        from django.db import transaction
+        from .stock import restaurar_stock
+        
         if not self.confirmado:
             return False, "El pedido no está confirmado"
         
-        # Restaurar stock
-        for item in self.items.all():
-            item.producto.stock += item.cantidad
-            item.producto.save()
-        
-        self.confirmado = False
-        self.estado = 'cancelado'
-        self.save()
+        with transaction.atomic():
+            restaurar_stock(self)
+            self.confirmado = False
+            self.estado = 'cancelado'
+            self.save()
         return True, "Pedido cancelado y stock restaurado"
     
     def validar_stock_disponible(self):
@@ -301,6 +349,180 @@ class PedidoItem(models.Model):
         return self.precio * self.cantidad
 
 
+class StockHold(models.Model):
+    """
+    Reserva temporal de stock de un pedido mientras se espera el pago online
+    (Mercado Pago / PayPal). El stock disponible de un producto es su stock
+    menos las reservas activas no vencidas (ver pedidos.stock).
+    """
+    ESTADOS = [
+        ('activo', 'Activo'),
+        ('convertido', 'Convertido'),  # el pago se aprobó y se descontó el stock
+        ('liberado', 'Liberado'),  # pago rechazado o reserva vencida
+    ]
+
+    pedido = models.ForeignKey(Pedido, related_name='holds', on_delete=models.CASCADE)
+    producto = models.ForeignKey(
+        Producto, related_name='holds', on_delete=models.CASCADE
+    )
+    cantidad = models.PositiveIntegerField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='activo')
+    expira = models.DateTimeField()
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Reserva de stock'
+        verbose_name_plural = 'Reservas de stock'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['pedido', 'producto'], name='stockhold_pedido_producto_unico'
+            ),
+        ]
+        indexes = [
+            # Suma de reservas activas por producto
+            models.Index(
+                fields=['producto', 'estado', 'expira'], name='stockhold_producto_idx'
+            ),
+            # Tarea periódica de vencimiento
+            models.Index(fields=['estado', 'expira'], name='stockhold_vencimiento_idx'),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.cantidad} x {self.producto.nombre} "
+            f"(Pedido #{self.pedido_id}, {self.get_estado_display()})"
+        )
+
+
+class PaymentEvent(models.Model):
+    """
+    Notificación de un proveedor de pago (webhook), registrada tal como llegó
+    y procesada después por un worker (ver pedidos.pagos).
+
+    Mercado Pago sólo informa el id del pago: el estado se completa al
+    procesar el evento consultando su API. La clave única
+    (provider, payment_id, status) descarta los duplicados: mientras hay un
+    evento sin resolver (status vacío) las notificaciones repetidas del mismo
+    pago no agregan filas, y un estado ya procesado no se aplica dos veces.
+    Cuando el pago llega a un estado final ya no se registran más eventos.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('procesado', 'Procesado'),
+        ('ignorado', 'Ignorado'),  # sin pedido asociado o estado sin efecto
+        ('fallido', 'Fallido'),
+    ]
+
+    provider = models.CharField(max_length=20, default='mercadopago')
+    payment_id = models.CharField(max_length=64)
+    status = models.CharField(
+        max_length=30, blank=True, default='',
+        help_text="Estado del pago según el proveedor",
+    )
+    pedido = models.ForeignKey(
+        Pedido, related_name='eventos_pago', on_delete=models.SET_NULL,
+        null=True, blank=True,
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    bloqueado_hasta = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    recibido = models.DateTimeField(auto_now_add=True)
+    procesado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Evento de pago'
+        verbose_name_plural = 'Eventos de pago'
+        ordering = ['-recibido']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider', 'payment_id', 'status'], name='paymentevent_unico'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['estado', 'proximo_intento'], name='paymentevent_cola_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.provider} {self.payment_id} {self.status or '?'} "
+            f"({self.get_estado_display()})"
+        )
+
+
+class CotizacionDolar(models.Model):
+    """
+    Historial de la cotización oficial del dólar (ARS por USD) obtenida de los
+    proveedores. CurrencyService usa la última; los pedidos pagados con
+    PayPal guardan la que se usó para convertirlos.
+    """
+    FUENTES = [
+        ('bcra', 'BCRA'),
+        ('dolarapi', 'DolarAPI'),
+    ]
+
+    fuente = models.CharField(max_length=20, choices=FUENTES)
+    valor = models.DecimalField(
+        max_digits=12, decimal_places=4, help_text="ARS por USD"
+    )
+    obtenida = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Cotización del dólar'
+        verbose_name_plural = 'Cotizaciones del dólar'
+        ordering = ['-obtenida']
+        get_latest_by = 'obtenida'
+
+    def __str__(self):
+        return (
+            f"${self.valor} ARS/USD "
+            f"({self.get_fuente_display()}, {self.obtenida:%d/%m/%Y %H:%M})"
+        )
+
+
+class PedidoStats(models.Model):
+    """
+    Contadores de pedidos (total, por estado y por estado de pago) que se
+    actualizan al crear, cambiar o borrar pedidos (ver pedidos.estadisticas).
+    Los dashboards los leen en vez de contar la tabla de pedidos.
+
+    Cada contador puede estar repartido en varias filas (`fragmento`) para que
+    los checkouts simultáneos no esperen todos la misma fila; su valor es la
+    suma de sus fragmentos.
+    """
+    DIMENSIONES = [
+        ('total', 'Total'),
+        ('estado', 'Estado'),
+        ('estado_pago', 'Estado de pago'),
+    ]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSIONES)
+    valor = models.CharField(max_length=20, blank=True, default='')
+    fragmento = models.PositiveSmallIntegerField(default=0)
+    cantidad = models.IntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Contador de pedidos'
+        verbose_name_plural = 'Contadores de pedidos'
+        ordering = ['dimension', 'valor', 'fragmento']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dimension', 'valor', 'fragmento'],
+                name='pedidostats_unico_fragmento',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_dimension_display()} {self.valor}: {self.cantidad}"
+
+
 class MetodoEnvio(models.Model):
     nombre = models.CharField(max_length=100, help_text="Nombre del método de envío, ej: 'Envío a domicilio CABA'")
     costo = models.DecimalField(max_digits=10, decimal_places=2)
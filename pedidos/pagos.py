@@ -0,0 +1,352 @@
+"""
+Procesamiento asíncrono de las notificaciones de pago (webhooks).
+
+El webhook de Mercado Pago sólo registra un PaymentEvent y responde: no
+consulta la API de MP ni toca el pedido dentro del request. Un worker procesa
+los eventos después:
+
+- Con Celery, la tarea `procesar_eventos_pago` se dispara al registrar el
+  evento y Celery Beat la repite periódicamente para los reintentos.
+- Sin Celery (CELERY_TASK_ALWAYS_EAGER, el default en Railway) el evento se
+  procesa en el mismo proceso al hacer commit del webhook, como antes, y el
+  comando `python manage.py procesar_eventos_pago` corre como daemon para
+  los reintentos (proceso `pagos` del Procfile; en Railway lo arranca
+  railway_start.sh).
+- `python manage.py reprocesar_eventos_pago` vuelve a encolar los eventos
+  fallidos y procesa la cola.
+
+Deduplicación: la clave única (provider, payment_id, status) hace que las
+notificaciones repetidas de un pago sin procesar no agreguen filas, y al
+resolver el estado de un evento, si ese estado ya se había registrado para el
+pago, el evento se descarta. Una vez que el pago llegó a un estado final
+(STATUS_FINALES) las notificaciones nuevas del mismo pago no se registran ni
+se consultan. Así los reintentos de MP no repiten llamadas a la API ni reponen
+el stock dos veces.
+
+Orden: cada estado de pago tiene un rango (pendiente < rechazado < aprobado) y
+el pedido sólo avanza. Una notificación "pending" que llega tarde no pisa un
+pago aprobado, y un rechazo tardío no repone el stock de un pedido pagado. El
+pedido se bloquea con SELECT ... FOR UPDATE mientras se aplica el cambio, así
+dos eventos del mismo pedido nunca se aplican a la vez.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Pedido, PaymentEvent
+from .stock import StockInsuficiente, confirmar_pago, liberar_reserva, restaurar_stock
+
+logger = logging.getLogger(__name__)
+
+# Estado de pago del proveedor -> Pedido.estado_pago
+ESTADO_PAGO_POR_STATUS = {
+    'approved': 'approved',
+    'rejected': 'rejected',
+    'pending': 'pendiente',
+    'in_process': 'pendiente',
+}
+
+# Estados del proveedor después de los cuales el pago ya no cambia el pedido
+STATUS_FINALES = frozenset({
+    'approved', 'rejected', 'cancelled', 'refunded', 'charged_back',
+})
+
+# Un pedido nunca vuelve a un estado de pago de rango menor
+RANGO_ESTADO_PAGO = {
+    'pendiente': 0,
+    'rejected': 1,
+    'approved': 2,
+}
+
+
+def _config(nombre, default):
+    return getattr(settings, f'PAGOS_EVENTOS_{nombre}', default)
+
+
+# ----------------------------------------------------------------------
+# Registro (webhook)
+# ----------------------------------------------------------------------
+
+def _despertar_worker():
+    from .tasks import procesar_eventos_pago
+    try:
+        procesar_eventos_pago.delay()
+    except Exception as e:
+        # Sin broker el evento queda en la tabla: lo toma Beat o el daemon
+        logger.warning(f"No se pudo disparar el procesamiento de pagos: {str(e)}")
+
+
+def _procesar_ahora(provider, payment_id, status):
+    """Sin Celery: procesa el evento recién registrado después del commit."""
+    try:
+        ids = PaymentEvent.objects.filter(
+            provider=provider, payment_id=payment_id, status=status
+        ).values_list('id', flat=True)
+        for evento in reclamar(1, ids=list(ids)):
+            procesar(evento)
+    except Exception as e:
+        # El webhook ya respondió: si algo falla el evento queda para el daemon
+        logger.error(f"Error procesando el pago {payment_id}: {str(e)}")
+
+
+def pago_resuelto(provider, payment_id):
+    """True si el pago ya tiene un evento con estado final."""
+    return PaymentEvent.objects.filter(
+        provider=provider, payment_id=str(payment_id), status__in=STATUS_FINALES
+    ).exists()
+
+
+def registrar_evento(payment_id, payload, provider='mercadopago', status=''):
+    """
+    Registra una notificación de pago. Si ya hay un evento igual (mismo pago
+    y estado) o el pago ya llegó a un estado final no hace nada. Es lo único
+    que corre dentro del webhook.
+    """
+    payment_id = str(payment_id)
+    if not status and pago_resuelto(provider, payment_id):
+        logger.info(f"Pago {payment_id} ya resuelto, se ignora la notificación")
+        return
+
+    PaymentEvent.objects.bulk_create(
+        [PaymentEvent(
+            provider=provider, payment_id=payment_id, status=status, payload=payload
+        )],
+        ignore_conflicts=True,
+    )
+    # Una nueva notificación de un pago cuya consulta se había agotado lo reactiva
+    reintentar(PaymentEvent.objects.filter(
+        provider=provider, payment_id=payment_id, status=status, estado='fallido'
+    ))
+    if getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        # Sin worker de Celery: se procesa acá, pero recién con el evento
+        # guardado, así un error no revierte el registro
+        transaction.on_commit(lambda: _procesar_ahora(provider, payment_id, status))
+    else:
+        transaction.on_commit(_despertar_worker)
+
+
+# ----------------------------------------------------------------------
+# Procesamiento
+# ----------------------------------------------------------------------
+
+def calcular_backoff(intentos):
+    """Segundos hasta el próximo intento: exponencial con tope y algo de jitter."""
+    base = _config('BACKOFF_SEGUNDOS', 30)
+    retraso = min(base * 2 ** max(intentos - 1, 0), _config('BACKOFF_MAXIMO', 3600))
+    return retraso + random.uniform(0, base)
+
+
+def reclamar(limite, ids=None):
+    """
+    Reclama hasta `limite` eventos listos (sólo entre `ids`, si se indican)
+    con SKIP LOCKED y los marca como "procesando" por un tiempo limitado.
+    Cuenta el intento al reclamar.
+    """
+    ahora = timezone.now()
+    listos = PaymentEvent.objects.select_for_update(skip_locked=True).filter(
+        Q(estado='pendiente', proximo_intento__lte=ahora)
+        | Q(estado='procesando', bloqueado_hasta__lte=ahora)
+    )
+    if ids is not None:
+        listos = listos.filter(id__in=ids)
+    with transaction.atomic():
+        ids = list(
+            listos.order_by('recibido', 'id').values_list('id', flat=True)[:limite]
+        )
+        if not ids:
+            return []
+
+        PaymentEvent.objects.filter(id__in=ids).update(
+            estado='procesando',
+            bloqueado_hasta=ahora + timedelta(seconds=_config('BLOQUEO_SEGUNDOS', 300)),
+            intentos=F('intentos') + 1,
+        )
+    return list(PaymentEvent.objects.filter(id__in=ids).order_by('recibido', 'id'))
+
+
+def _consultar_pago(evento):
+    """
+    Completa status y referencia del evento consultando la API del proveedor.
+    Si ya se consultó (p. ej. al reprocesar) no vuelve a llamar.
+    """
+    if evento.status and 'pago' in evento.payload:
+        return evento.payload['pago']
+
+    from .mercadopago_service import MercadoPagoService
+
+    resultado = MercadoPagoService().get_payment_info(evento.payment_id)
+    if not resultado['success']:
+        raise RuntimeError(resultado.get('error') or 'No se pudo consultar el pago')
+
+    pago = resultado['payment']
+    return {
+        'status': pago.get('status') or '',
+        'external_reference': pago.get('external_reference'),
+        'transaction_amount': pago.get('transaction_amount'),
+        'payment_method_id': pago.get('payment_method_id'),
+    }
+
+
+def _aplicar(pedido, estado_pago):
+    """
+    Lleva el pedido (ya bloqueado) al estado de pago indicado, si es un avance.
+    Devuelve True si lo modificó.
+    """
+    if RANGO_ESTADO_PAGO[estado_pago] <= RANGO_ESTADO_PAGO.get(pedido.estado_pago, 0):
+        return False
+
+    if estado_pago == 'approved':
+        pedido.estado_pago = 'approved'
+        pedido.confirmado = True
+        # Convierte la reserva; no-op si el stock ya se descontó
+        try:
+            confirmar_pago(pedido)
+        except StockInsuficiente as e:
+            logger.error(f"Pedido {pedido.id} pagado sin stock: {e}")
+        logger.info(f"Pedido {pedido.id} aprobado")
+
+    elif estado_pago == 'rejected':
+        pedido.estado_pago = 'rejected'
+        liberar_reserva(pedido)
+        if restaurar_stock(pedido):
+            logger.info(f"Pedido {pedido.id} rechazado, stock restaurado")
+        else:
+            logger.info(f"Pedido {pedido.id} rechazado, sin stock que restaurar")
+
+    pedido.save()
+    return True
+
+
+def _resolver(evento, pago):
+    """
+    Registra el estado del pago en el evento y lo aplica al pedido. Corre
+    dentro de una transacción. Devuelve el estado final del evento.
+    """
+    status = pago['status']
+    if evento.status != status:
+        try:
+            with transaction.atomic():
+                PaymentEvent.objects.filter(pk=evento.pk).update(status=status)
+        except IntegrityError:
+            # Este estado del pago ya se había registrado: es un duplicado
+            PaymentEvent.objects.filter(pk=evento.pk).delete()
+            logger.info(f"Pago {evento.payment_id} ({status}) duplicado, se descarta")
+            return None
+        evento.status = status
+    evento.payload = {**evento.payload, 'pago': pago}
+
+    estado_pago = ESTADO_PAGO_POR_STATUS.get(status)
+    if estado_pago is None:
+        evento.error = f'Estado de pago sin efecto: {status}'
+        return 'ignorado'
+
+    try:
+        pedido_id = int(pago.get('external_reference'))
+    except (TypeError, ValueError):
+        evento.error = f"External reference inválido: {pago.get('external_reference')}"
+        return 'ignorado'
+
+    pedido = Pedido.objects.select_for_update().filter(pk=pedido_id).first()
+    if pedido is None:
+        evento.error = f'Pedido no encontrado: {pedido_id}'
+        return 'ignorado'
+
+    evento.pedido = pedido
+    if not _aplicar(pedido, estado_pago):
+        logger.info(
+            f"Pedido {pedido.id}: pago {status} no cambia el estado "
+            f"{pedido.estado_pago}"
+        )
+    return 'procesado'
+
+
+def procesar(evento):
+    """Procesa un evento reclamado y registra el resultado. Devuelve su estado final."""
+    # Encolado antes de que otro evento del mismo pago llegara a un estado final
+    if not evento.status and pago_resuelto(evento.provider, evento.payment_id):
+        PaymentEvent.objects.filter(pk=evento.pk).delete()
+        logger.info(
+            f"Pago {evento.payment_id} ya resuelto, se descarta el evento {evento.id}"
+        )
+        return 'duplicado'
+
+    evento.error = ''
+    try:
+        pago = _consultar_pago(evento)
+        with transaction.atomic():
+            estado = _resolver(evento, pago)
+            if estado is None:
+                return 'duplicado'
+            cambios = {
+                'estado': estado,
+                'procesado': timezone.now(),
+                'status': evento.status,
+                'payload': evento.payload,
+                'pedido': evento.pedido,
+                'error': evento.error,
+            }
+            PaymentEvent.objects.filter(pk=evento.pk).update(
+                bloqueado_hasta=None, **cambios
+            )
+    except Exception as e:
+        error = f'{type(e).__name__}: {str(e)}'
+        if evento.intentos >= _config('MAX_INTENTOS', 8):
+            cambios = {'estado': 'fallido', 'error': error}
+            logger.error(
+                f"Evento de pago {evento.id} fallido tras {evento.intentos} "
+                f"intentos: {error}"
+            )
+        else:
+            cambios = {
+                'estado': 'pendiente',
+                'error': error,
+                'proximo_intento': (
+                    timezone.now()
+                    + timedelta(seconds=calcular_backoff(evento.intentos))
+                ),
+            }
+            logger.warning(
+                f"Evento de pago {evento.id} falló, intento {evento.intentos}: {error}"
+            )
+        PaymentEvent.objects.filter(pk=evento.pk).update(
+            bloqueado_hasta=None, **cambios
+        )
+
+    for campo, valor in cambios.items():
+        setattr(evento, campo, valor)
+    return evento.estado
+
+
+def procesar_pendientes(lote=50, maximo=None):
+    """
+    Procesa eventos hasta vaciar la cola (o llegar a `maximo`). Devuelve
+    {estado final: cantidad}.
+    """
+    resumen = {}
+    procesados = 0
+    while maximo is None or procesados < maximo:
+        limite = lote if maximo is None else min(lote, maximo - procesados)
+        eventos = reclamar(limite)
+        if not eventos:
+            break
+        for evento in eventos:
+            estado = procesar(evento)
+            resumen[estado] = resumen.get(estado, 0) + 1
+        procesados += len(eventos)
+    return resumen
+
+
+def reintentar(eventos):
+    """
+    Vuelve a encolar los eventos indicados (queryset) para procesarlos ya,
+    con los intentos en cero. Devuelve la cantidad encolada.
+    """
+    return eventos.exclude(estado='procesando').update(
+        estado='pendiente', intentos=0, proximo_intento=timezone.now(),
+        bloqueado_hasta=None,
+    )
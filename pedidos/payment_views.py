@@ -15,6 +15,8 @@ import os
 from .models import Pedido
 from .mercadopago_service import MercadoPagoService
 from .serializers import PedidoReadSerializer
+from .pagos import registrar_evento
+from .stock import StockInsuficiente, confirmar_pago
 
 logger = logging.getLogger(__name__)
 
@@ -67,8 +69,12 @@ class MercadoPagoWebhookView(APIView):
     permission_classes = [AllowAny]
     
     def post(self, request):
+        """
+        Registra la notificación y responde de inmediato. La consulta a la API
+        de MP y la actualización del pedido las hace un worker (ver
+        pedidos.pagos); las notificaciones repetidas se descartan.
+        """
         try:
-            # Log de la notificación recibida
             logger.info(f"Webhook received: {request.body}")
             
             # Parsear datos del webhook
@@ -76,55 +82,29 @@ class MercadoPagoWebhookView(APIView):
                 notification_data = json.loads(request.body)
             except json.JSONDecodeError:
                 notification_data = request.data
-            
-            # Procesar notificación
-            mp_service = MercadoPagoService()
-            result = mp_service.process_webhook_notification(notification_data)
-            
-            if result['success']:
-                # Buscar el pedido correspondiente
-                external_reference = result.get('external_reference')
-                
-                if external_reference:
-                    try:
-                        pedido = Pedido.objects.get(id=int(external_reference))
-                        
-                        # Actualizar estado del pedido según el pago
-                        payment_status = result.get('status')
-                        
-                        with transaction.atomic():
-                            if payment_status == 'approved':
-                                pedido.estado_pago = 'approved'
-                                pedido.confirmado = True
-                                logger.info(f"Pedido {pedido.id} aprobado")
-                                
-                            elif payment_status == 'rejected':
-                                pedido.estado_pago = 'rejected'
-                                # Restaurar stock si el pago fue rechazado
-                                for item in pedido.items.all():
-                                    item.producto.stock += item.cantidad
-                                    item.producto.save()
-                                logger.info(f"Pedido {pedido.id} rechazado, stock restaurado")
-                                
-                            elif payment_status in ['pending', 'in_process']:
-                                pedido.estado_pago = 'pendiente'
-                                logger.info(f"Pedido {pedido.id} pendiente")
-                            
-                            pedido.save()
-                        
-                        return HttpResponse("OK", status=200)
-                        
-                    except Pedido.DoesNotExist:
-                        logger.error(f"Pedido no encontrado: {external_reference}")
-                        return HttpResponse("Pedido no encontrado", status=404)
-                    
-                    except ValueError:
-                        logger.error(f"External reference inválido: {external_reference}")
-                        return HttpResponse("Reference inválido", status=400)
+            if not isinstance(notification_data, dict):
+                notification_data = {}
+            
+            # Formato webhook: {"type": "payment", "data": {"id": ...}}
+            # Formato IPN: ?topic=payment&id=...
+            tipo = (
+                notification_data.get('type')
+                or request.GET.get('type')
+                or request.GET.get('topic')
+            )
+            payment_id = (
+                (notification_data.get('data') or {}).get('id')
+                or request.GET.get('data.id')
+                or request.GET.get('id')
+            )
+            
+            if tipo == 'payment' and payment_id:
+                registrar_evento(payment_id, notification_data)
             
             return HttpResponse("OK", status=200)
             
         except Exception as e:
+            # MP reintenta las notificaciones que no recibieron 200
             logger.error(f"Error processing webhook: {str(e)}")
             return HttpResponse("Error interno", status=500)
 
@@ -157,9 +137,16 @@ class PaymentSuccessView(APIView):
                     payment_info = payment_result['payment']
                     # Actualizar estado del pedido según el estado del pago
                     if payment_info.get('status') == 'approved':
-                        pedido.estado_pago = 'approved'
-                        pedido.confirmado = True
-                        pedido.save()
+                        with transaction.atomic():
+                            try:
+                                confirmar_pago(pedido)
+                            except StockInsuficiente as e:
+                                logger.error(
+                                    f"❌ Pedido #{pedido_id} pagado sin stock: {e}"
+                                )
+                            pedido.estado_pago = 'approved'
+                            pedido.confirmado = True
+                            pedido.save()
                         logger.info(f"✅ Pedido #{pedido_id} marcado como aprobado")
             
             # Redirigir al frontend
@@ -305,6 +292,10 @@ class PayPalSuccessView(APIView):
                 if execute_result['success']:
                     # Actualizar estado del pedido
                     with transaction.atomic():
+                        try:
+                            confirmar_pago(pedido)
+                        except StockInsuficiente as e:
+                            logger.error(f"❌ Pedido #{pedido_id} pagado sin stock: {e}")
                         pedido.estado_pago = 'approved'
                         pedido.confirmado = True
                         pedido.save()
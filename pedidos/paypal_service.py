@@ -8,11 +8,42 @@ from decimal import Decimal
 import logging
 import os
 
+from core.http import cliente
+
 from .currency_service import CurrencyService
+from .models import Pedido
 
 logger = logging.getLogger(__name__)
 
 
+class PooledApi(paypalrestsdk.Api):
+    """
+    Api del SDK de PayPal sobre el cliente HTTP compartido (el SDK usa
+    requests.request suelto, sin keep-alive).
+    """
+
+    def http_call(self, url, method, **kwargs):
+        response = cliente('paypal').request(
+            method, url, proxies=self.proxies, **kwargs
+        )
+        logger.debug(f"PayPal {method} {url}: {response.status_code}")
+        return self.handle_response(response, response.content.decode('utf-8'))
+
+
+_apis = {}
+
+
+def get_api(config):
+    """
+    Api compartida por configuración: así también se reutiliza el token
+    OAuth entre requests en lugar de pedir uno por cada PayPalService.
+    """
+    clave = tuple(sorted(config.items()))
+    if clave not in _apis:
+        _apis[clave] = PooledApi(config)
+    return _apis[clave]
+
+
 class PayPalService:
     """
     Servicio para integración con PayPal
@@ -27,7 +58,7 @@ class PayPalService:
             "client_secret": settings.PAYPAL['CLIENT_SECRET']
         }
         
-        paypalrestsdk.configure(paypal_config)
+        self.api = get_api(paypal_config)
         
         # Log de configuración (sin exponer credenciales completas)
         client_id_preview = settings.PAYPAL['CLIENT_ID'][:15] + "..." if settings.PAYPAL['CLIENT_ID'] else "NONE"
@@ -61,13 +92,18 @@ class PayPalService:
             logger.info(f"💳 Creando pago PayPal para pedido #{pedido.id}")
             logger.info(f"🔗 Backend URL: {backend_url}")
             
+            # Una sola cotización para todo el pago (queda registrada en el pedido)
+            cotizacion = self.currency_service.get_cotizacion()
+            
             # Items del pedido (convertir a USD)
             items = []
             total_ars = Decimal('0.00')
             
             for item in pedido.items.all():
                 # Convertir precio a USD
-                conversion = self.currency_service.convert_ars_to_usd(item.precio)
+                conversion = self.currency_service.convert_ars_to_usd(
+                    item.precio, cotizacion=cotizacion
+                )
                 price_usd = conversion['amount_usd']
                 
                 items.append({
@@ -103,7 +139,9 @@ class PayPalService:
             
             # Agregar envío si tiene costo
             if shipping_cost_ars > 0:
-                shipping_conversion = self.currency_service.convert_ars_to_usd(shipping_cost_ars)
+                shipping_conversion = self.currency_service.convert_ars_to_usd(
+                    shipping_cost_ars, cotizacion=cotizacion
+                )
                 shipping_usd = shipping_conversion['amount_usd']
                 
                 items.append({
@@ -130,7 +168,9 @@ class PayPalService:
                 }
             
             # Obtener información de conversión
-            conversion_info = self.currency_service.get_conversion_info()
+            conversion_info = self.currency_service.get_conversion_info(
+                cotizacion=cotizacion
+            )
             
             logger.info(f"💰 Total: ${total_ars} ARS → ${total_usd} USD")
             logger.info(f"💱 Tasa efectiva: ${conversion_info['effective_rate']} ARS/USD")
@@ -155,7 +195,7 @@ class PayPalService:
                     },
                     "description": f"Pedido #{pedido.numero_pedido} - Florería Cristina"
                 }]
-            })
+            }, api=self.api)
             
             # Crear el pago
             logger.info("📤 Enviando solicitud a PayPal...")
@@ -171,6 +211,12 @@ class PayPalService:
                         logger.info(f"🔗 URL de aprobación: {approval_url}")
                         break
                 
+                if cotizacion is not None:
+                    Pedido.objects.filter(pk=pedido.pk).update(
+                        cotizacion_usd=cotizacion
+                    )
+                    pedido.cotizacion_usd = cotizacion
+                
                 if not approval_url:
                     logger.error("❌ No se encontró URL de aprobación")
                     return {
@@ -188,7 +234,12 @@ class PayPalService:
                         'official_rate': float(conversion_info['official_rate']),
                         'exchange_rate': float(conversion_info['official_rate']),
                         'effective_rate': float(conversion_info['effective_rate']),
-                        'margin_percentage': float(conversion_info['margin_percentage'])
+                        'margin_percentage': float(
+                            conversion_info['margin_percentage']
+                        ),
+                        'rate_source': conversion_info['source'],
+                        'rate_date': conversion_info['last_update'],
+                        'cotizacion_id': conversion_info['cotizacion_id']
                     }
                 }
             else:
@@ -226,7 +277,7 @@ class PayPalService:
         try:
             logger.info(f"⚡ Ejecutando pago PayPal: {payment_id}")
             
-            payment = paypalrestsdk.Payment.find(payment_id)
+            payment = paypalrestsdk.Payment.find(payment_id, api=self.api)
             
             if payment.execute({"payer_id": payer_id}):
                 logger.info(f"✅ Pago ejecutado exitosamente: {payment_id}")
@@ -269,7 +320,7 @@ class PayPalService:
         try:
             logger.info(f"🔍 Obteniendo detalles del pago: {payment_id}")
             
-            payment = paypalrestsdk.Payment.find(payment_id)
+            payment = paypalrestsdk.Payment.find(payment_id, api=self.api)
             
             logger.info(f"✅ Pago encontrado: {payment.id} - Estado: {payment.state}")
             
@@ -1,9 +1,11 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.utils import timezone
 from datetime import date, timedelta
 from decimal import Decimal
 
 from .models import Pedido, PedidoItem, MetodoEnvio
+from .stock import StockInsuficiente, descontar_stock, reservar_stock, stock_disponible
 from catalogo.models import Producto
 from carrito.cart import Cart
 
@@ -144,7 +146,10 @@ class CheckoutSerializer(serializers.Serializer):
         
         if cart.is_empty:
             raise serializers.ValidationError("El carrito está vacío")
-        
+
+        # El carrito guarda el precio que vio el cliente: se cobra el vigente
+        cart.verificar_precios()
+
         # Obtener método de envío
         metodo_envio_id = validated_data.pop('metodo_envio_id')
         metodo_envio_obj = MetodoEnvio.objects.get(id=metodo_envio_id)
@@ -168,41 +173,38 @@ class CheckoutSerializer(serializers.Serializer):
         else:
             pedido_data['anonimo'] = True
         
-        pedido = Pedido.objects.create(**pedido_data)
-        
-        # Crear items del pedido desde el carrito
-        total_productos = Decimal('0.00')
-        for item in cart:
-            producto = item['producto']
-            cantidad = item['quantity']
-            precio_unitario = item['price']
+        with transaction.atomic():
+            pedido = Pedido.objects.create(**pedido_data)
             
-            # Verificar stock disponible
-            if producto.stock < cantidad:
-                pedido.delete()  # Eliminar pedido si no hay stock
-                raise serializers.ValidationError(
-                    f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}"
+            # Crear items del pedido desde el carrito
+            total_productos = Decimal('0.00')
+            for item in cart:
+                precio_unitario = item['price']
+                PedidoItem.objects.create(
+                    pedido=pedido,
+                    producto=item['producto'],
+                    cantidad=item['quantity'],
+                    precio=precio_unitario
                 )
+                total_productos += precio_unitario * item['quantity']
             
-            # Crear item del pedido
-            PedidoItem.objects.create(
-                pedido=pedido,
-                producto=producto,
-                cantidad=cantidad,
-                precio=precio_unitario
-            )
-            
-            total_productos += precio_unitario * cantidad
+            # Pagos online: el stock queda reservado hasta que se apruebe el
+            # pago o venza la reserva. Transferencia: se descuenta ahora.
+            # Si algún producto no alcanza se revierte todo el pedido
+            try:
+                if pedido.medio_pago in ('mercadopago', 'paypal'):
+                    reservar_stock(pedido)
+                else:
+                    descontar_stock(pedido)
+            except StockInsuficiente as e:
+                raise serializers.ValidationError(
+                    f"Stock insuficiente para {e.producto}. Disponible: {e.disponible}"
+                )
             
-            # Reducir stock
-            producto.stock -= cantidad
-            producto.save()
-        
-        # Calcular total final (productos + envío)
-        # Usar el costo_envio que viene del frontend en lugar del metodo_envio.costo
-        from decimal import Decimal
-        pedido.total = total_productos + Decimal(str(costo_envio))
-        pedido.save()
+            # Calcular total final (productos + envío)
+            # Usar el costo_envio que viene del frontend en lugar del metodo_envio.costo
+            pedido.total = total_productos + Decimal(str(costo_envio))
+            pedido.save()
         
         # Limpiar carrito después de crear el pedido
         cart.clear()
@@ -220,17 +222,22 @@ class ValidateStockSerializer(serializers.Serializer):
         if cart.is_empty:
             raise serializers.ValidationError("El carrito está vacío")
         
+        items = list(cart)
+        # Stock menos lo reservado por pagos online en curso
+        disponibles = stock_disponible(item['producto'].id for item in items)
+        
         stock_errors = []
-        for item in cart:
+        for item in items:
             producto = item['producto']
             cantidad = item['quantity']
+            disponible = disponibles.get(producto.id, producto.stock)
             
             if not producto.is_active:
                 stock_errors.append(f"{producto.nombre} ya no está disponible")
-            elif producto.stock < cantidad:
+            elif disponible < cantidad:
                 stock_errors.append(
                     f"Stock insuficiente para {producto.nombre}. "
-                    f"Solicitado: {cantidad}, Disponible: {producto.stock}"
+                    f"Solicitado: {cantidad}, Disponible: {max(disponible, 0)}"
                 )
         
         if stock_errors:
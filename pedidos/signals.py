@@ -0,0 +1,16 @@
+"""
+Señales propias de los pedidos.
+"""
+from django.db.models.signals import ModelSignal
+
+# Se envía después de guardar un pedido cuyo estado cambió, tanto desde
+# Pedido.save() como desde Pedido.objects.filter(...).cambiar_estado().
+# Al ser una ModelSignal acepta sender='pedidos.Pedido' en @receiver.
+#
+# Argumentos:
+#     sender: la clase Pedido
+#     pedido: la instancia, ya guardada
+#     anterior: estado previo (str)
+#     nuevo: estado actual (str)
+#     en_lote: True si viene de un cambio masivo
+estado_changed = ModelSignal(use_caching=True)
@@ -0,0 +1,262 @@
+"""
+Descuento y restauración de stock de los pedidos.
+
+Todo movimiento de stock de un pedido pasa por acá:
+
+- Las filas de Producto afectadas se bloquean con SELECT ... FOR UPDATE en
+  orden de id, así dos checkouts concurrentes nunca se bloquean en orden
+  cruzado (deadlock).
+- Con las filas bloqueadas se verifica el stock y se modifica con un único
+  UPDATE por pedido (stock = stock - n), nunca con leer-modificar-guardar.
+- Cada operación es idempotente por pedido gracias a `Pedido.stock_descontado`:
+  confirmar dos veces o recibir dos veces el webhook de un pago rechazado no
+  descuenta ni repone el stock dos veces.
+
+Mientras se espera un pago online, el pedido no descuenta stock sino que lo
+reserva por un tiempo limitado (StockHold). El stock disponible es el stock
+menos las reservas activas no vencidas de otros pedidos.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from catalogo.models import Producto
+
+from .models import Pedido, StockHold
+
+logger = logging.getLogger(__name__)
+
+
+class StockInsuficiente(Exception):
+    """No hay stock para alguno de los productos del pedido."""
+
+    def __init__(self, producto, disponible, solicitado):
+        self.producto = producto
+        self.disponible = disponible
+        self.solicitado = solicitado
+        super().__init__(
+            f"Stock insuficiente para {producto}. "
+            f"Disponible: {disponible}, solicitado: {solicitado}"
+        )
+
+
+def _cantidades(pedido):
+    """{producto_id: cantidad total} de los items del pedido."""
+    cantidades = Counter()
+    for producto_id, cantidad in pedido.items.values_list('producto_id', 'cantidad'):
+        cantidades[producto_id] += cantidad
+    return cantidades
+
+
+def _bloquear(cantidades):
+    """SELECT ... FOR UPDATE de los productos, siempre en orden de id."""
+    return list(
+        Producto.objects.select_for_update().filter(
+            pk__in=list(cantidades)
+        ).order_by('pk').values_list('pk', 'nombre', 'stock')
+    )
+
+
+def stock_disponible(producto_ids, excluir_pedido=None):
+    """
+    {producto_id: stock - reservas activas} en una sola consulta (la suma de
+    reservas usa el índice stockhold_producto_idx).
+    """
+    reservas = StockHold.objects.filter(
+        producto=OuterRef('pk'), estado='activo', expira__gt=timezone.now()
+    )
+    if excluir_pedido is not None:
+        reservas = reservas.exclude(pedido_id=excluir_pedido.pk)
+    reservado = reservas.values('producto').annotate(
+        total=Sum('cantidad')
+    ).values('total')
+
+    return dict(
+        Producto.objects.filter(pk__in=list(producto_ids)).annotate(
+            reservado=Coalesce(Subquery(reservado), 0)
+        ).values_list('pk', F('stock') - F('reservado'))
+    )
+
+
+def _verificar_disponible(pedido, cantidades):
+    """
+    Bloquea los productos y verifica el stock no reservado por otros pedidos.
+    Devuelve las filas bloqueadas (pk, nombre, stock).
+    """
+    bloqueados = _bloquear(cantidades)
+    disponible = stock_disponible(cantidades, excluir_pedido=pedido)
+
+    for producto_id, nombre, _ in bloqueados:
+        if disponible[producto_id] < cantidades[producto_id]:
+            raise StockInsuficiente(
+                nombre, max(disponible[producto_id], 0), cantidades[producto_id]
+            )
+    return bloqueados
+
+
+def _actualizar_stock(cantidades, signo):
+    """Un solo UPDATE para todos los productos: stock = stock + signo * n."""
+    delta = Case(
+        *[
+            When(pk=producto_id, then=Value(cantidad))
+            for producto_id, cantidad in cantidades.items()
+        ],
+        output_field=IntegerField(),
+    )
+    nuevo_stock = F('stock') - delta if signo < 0 else F('stock') + delta
+    return Producto.objects.filter(pk__in=list(cantidades)).update(stock=nuevo_stock)
+
+
+def _invalidar_catalogo(bloqueados, cantidades, signo):
+    """
+    Los UPDATE no disparan post_save: si algún producto pasó de tener stock a
+    no tener (o al revés) se invalida la caché del catálogo. Las demás ventas
+    no la tocan; el número de stock publicado se refresca al vencer la caché.
+    """
+    for producto_id, _, anterior in bloqueados:
+        nuevo = anterior + signo * cantidades[producto_id]
+        if (anterior > 0) != (nuevo > 0):
+            from catalogo.cache import invalidar_catalogo
+            transaction.on_commit(invalidar_catalogo)
+            return
+
+
+def descontar_stock(pedido):
+    """
+    Descuenta el stock de los items del pedido.
+
+    Returns:
+        True si se descontó ahora, False si ya estaba descontado.
+
+    Raises:
+        StockInsuficiente: si algún producto no alcanza; no se descuenta nada.
+    """
+    with transaction.atomic():
+        # Marca y verificación en un paso: sólo una llamada concurrente gana
+        marcado = Pedido.objects.filter(
+            pk=pedido.pk, stock_descontado=False
+        ).update(stock_descontado=True)
+        if not marcado:
+            # Se refleja en la instancia para que un save() posterior no lo pise
+            pedido.stock_descontado = True
+            return False
+
+        cantidades = _cantidades(pedido)
+        if cantidades:
+            bloqueados = _verificar_disponible(pedido, cantidades)
+            _actualizar_stock(cantidades, -1)
+            _invalidar_catalogo(bloqueados, cantidades, -1)
+
+    pedido.stock_descontado = True
+    logger.info(f"Stock descontado para pedido {pedido.pk}: {dict(cantidades)}")
+    return True
+
+
+def restaurar_stock(pedido):
+    """
+    Repone el stock descontado por el pedido.
+
+    Returns:
+        True si se repuso ahora, False si no había nada que reponer.
+    """
+    with transaction.atomic():
+        desmarcado = Pedido.objects.filter(
+            pk=pedido.pk, stock_descontado=True
+        ).update(stock_descontado=False)
+        if not desmarcado:
+            pedido.stock_descontado = False
+            return False
+
+        cantidades = _cantidades(pedido)
+        if cantidades:
+            bloqueados = _bloquear(cantidades)
+            _actualizar_stock(cantidades, +1)
+            _invalidar_catalogo(bloqueados, cantidades, +1)
+
+    pedido.stock_descontado = False
+    logger.info(f"Stock restaurado para pedido {pedido.pk}: {dict(cantidades)}")
+    return True
+
+
+# ----------------------------------------------------------------------
+# Reservas temporales (pagos online)
+# ----------------------------------------------------------------------
+
+def reservar_stock(pedido, minutos=None):
+    """
+    Reserva el stock de los items del pedido hasta que se apruebe el pago o
+    venza la reserva (settings.STOCK_HOLD_MINUTES).
+
+    Returns:
+        True si se creó la reserva, False si el pedido ya tenía una.
+
+    Raises:
+        StockInsuficiente: si el stock libre no alcanza; no se reserva nada.
+    """
+    minutos = minutos or getattr(settings, 'STOCK_HOLD_MINUTES', 30)
+
+    with transaction.atomic():
+        # El bloqueo del pedido serializa reservas duplicadas del mismo pedido
+        Pedido.objects.select_for_update().get(pk=pedido.pk)
+        if pedido.holds.exists():
+            return False
+
+        cantidades = _cantidades(pedido)
+        if cantidades:
+            _verificar_disponible(pedido, cantidades)
+            expira = timezone.now() + timedelta(minutes=minutos)
+            StockHold.objects.bulk_create([
+                StockHold(
+                    pedido=pedido, producto_id=producto_id, cantidad=cantidad,
+                    expira=expira,
+                )
+                for producto_id, cantidad in cantidades.items()
+            ])
+
+    logger.info(
+        f"Stock reservado para pedido {pedido.pk} por {minutos} minutos: "
+        f"{dict(cantidades)}"
+    )
+    return True
+
+
+def liberar_reserva(pedido):
+    """
+    Libera las reservas activas del pedido (pago rechazado o cancelado).
+    Idempotente: devuelve la cantidad de reservas liberadas ahora.
+    """
+    return pedido.holds.filter(estado='activo').update(
+        estado='liberado', actualizado=timezone.now()
+    )
+
+
+def confirmar_pago(pedido):
+    """
+    Pago aprobado: descuenta el stock (si no se había descontado) y da por
+    cumplidas las reservas del pedido, en una sola transacción.
+
+    Raises:
+        StockInsuficiente: si la reserva había vencido y el stock ya no alcanza.
+    """
+    with transaction.atomic():
+        descontado = descontar_stock(pedido)
+        pedido.holds.filter(estado='activo').update(
+            estado='convertido', actualizado=timezone.now()
+        )
+    return descontado
+
+
+def liberar_reservas_vencidas():
+    """Marca como liberadas las reservas activas vencidas. Idempotente."""
+    liberadas = StockHold.objects.filter(
+        estado='activo', expira__lte=timezone.now()
+    ).update(estado='liberado', actualizado=timezone.now())
+    if liberadas:
+        logger.info(f"{liberadas} reservas de stock vencidas liberadas")
+    return liberadas
@@ -0,0 +1,54 @@
+"""
+Tareas de Celery de pedidos
+"""
+
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def liberar_reservas_stock_vencidas():
+    """
+    Libera las reservas de stock (StockHold) de pagos online que vencieron
+    sin aprobarse. Es idempotente, así que puede correr con cualquier frecuencia.
+    """
+    from .stock import liberar_reservas_vencidas
+
+    return liberar_reservas_vencidas()
+
+
+@shared_task
+def procesar_eventos_pago():
+    """
+    Procesa las notificaciones de pago registradas por los webhooks (ver
+    pedidos.pagos). Se dispara con cada webhook y Beat la repite para los
+    reintentos.
+    """
+    from .pagos import procesar_pendientes
+
+    return procesar_pendientes(maximo=500)
+
+
+@shared_task
+def actualizar_cotizacion_dolar():
+    """
+    Actualiza la cotización del dólar antes de que venza, para que ningún
+    checkout de PayPal espere a los proveedores (ver pedidos.currency_service).
+    """
+    from .currency_service import CurrencyService
+
+    cotizacion = CurrencyService().actualizar()
+    return str(cotizacion.valor) if cotizacion else None
+
+
+@shared_task
+def recalcular_estadisticas_pedidos():
+    """
+    Reconstruye los contadores de PedidoStats desde la tabla de pedidos, por
+    si algún UPDATE masivo los desfasó (ver pedidos.estadisticas).
+    """
+    from .estadisticas import recalcular
+
+    return recalcular()['total']
@@ -1,3 +1,936 @@
-from django.test import TestCase
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalogo.cache import get_generacion
+from catalogo.models import Producto
+from notificaciones import outbox
+from notificaciones.models import MensajeOutbox, PlantillaNotificacion
+
+from . import estadisticas
+from .busqueda import buscar_pedidos, telefono_normalizado
+from .currency_service import CurrencyService
+from .models import (
+    CotizacionDolar, PaymentEvent, Pedido, PedidoItem, PedidoStats, StockHold
+)
+from .pagos import procesar_pendientes
+from .signals import estado_changed
+from .stock import (
+    StockInsuficiente,
+    confirmar_pago,
+    descontar_stock,
+    liberar_reserva,
+    liberar_reservas_vencidas,
+    reservar_stock,
+    restaurar_stock,
+    stock_disponible,
+)
+
+
+def crear_pedido(*items):
+    pedido = Pedido.objects.create(
+        dedicatoria='',
+        nombre_destinatario='Ana',
+        direccion='Calle 123',
+        telefono_destinatario='',
+        fecha_entrega=date.today(),
+        franja_horaria='mañana',
+    )
+    for producto, cantidad in items:
+        PedidoItem.objects.create(
+            pedido=pedido, producto=producto, cantidad=cantidad, precio=producto.precio
+        )
+    return pedido
+
+
+def crear_producto(sku, stock):
+    return Producto.objects.create(
+        nombre=f'Producto {sku}', descripcion='-', sku=sku, precio=1000, stock=stock
+    )
+
+
+class StockPedidoTests(TestCase):
+
+    def setUp(self):
+        self.rosas = crear_producto('ROSAS', stock=5)
+        self.lirios = crear_producto('LIRIOS', stock=2)
+
+    def stock(self, producto):
+        producto.refresh_from_db(fields=['stock'])
+        return producto.stock
+
+    def test_descontar_es_idempotente(self):
+        pedido = crear_pedido((self.rosas, 2), (self.lirios, 1), (self.rosas, 1))
+
+        self.assertTrue(descontar_stock(pedido))
+        self.assertFalse(descontar_stock(pedido))
+
+        self.assertEqual(self.stock(self.rosas), 2)
+        self.assertEqual(self.stock(self.lirios), 1)
+
+    def test_sin_stock_no_descuenta_nada(self):
+        pedido = crear_pedido((self.rosas, 1), (self.lirios, 3))
+
+        with self.assertRaises(StockInsuficiente):
+            descontar_stock(pedido)
+
+        pedido.refresh_from_db()
+        self.assertFalse(pedido.stock_descontado)
+        self.assertEqual(self.stock(self.rosas), 5)
+        self.assertEqual(self.stock(self.lirios), 2)
+
+    def test_restaurar_es_idempotente(self):
+        pedido = crear_pedido((self.rosas, 3))
+        descontar_stock(pedido)
+
+        self.assertTrue(restaurar_stock(pedido))
+        self.assertFalse(restaurar_stock(pedido))
+        self.assertEqual(self.stock(self.rosas), 5)
+
+    def test_restaurar_sin_descontar_no_hace_nada(self):
+        pedido = crear_pedido((self.rosas, 3))
+
+        self.assertFalse(restaurar_stock(pedido))
+        self.assertEqual(self.stock(self.rosas), 5)
+
+    def test_cancelar_pedido_confirmado_repone_una_vez(self):
+        pedido = crear_pedido((self.rosas, 2))
+        descontar_stock(pedido)
+        pedido.confirmado = True
+        pedido.save()
+
+        pedido.cancelar_pedido()
+        restaurar_stock(pedido)
+
+        self.assertEqual(self.stock(self.rosas), 5)
+
+    def test_invalida_el_catalogo_solo_al_agotarse_o_reponerse(self):
+        def generacion_tras(operacion, pedido):
+            with self.captureOnCommitCallbacks(execute=True):
+                operacion(pedido)
+            return get_generacion()
+
+        inicial = get_generacion()
+        parcial = crear_pedido((self.rosas, 2))
+        self.assertEqual(generacion_tras(descontar_stock, parcial), inicial)
+
+        agota = crear_pedido((self.lirios, 2))
+        self.assertEqual(generacion_tras(descontar_stock, agota), inicial + 1)
+        self.assertEqual(generacion_tras(restaurar_stock, agota), inicial + 2)
+        self.assertEqual(generacion_tras(restaurar_stock, parcial), inicial + 2)
+
+
+class ReservaStockTests(TestCase):
+
+    def setUp(self):
+        self.producto = crear_producto('RESERVA', stock=3)
+
+    def disponible(self):
+        return stock_disponible([self.producto.pk])[self.producto.pk]
+
+    def test_reserva_descuenta_del_disponible(self):
+        pedido = crear_pedido((self.producto, 2))
+
+        self.assertTrue(reservar_stock(pedido))
+        self.assertFalse(reservar_stock(pedido))
+
+        self.assertEqual(self.disponible(), 1)
+        with self.assertRaises(StockInsuficiente):
+            reservar_stock(crear_pedido((self.producto, 2)))
+
+    def test_pago_aprobado_convierte_la_reserva(self):
+        pedido = crear_pedido((self.producto, 2))
+        reservar_stock(pedido)
+
+        confirmar_pago(pedido)
+        confirmar_pago(pedido)
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+        self.assertEqual(self.disponible(), 1)
+        self.assertEqual(pedido.holds.get().estado, 'convertido')
+
+    def test_liberar_es_idempotente(self):
+        pedido = crear_pedido((self.producto, 2))
+        reservar_stock(pedido)
+
+        self.assertEqual(liberar_reserva(pedido), 1)
+        self.assertEqual(liberar_reserva(pedido), 0)
+        self.assertEqual(self.disponible(), 3)
+
+    def test_reservas_vencidas(self):
+        pedido = crear_pedido((self.producto, 2))
+        reservar_stock(pedido)
+        StockHold.objects.update(expira=timezone.now() - timedelta(minutes=1))
+
+        # Vencida ya no cuenta, aunque la tarea todavía no haya corrido
+        self.assertEqual(self.disponible(), 3)
+        self.assertEqual(liberar_reservas_vencidas(), 1)
+        self.assertEqual(liberar_reservas_vencidas(), 0)
+
+    def test_descontar_respeta_reservas_de_otros_pedidos(self):
+        reservar_stock(crear_pedido((self.producto, 2)))
+
+        with self.assertRaises(StockInsuficiente):
+            descontar_stock(crear_pedido((self.producto, 2)))
+
+
+class OutboxConfirmacionTests(TestCase):
+
+    def setUp(self):
+        # Los pedidos de invitados registran la notificación a nombre del admin
+        User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        PlantillaNotificacion.objects.create(
+            tipo='pedido_confirmado',
+            canal='email',
+            asunto='Pedido #{pedido_id}',
+            mensaje='Hola {nombre}',
+        )
+        self.pedido = crear_pedido((crear_producto('OUTBOX', stock=5), 1))
+        self.pedido.email_comprador = 'ana@example.com'
+        self.pedido.nombre_comprador = 'Ana'
+        self.pedido.save()
+
+    def test_confirmar_encola_sin_enviar(self):
+        exito, _ = self.pedido.confirmar_pedido()
+
+        self.assertTrue(exito)
+        self.assertEqual(len(mail.outbox), 0)
+        mensaje = MensajeOutbox.objects.get()
+        self.assertEqual(
+            (mensaje.canal, mensaje.estado, mensaje.pedido_id),
+            ('email', 'pendiente', self.pedido.id),
+        )
+
+        self.assertEqual(outbox.despachar(), 1)
+        self.assertEqual(outbox.despachar(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, f'Pedido #{self.pedido.id}')
+        self.assertEqual(MensajeOutbox.objects.get().estado, 'enviado')
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sin_celery_envia_al_confirmar_el_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            exito, _ = self.pedido.confirmar_pedido()
+            # Nada sale antes del commit
+            self.assertEqual(len(mail.outbox), 0)
+
+        self.assertTrue(exito)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(MensajeOutbox.objects.get().estado, 'enviado')
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sin_celery_un_fallo_queda_para_el_daemon(self):
+        caido = mock.Mock(side_effect=ConnectionError('SMTP caído'))
+        with mock.patch.dict(outbox.ENVIOS, {'email': caido}):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.pedido.confirmar_pedido()
+
+        mensaje = MensajeOutbox.objects.get()
+        self.assertEqual((mensaje.estado, mensaje.intentos), ('pendiente', 1))
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_con_celery_despierta_al_worker(self):
+        with mock.patch('notificaciones.tasks.despachar_outbox.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.pedido.confirmar_pedido()
+
+        delay.assert_called_once_with()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(MensajeOutbox.objects.get().estado, 'pendiente')
+
+    def test_sin_stock_no_encola(self):
+        PedidoItem.objects.filter(pedido=self.pedido).update(cantidad=10)
+
+        exito, _ = self.pedido.confirmar_pedido()
+
+        self.assertFalse(exito)
+        self.assertFalse(MensajeOutbox.objects.exists())
+
+    def test_fallo_reintenta_con_backoff_hasta_descartar(self):
+        mensaje = outbox.encolar('email', {'notificacion_id': 0})
+        mensaje.max_intentos = 2
+        mensaje.save()
+        caido = mock.Mock(side_effect=ConnectionError('SMTP caído'))
+
+        with mock.patch.dict(outbox.ENVIOS, {'email': caido}):
+            outbox.despachar()
+            mensaje.refresh_from_db()
+            self.assertEqual((mensaje.estado, mensaje.intentos), ('pendiente', 1))
+            self.assertGreater(mensaje.proximo_intento, timezone.now())
+            self.assertIn('SMTP caído', mensaje.ultimo_error)
+
+            # Todavía en backoff: no se reclama
+            self.assertEqual(outbox.despachar(), 0)
+
+            MensajeOutbox.objects.update(proximo_intento=timezone.now())
+            outbox.despachar()
+
+        mensaje.refresh_from_db()
+        self.assertEqual((mensaje.estado, mensaje.intentos), ('fallido', 2))
+        self.assertEqual(caido.call_count, 2)
+
+    def test_respeta_concurrencia_por_canal(self):
+        en_vuelo = outbox.encolar('email', {})
+        MensajeOutbox.objects.filter(pk=en_vuelo.pk).update(
+            estado='procesando', bloqueado_hasta=timezone.now() + timedelta(minutes=5)
+        )
+        outbox.encolar('email', {})
+
+        self.assertEqual(outbox.reclamar('email', 1), [])
+        self.assertEqual(len(outbox.reclamar('email', 2)), 1)
+
+    def test_retoma_mensajes_de_un_worker_caido(self):
+        mensaje = outbox.encolar('email', {})
+        MensajeOutbox.objects.filter(pk=mensaje.pk).update(
+            estado='procesando', bloqueado_hasta=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual([m.pk for m in outbox.reclamar('email', 1)], [mensaje.pk])
+
+
+class CambioEstadoTests(TestCase):
+
+    def setUp(self):
+        self.cambios = []
+        estado_changed.connect(self.registrar, sender=Pedido)
+        self.addCleanup(estado_changed.disconnect, self.registrar, sender=Pedido)
+
+    def registrar(self, sender, pedido, anterior, nuevo, en_lote, **kwargs):
+        self.cambios.append((pedido.pk, anterior, nuevo, en_lote))
+
+    def test_seguimiento_de_cambios(self):
+        pedido = Pedido.objects.get(pk=crear_pedido().pk)
+        self.assertFalse(pedido.has_changed('estado'))
+
+        pedido.estado = 'preparando'
+        self.assertTrue(pedido.has_changed('estado'))
+        self.assertEqual(pedido.previous('estado'), 'recibido')
+
+        pedido.save()
+        self.assertFalse(pedido.has_changed('estado'))
+        self.assertEqual(pedido.previous('estado'), 'preparando')
+        self.assertEqual(self.cambios, [(pedido.pk, 'recibido', 'preparando', False)])
+
+    def test_guardar_sin_cambio_de_estado_no_consulta_ni_avisa(self):
+        pedido = Pedido.objects.get(pk=crear_pedido().pk)
+        pedido.instrucciones = 'Tocar timbre'
+
+        # Sólo el UPDATE: ya no se lee el estado anterior de la base
+        with self.assertNumQueries(1):
+            pedido.save()
+        self.assertEqual(self.cambios, [])
+
+    def test_pedido_nuevo_no_avisa(self):
+        crear_pedido()
+        self.assertEqual(self.cambios, [])
+
+    def test_cambio_masivo(self):
+        recibido, preparando = crear_pedido(), crear_pedido()
+        Pedido.objects.filter(pk=preparando.pk).update(estado='preparando')
+
+        pedidos = Pedido.objects.filter(pk__in=[recibido.pk, preparando.pk])
+        cambiados = pedidos.cambiar_estado('preparando')
+
+        self.assertEqual([pedido.pk for pedido in cambiados], [recibido.pk])
+        self.assertEqual(self.cambios, [(recibido.pk, 'recibido', 'preparando', True)])
+
+    def _pedido_con_plantilla_de_envio(self):
+        cliente = User.objects.create_user('ana', 'ana@example.com', 'x')
+        PlantillaNotificacion.objects.create(
+            tipo='pedido_enviado',
+            canal='email',
+            asunto='Pedido #{pedido_id} en camino',
+            mensaje='{estado}',
+        )
+        pedido = crear_pedido()
+        pedido.cliente = cliente
+        pedido.save()
+        return pedido
+
+    def test_notifica_cambio_de_estado_por_el_outbox(self):
+        pedido = self._pedido_con_plantilla_de_envio()
+
+        pedido.estado = 'en_camino'
+        pedido.save()
+
+        mensaje = MensajeOutbox.objects.get()
+        self.assertEqual((mensaje.canal, mensaje.pedido_id), ('email', pedido.pk))
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sin_celery_el_cambio_de_estado_envia_el_email(self):
+        pedido = self._pedido_con_plantilla_de_envio()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.estado = 'en_camino'
+            pedido.save()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['ana@example.com'])
+        self.assertEqual(mail.outbox[0].subject, f'Pedido #{pedido.pk} en camino')
+        self.assertEqual(MensajeOutbox.objects.get().estado, 'enviado')
+
+
+class EventosPagoTests(TestCase):
+
+    MERCADOPAGO = 'pedidos.mercadopago_service.MercadoPagoService'
+    TIMEOUT = {'success': False, 'error': 'Timeout'}
+
+    def setUp(self):
+        self.producto = crear_producto('PAGO', stock=5)
+        self.pedido = crear_pedido((self.producto, 2))
+        reservar_stock(self.pedido)
+        self.url = reverse('pedidos-api:mp-webhook')
+
+    def notificar(self, payment_id='123'):
+        return self.client.post(
+            self.url,
+            {
+                'type': 'payment',
+                'action': 'payment.updated',
+                'data': {'id': payment_id},
+            },
+            content_type='application/json'
+        )
+
+    def pago(self, estado):
+        """Respuesta de la API de MP para un pago de este pedido"""
+        referencia = str(self.pedido.pk)
+        return {
+            'success': True,
+            'payment': {'status': estado, 'external_reference': referencia},
+        }
+
+    def procesar(self, *estados):
+        """Procesa la cola con la API de MP devolviendo los estados indicados"""
+        respuestas = [self.pago(estado) for estado in estados]
+        with mock.patch(self.MERCADOPAGO) as servicio:
+            servicio.return_value.get_payment_info.side_effect = respuestas
+            resumen = procesar_pendientes()
+        consultas = servicio.return_value.get_payment_info.call_count
+        self.assertEqual(consultas, len(estados))
+        return resumen
+
+    def stock(self):
+        self.producto.refresh_from_db(fields=['stock'])
+        return self.producto.stock
+
+    def test_webhook_registra_sin_consultar_mp(self):
+        with mock.patch(self.MERCADOPAGO) as servicio:
+            for _ in range(3):
+                self.assertEqual(self.notificar().status_code, 200)
+            for ipn in ('?topic=payment&id=123', '?topic=merchant_order&id=9'):
+                self.assertEqual(self.client.post(self.url + ipn).status_code, 200)
+
+        servicio.assert_not_called()
+        evento = PaymentEvent.objects.get()
+        self.assertEqual(
+            (evento.payment_id, evento.status, evento.estado), ('123', '', 'pendiente')
+        )
+
+    def test_aprobado_se_aplica_una_vez(self):
+        self.notificar()
+        self.assertEqual(self.procesar('approved'), {'procesado': 1})
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(
+            (self.pedido.estado_pago, self.pedido.confirmado), ('approved', True)
+        )
+        self.assertEqual(self.stock(), 3)
+
+        # MP reenvía la misma notificación: el pago ya está resuelto, no se
+        # registra ni se consulta
+        self.notificar()
+        self.assertEqual(self.procesar(), {})
+        self.assertEqual(PaymentEvent.objects.get().pedido, self.pedido)
+        self.assertEqual(self.stock(), 3)
+
+    def test_pendiente_repetido_se_consulta_y_se_descarta(self):
+        self.notificar()
+        self.procesar('pending')
+        # Un pago pendiente puede cambiar: la notificación nueva se consulta
+        self.notificar()
+        self.assertEqual(self.procesar('pending'), {'duplicado': 1})
+        self.notificar()
+        self.assertEqual(self.procesar('approved'), {'procesado': 1})
+        self.assertEqual(PaymentEvent.objects.count(), 2)
+
+    def test_evento_encolado_de_un_pago_ya_resuelto_no_consulta(self):
+        PaymentEvent.objects.create(
+            payment_id='123', status='approved', estado='procesado'
+        )
+        PaymentEvent.objects.create(payment_id='123', status='')
+        self.assertEqual(self.procesar(), {'duplicado': 1})
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    def test_no_retrocede_ni_repone_stock_de_un_pedido_pagado(self):
+        self.notificar('1')
+        self.procesar('approved')
+        # Llegan tarde una notificación del mismo pago y un rechazo de otro intento
+        self.notificar('1')
+        self.notificar('2')
+        self.assertEqual(self.procesar('rejected'), {'procesado': 1})
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado_pago, 'approved')
+        self.assertEqual(self.stock(), 3)
+
+    def test_rechazo_repetido_repone_una_vez(self):
+        descontar_stock(self.pedido)
+        self.notificar()
+        self.procesar('rejected')
+        self.notificar()
+        self.procesar()
+
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    def test_reprocesar_fallidos(self):
+        self.notificar()
+        with self.settings(PAGOS_EVENTOS_MAX_INTENTOS=1), \
+                mock.patch(self.MERCADOPAGO) as servicio:
+            servicio.return_value.get_payment_info.return_value = self.TIMEOUT
+            self.assertEqual(procesar_pendientes(), {'fallido': 1})
+
+        with mock.patch(self.MERCADOPAGO) as servicio:
+            servicio.return_value.get_payment_info.return_value = self.pago('approved')
+            call_command('reprocesar_eventos_pago', stdout=StringIO())
+
+        evento = PaymentEvent.objects.get()
+        self.assertEqual(
+            (evento.estado, evento.status, evento.intentos),
+            ('procesado', 'approved', 1),
+        )
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado_pago, 'approved')
+
+    def test_comandos_procesan_los_pendientes(self):
+        self.notificar('1')
+        with mock.patch(self.MERCADOPAGO) as servicio:
+            servicio.return_value.get_payment_info.return_value = self.pago('rejected')
+            # Sin fallidos que reencolar igual vacía la cola
+            call_command('reprocesar_eventos_pago', stdout=StringIO())
+            evento = PaymentEvent.objects.get(payment_id='1')
+            self.assertEqual(evento.estado, 'procesado')
+
+            self.notificar('2')
+            call_command('procesar_eventos_pago', '--una-vez', stdout=StringIO())
+            evento = PaymentEvent.objects.get(payment_id='2')
+            self.assertEqual(evento.estado, 'procesado')
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sin_celery_el_webhook_aprueba_el_pedido(self):
+        with mock.patch(self.MERCADOPAGO) as servicio:
+            servicio.return_value.get_payment_info.return_value = self.pago('approved')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.notificar().status_code, 200)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(
+            (self.pedido.estado_pago, self.pedido.confirmado), ('approved', True)
+        )
+        self.assertEqual(PaymentEvent.objects.get().estado, 'procesado')
+        self.assertEqual(self.stock(), 3)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sin_celery_un_error_deja_el_evento_para_el_daemon(self):
+        with mock.patch(self.MERCADOPAGO) as servicio:
+            servicio.return_value.get_payment_info.return_value = self.TIMEOUT
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.notificar().status_code, 200)
+
+        evento = PaymentEvent.objects.get()
+        self.assertEqual((evento.estado, evento.intentos), ('pendiente', 1))
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_con_celery_despierta_al_worker(self):
+        with mock.patch('pedidos.tasks.procesar_eventos_pago.delay') as delay, \
+                mock.patch(self.MERCADOPAGO) as servicio:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.notificar()
+
+        delay.assert_called_once_with()
+        servicio.assert_not_called()
+
+
+class CotizacionDolarTests(TestCase):
+
+    def setUp(self):
+        cache.delete(CurrencyService.CACHE_KEY)
+        cache.delete(CurrencyService.LOCK_KEY)
+        self.service = CurrencyService()
+        # Clientes HTTP (y circuit breakers) propios de cada test
+        clientes = mock.patch.dict('core.http._clientes', clear=True)
+        clientes.start()
+        self.addCleanup(clientes.stop)
+
+    def guardar(self, valor, hace_minutos=0):
+        return CotizacionDolar.objects.create(
+            fuente='bcra',
+            valor=valor,
+            obtenida=timezone.now() - timedelta(minutes=hace_minutos),
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    @mock.patch('pedidos.currency_service.threading.Thread')
+    def test_sirve_la_ultima_sin_esperar_a_la_red(self, hilo):
+        self.guardar('1000', hace_minutos=90)
+        vieja = self.guardar('1100', hace_minutos=50)
+
+        with mock.patch.object(requests.Session, 'request') as request:
+            self.assertEqual(self.service.get_usd_rate(), Decimal('1100'))
+            # La segunda sale de la caché, sin consultas
+            with self.assertNumQueries(0):
+                self.assertEqual(self.service.get_cotizacion().id, vieja.id)
+
+        request.assert_not_called()
+        # Pasado REFRESH_AHEAD se actualiza en segundo plano, una sola vez
+        hilo.assert_called_once()
+        hilo.return_value.start.assert_called_once()
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    @mock.patch('pedidos.currency_service.threading.Thread')
+    def test_con_celery_encola_la_actualizacion(self, hilo):
+        self.guardar('1100', hace_minutos=50)
+
+        with mock.patch('pedidos.tasks.actualizar_cotizacion_dolar.delay') as delay:
+            self.assertEqual(self.service.get_usd_rate(), Decimal('1100'))
+
+        delay.assert_called_once_with()
+        hilo.assert_not_called()
+
+    @mock.patch('pedidos.currency_service.threading.Thread')
+    def test_vigente_no_actualiza(self, hilo):
+        self.guardar('1100', hace_minutos=5)
+        self.service.get_usd_rate()
+        hilo.assert_not_called()
+
+    def test_actualizar_saltea_el_proveedor_caido(self):
+        dolarapi = mock.Mock(status_code=200)
+        dolarapi.json.return_value = {'compra': 1000, 'venta': 1100}
+
+        def responder(method, url, **kwargs):
+            if url == CurrencyService.BCRA_API_URL:
+                raise requests.exceptions.ConnectionError
+            return dolarapi
+
+        with mock.patch.object(
+            requests.Session, 'request', side_effect=responder
+        ) as request:
+            for _ in range(4):
+                cotizacion = self.service.actualizar()
+
+        self.assertEqual(
+            (cotizacion.fuente, cotizacion.valor), ('dolarapi', Decimal('1050'))
+        )
+        self.assertEqual(CotizacionDolar.objects.count(), 4)
+        # Tras 3 fallos el BCRA queda con el circuito abierto y no se lo llama
+        llamadas_bcra = [
+            c for c in request.call_args_list
+            if c.args[1] == CurrencyService.BCRA_API_URL
+        ]
+        self.assertEqual(len(llamadas_bcra), 3)
+
+    def test_conversion_registra_la_cotizacion(self):
+        cotizacion = self.guardar('1000')
+
+        resultado = self.service.convert_ars_to_usd(Decimal('60000'))
+
+        self.assertEqual(resultado['amount_usd'], Decimal('69.00'))
+        self.assertEqual(resultado['cotizacion'].id, cotizacion.id)
+        info = self.service.get_conversion_info()
+        self.assertEqual(info['cotizacion_id'], cotizacion.id)
+
+
+class PedidoStatsTests(TestCase):
+
+    def setUp(self):
+        estadisticas.recalcular()
+
+    def assertContadoresAlDia(self):
+        self.assertEqual(estadisticas.resumen(), estadisticas.contar_pedidos())
+
+    def test_contar_pedidos_en_una_consulta(self):
+        crear_pedido()
+        with self.assertNumQueries(1):
+            conteo = estadisticas.contar_pedidos()
+        self.assertEqual(conteo['total'], 1)
+        self.assertEqual(conteo['estado']['recibido'], 1)
+        self.assertEqual(conteo['estado_pago']['pendiente'], 1)
+
+    def test_resumen_lee_los_contadores(self):
+        for _ in range(3):
+            crear_pedido()
+        with self.assertNumQueries(1):
+            resumen = estadisticas.resumen()
+        self.assertEqual(resumen['total'], 3)
+
+    def test_se_mantienen_con_los_cambios(self):
+        pedidos = [crear_pedido() for _ in range(4)]
+        self.assertContadoresAlDia()
+
+        pedidos[0].estado = 'preparando'
+        pedidos[0].estado_pago = 'approved'
+        pedidos[0].save()
+        self.assertContadoresAlDia()
+
+        enviados = Pedido.objects.filter(pk__in=[p.pk for p in pedidos[1:3]])
+        enviados.cambiar_estado('en_camino')
+        self.assertContadoresAlDia()
+
+        pedidos[3].delete()
+        self.assertContadoresAlDia()
+        self.assertEqual(estadisticas.resumen()['estado'], {
+            'recibido': 0,
+            'preparando': 1,
+            'en_camino': 2,
+            'entregado': 0,
+            'cancelado': 0,
+        })
+
+    def test_recalcular_corrige_updates_masivos(self):
+        crear_pedido()
+        # Un UPDATE que no pasa por save() no actualiza los contadores
+        Pedido.objects.update(estado='entregado')
+        self.assertEqual(estadisticas.resumen()['estado']['entregado'], 0)
+
+        call_command('recalcular_estadisticas_pedidos', stdout=StringIO())
+        self.assertContadoresAlDia()
+        entregados = PedidoStats.objects.get(dimension='estado', valor='entregado')
+        self.assertEqual(entregados.cantidad, 1)
+
+    def test_fragmentos_se_suman(self):
+        sorteo = mock.patch(
+            'pedidos.estadisticas.random.randrange', side_effect=[1, 3, 3]
+        )
+        with self.settings(PEDIDOS_STATS_FRAGMENTOS=4), sorteo:
+            pedidos = [crear_pedido() for _ in range(2)]
+            pedidos[0].estado = 'entregado'
+            pedidos[0].save()
+
+        self.assertEqual(
+            set(
+                PedidoStats.objects.filter(dimension='total')
+                .values_list('fragmento', 'cantidad')
+            ),
+            {(0, 0), (1, 1), (3, 1)},
+        )
+        self.assertContadoresAlDia()
+
+
+class PedidoStatsAtomicoTests(TransactionTestCase):
+
+    def test_save_y_contadores_en_la_misma_transaccion(self):
+        estadisticas.recalcular()
+        # En autocommit: si fallan los contadores tampoco queda el pedido
+        with mock.patch('pedidos.estadisticas._sumar', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                crear_pedido()
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(estadisticas.resumen(), estadisticas.contar_pedidos())
+
+
+class BusquedaPedidosTests(TestCase):
+
+    def setUp(self):
+        cliente = User.objects.create_user('jperez', 'juan@example.com', 'x')
+        self.ana = Pedido.objects.create(
+            dedicatoria='', nombre_destinatario='Ana Gómez', direccion='Calle 123',
+            telefono_destinatario='381 477-8577', fecha_entrega=date.today(),
+            franja_horaria='mañana',
+        )
+        self.juan = Pedido.objects.create(
+            dedicatoria='', nombre_destinatario='Rosa', nombre_comprador='Juan Pérez',
+            cliente=cliente, direccion='Calle 456', telefono_destinatario='',
+            fecha_entrega=date.today(), franja_horaria='tarde',
+        )
+
+    def buscar(self, termino):
+        return set(buscar_pedidos(termino))
+
+    def test_numero_de_pedido_exacto(self):
+        # exists() del camino rápido y la consulta de los resultados
+        with self.assertNumQueries(2):
+            resultado = set(buscar_pedidos(self.ana.numero_pedido.lower()))
+        self.assertEqual(resultado, {self.ana})
+
+    def test_telefono_en_cualquier_formato(self):
+        self.assertEqual(
+            self.ana.telefono_destinatario_normalizado,
+            telefono_normalizado('3814778577'),
+        )
+        self.assertEqual(self.buscar('(381) 477-8577'), {self.ana})
+        self.assertEqual(self.buscar('3814778577'), {self.ana})
+        # Parte del número: subcadena de los dígitos
+        self.assertEqual(self.buscar('477-8577'), {self.ana})
+
+    def test_texto_sin_acentos_ni_mayusculas(self):
+        self.assertEqual(self.buscar('gomez'), {self.ana})
+        self.assertEqual(self.buscar('PÉREZ juan'), {self.juan})
+        self.assertEqual(self.buscar('juan@example'), {self.juan})
+        self.assertEqual(self.buscar('calle'), set())
+
+    def test_se_actualiza_al_cambiar_los_datos(self):
+        self.ana.nombre_destinatario = 'Lucía'
+        self.ana.save(update_fields=['nombre_destinatario'])
+        self.assertEqual(self.buscar('lucia'), {self.ana})
+        self.assertEqual(self.buscar('gomez'), set())
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'Los planes de consulta son de PostgreSQL'
+)
+class PedidoQueryPlanTests(TestCase):
+    """
+    Planes (EXPLAIN) de las consultas frecuentes sobre una tabla de 100.000
+    pedidos: ninguna debe recorrer pedidos_pedido completa (Seq Scan).
+    """
+    CANTIDAD = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        clientes = User.objects.bulk_create(
+            [User(username=f'cliente{i}') for i in range(1000)]
+        )
+        estados = ['entregado'] * 14 + [
+            'cancelado', 'recibido', 'preparando', 'en_camino'
+        ]
+        pagos = ['approved'] * 8 + ['pendiente', 'rejected']
+        envios = ['programado', 'programado', 'retiro', 'express']
+        franjas = ['mañana', 'tarde', 'durante_el_dia']
+        hoy = date.today()
+        for inicio in range(0, cls.CANTIDAD, 10_000):
+            Pedido.objects.bulk_create([
+                Pedido(
+                    dedicatoria='', nombre_destinatario=f'Destinatario {i}',
+                    direccion='Calle 123', telefono_destinatario='',
+                    fecha_entrega=hoy - timedelta(days=i % 730),
+                    franja_horaria=franjas[i % 3], estado=estados[i % len(estados)],
+                    estado_pago=pagos[i % len(pagos)], tipo_envio=envios[i % 4],
+                    cliente=clientes[i % 1000] if i % 3 == 0 else None,
+                    numero_pedido=f'P{i:07d}',
+                    telefono_destinatario_normalizado=f'54381{i:07d}',
+                )
+                for i in range(inicio, inicio + 10_000)
+            ])
+        with connection.cursor() as cursor:
+            # bulk_create usa auto_now_add: se reparten las fechas en dos años
+            cursor.execute(
+                "UPDATE pedidos_pedido SET creado = now()"
+                " - (id % 730) * interval '1 day' - (id % 1440) * interval '1 minute'"
+            )
+            cursor.execute('ANALYZE pedidos_pedido')
+        cls.cliente = clientes[0]
+
+    def assertSinSeqScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan on pedidos_pedido', plan, plan)
+
+    def test_listado_del_admin(self):
+        pedidos = Pedido.objects.order_by('-creado')
+        self.assertSinSeqScan(pedidos[:20])
+        self.assertSinSeqScan(pedidos.filter(estado='preparando')[:20])
+        self.assertSinSeqScan(pedidos.filter(estado_pago='rejected')[:20])
+        self.assertSinSeqScan(pedidos.filter(tipo_envio='express')[:20])
+        semana = timezone.now() - timedelta(days=7)
+        self.assertSinSeqScan(pedidos.filter(creado__gte=semana)[:20])
+
+    def test_contador_de_pedidos_de_hoy(self):
+        hoy = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.assertSinSeqScan(
+            Pedido.objects.filter(creado__gte=hoy, creado__lt=hoy + timedelta(days=1))
+        )
+
+    def test_mis_pedidos(self):
+        self.assertSinSeqScan(
+            Pedido.objects.filter(cliente=self.cliente).order_by('-creado')
+        )
+
+    def test_agenda_de_entregas(self):
+        hoy = date.today()
+        self.assertSinSeqScan(
+            Pedido.objects.filter(fecha_entrega=hoy, franja_horaria='mañana')
+        )
+        self.assertSinSeqScan(
+            Pedido.objects.filter(fecha_entrega__range=(hoy, hoy + timedelta(days=2)))
+        )
+
+    def test_busqueda_exacta(self):
+        self.assertSinSeqScan(buscar_pedidos('p0012345'))
+        self.assertSinSeqScan(
+            Pedido.objects.filter(telefono_destinatario_normalizado='543810012345')
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requiere bloqueos de fila reales')
+class StockConcurrenteTests(TransactionTestCase):
+
+    def test_checkouts_concurrentes_no_sobrevenden(self):
+        producto = crear_producto('HOT', stock=5)
+        pedidos = [crear_pedido((producto, 1)) for _ in range(12)]
+        resultados = []
+        barrera = threading.Barrier(len(pedidos))
+
+        def confirmar(pedido):
+            barrera.wait()
+            try:
+                # Dos intentos por pedido, como un webhook que llega repetido
+                resultados.append(descontar_stock(pedido))
+                descontar_stock(pedido)
+            except StockInsuficiente:
+                resultados.append(False)
+            finally:
+                connection.close()
+
+        hilos = [
+            threading.Thread(target=confirmar, args=(pedido,)) for pedido in pedidos
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(resultados.count(True), 5)
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(Pedido.objects.filter(stock_descontado=True).count(), 5)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requiere bloqueos reales')
+class OutboxConcurrenteTests(TransactionTestCase):
+
+    def test_workers_concurrentes_respetan_el_limite_del_canal(self):
+        for _ in range(20):
+            outbox.encolar('email', {})
+        reclamados = []
+        barrera = threading.Barrier(6)
+
+        def reclamar():
+            barrera.wait()
+            try:
+                reclamados.extend(outbox.reclamar('email', 3))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reclamar) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(reclamados), 3)
+        self.assertEqual(MensajeOutbox.objects.filter(estado='procesando').count(), 3)
@@ -49,8 +49,20 @@ python manage.py init_shipping_config || {
     echo "⚠️  Shipping zones initialization failed (non-critical)"
 }
 
-# 6. Start Gunicorn
-echo "📋 Step 6: Starting Gunicorn"
+# 6. Background workers (sin Celery los reintentos los hacen los daemons)
+echo "📋 Step 6: Starting background workers"
+case "${CELERY_ENABLED,,}" in
+    true|on|ok|y|yes|1)
+        echo "   Celery habilitado: los procesa el worker de Celery"
+        ;;
+    *)
+        python manage.py procesar_eventos_pago &
+        python manage.py procesar_outbox &
+        ;;
+esac
+
+# 7. Start Gunicorn
+echo "📋 Step 7: Starting Gunicorn"
 echo "   Port: ${PORT:-8000}"
 echo "   Workers: 2"
 echo "   Timeout: 120s"